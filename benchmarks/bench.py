@@ -0,0 +1,184 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+"""Benchmarks of ttf2c stages on several charset sizes.
+
+Run from the repository root:
+    python -m benchmarks.bench                 compare with benchmarks/baseline.json
+    python -m benchmarks.bench --save          write a new baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy
+import ttf2c
+from ttf2c import GlyphSet, Font
+from benchmarks.font import build_font
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Bump when the generated font changes, old fonts in the temp dir are not reused then
+FONT_VERSION = 1
+
+CHAR_SETS = {
+    'ascii': list(range(0x21, 0x7f)),
+    'latin_cyrillic': list(range(0x21, 0x250)) + list(range(0x400, 0x500)),
+    'cjk20k': list(range(0x4e00, 0x4e00 + 20000)),
+}
+
+STAGES = ['glyphset', 'transform', 'pack', 'c_emit', 'images']
+
+
+def bench_font():
+    path = os.path.join(tempfile.gettempdir(), f'ttf2c-bench-{FONT_VERSION}.ttf')
+    if not os.path.isfile(path):
+        build_font(path + '.tmp')
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def stage_functions(font, size, char_set, out_dir):
+    """Callables of every stage, later stages use the glyph set made by the first one."""
+    state = {}
+
+    def glyphset():
+        state['glyph_set'] = GlyphSet(font=font, size=size, char_set=list(char_set))
+
+    def transform():
+        glyph_set = state['glyph_set']
+        glyph_set.flip(1)
+        glyph_set.flip(0)
+        glyph_set.inverse()
+
+    def pack():
+        state['packed'] = state['glyph_set'].pack(0, 'little')
+
+    def c_emit():
+        Font('bench', state['glyph_set'], state['packed'], inv=False, bp='vertical', bn='little').save_c(
+            out_dir, verbose=False)
+
+    def images():
+        img_dir = os.path.join(out_dir, 'img')
+        os.makedirs(img_dir, exist_ok=True)
+        ttf2c.draw_glyphs(state['glyph_set'].bitmaps, img_dir)
+
+    return {'glyphset': glyphset, 'transform': transform, 'pack': pack, 'c_emit': c_emit, 'images': images}
+
+
+def run(font, size, sets, stages, repeat):
+    results = {}
+    for set_name in sets:
+        char_set = CHAR_SETS[set_name]
+        with tempfile.TemporaryDirectory() as out_dir:
+            functions = stage_functions(font, size, char_set, out_dir)
+            # Stages depend on earlier ones, so the first stage always runs
+            needed = STAGES[:max(STAGES.index(s) for s in stages) + 1]
+            for stage in needed:
+                times = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    functions[stage]()
+                    times.append(time.perf_counter() - start)
+
+                # Separate traced run, tracing slows Python code down
+                tracemalloc.start()
+                functions[stage]()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                if stage in stages:
+                    seconds = min(times)
+                    results[f'{set_name}/{stage}'] = {
+                        'glyphs': len(char_set),
+                        'seconds': seconds,
+                        'glyphs_per_sec': len(char_set) / seconds if seconds else 0.0,
+                        'peak_bytes': peak,
+                    }
+                    print(f"{set_name + '/' + stage:<28} {seconds:>9.4f} s {len(char_set) / max(seconds, 1e-9):>12.0f} "
+                          f"glyphs/s {peak / 1024 / 1024:>9.1f} MiB", flush=True)
+    return results
+
+
+def machine():
+    return {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold, min_delta):
+    """List of regressions: time or peak memory above baseline by more than threshold."""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get('results', {}).get(key)
+        if base is None:
+            continue
+        if result['seconds'] > base['seconds'] * (1 + threshold) and result['seconds'] - base['seconds'] > min_delta:
+            regressions.append(f"{key}: {result['seconds']:.4f} s, baseline {base['seconds']:.4f} s")
+        if result['peak_bytes'] > base['peak_bytes'] * (1 + threshold) and \
+                result['peak_bytes'] - base['peak_bytes'] > 1024 * 1024:
+            regressions.append(f"{key}: peak {result['peak_bytes']} bytes, baseline {base['peak_bytes']} bytes")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks.bench', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--font', '-f', default=None, help='Font to benchmark. By default a generated font is used.')
+    parser.add_argument('--size', '-s', type=int, default=16, help='Font size in px. Default value 16.')
+    parser.add_argument('--sets', nargs='+', choices=list(CHAR_SETS), default=list(CHAR_SETS))
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--repeat', '-n', type=int, default=3, help='Runs of every stage, the best is taken.')
+    parser.add_argument('--baseline', default=BASELINE, help='Baseline JSON file.')
+    parser.add_argument('--save', action='store_true', help='Save results as the new baseline.')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed slowdown or memory growth against the baseline. Default value 0.25 (25%%).')
+    parser.add_argument('--min-delta', type=float, default=0.005,
+                        help='Time differences below this many seconds are noise. Default value 0.005.')
+    parser.add_argument('--json', default=None, help='Also write results to this JSON file.')
+    args = parser.parse_args(argv)
+
+    font = args.font or bench_font()
+    results = run(font, args.size, args.sets, args.stages, args.repeat)
+    report = {'machine': machine(), 'size': args.size, 'results': results}
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print(f"No baseline {args.baseline}, run with --save to create it")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold, args.min_delta)
+    for r in regressions:
+        print(f"REGRESSION {r}")
+    if not regressions:
+        print("No regressions")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
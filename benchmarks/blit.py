@@ -0,0 +1,171 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+"""Throughput of the reference C renderer (ttf2c_render.h) in every layout.
+
+Every bp/bn/am/mono combination is converted, built with the local C compiler and timed drawing a string.
+Every glyph is also drawn alone and checked against GlyphSet.bitmaps pixel for pixel.
+
+Run from the repository root:
+    python -m benchmarks.blit
+    python -m benchmarks.blit --bpp 2 --crop --compress rle
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy
+from ttf2c import GlyphSet, convert
+from ttf2c.render import save_renderer
+from benchmarks.bench import CHAR_SETS, bench_font
+
+# (bp, bn, am), page addressing always packs vertically with little bit numbering
+LAYOUTS = [(bp, bn, am) for bp in ('vertical', 'horizontal') for bn in ('little', 'big')
+           for am in ('horizontal', 'vertical')] + [('vertical', 'little', 'page')]
+
+MAIN_C = """\
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#define TTF2C_RENDER_STATS
+#include "bench.c"
+#include "ttf2c_render.h"
+
+static double now(void) {
+    struct timespec t;
+    clock_gettime(CLOCK_MONOTONIC, &t);
+    return t.tv_sec + t.tv_nsec * 1e-9;
+}
+
+int main(int argc, char** argv) {
+    font_t const* font = &bench_font;
+    if (argc != 4) {
+        return 2;
+    }
+
+    /* Every glyph alone in a cleared cell */
+    ttf2c_fb_t cell = {calloc((size_t)font->max_width * font->height, 1), font->max_width, font->height};
+    FILE* f = fopen(argv[1], "wb");
+    for (int32_t i = 0; i < font->glyph_num; i++) {
+        memset(cell.pixels, 0, (size_t)cell.width * cell.height);
+        ttf2c_draw_glyph(font, i, &cell, 0, 0);
+        fwrite(cell.pixels, 1, (size_t)cell.width * cell.height, f);
+    }
+    fclose(f);
+
+    /* The string over and over, at least the given number of seconds */
+    char const* text = argv[2];
+    double min_seconds = atof(argv[3]);
+    ttf2c_fb_t fb = {calloc((size_t)ttf2c_text_width(font, text) + 1, font->height),
+                     ttf2c_text_width(font, text) + 1, font->height};
+    memset(&ttf2c_render_stats, 0, sizeof(ttf2c_render_stats));
+    uint32_t runs = 0;
+    double start = now(), seconds;
+    do {
+        ttf2c_draw_text(font, &fb, 0, 0, text);
+        runs++;
+        seconds = now() - start;
+    } while (seconds < min_seconds);
+    printf("%u %u %u %.9f\\n", runs, ttf2c_render_stats.glyphs, ttf2c_render_stats.bytes, seconds);
+    return 0;
+}
+"""
+
+
+def expected_cells(glyph_set):
+    """Stored bitmaps drawn at their box position in a max_width x max_height cell, as the C harness draws them."""
+    cells = numpy.zeros((len(glyph_set.char_set), glyph_set.max_height, glyph_set.max_width), dtype=numpy.uint8)
+    boxes = glyph_set.boxes
+    for i, bitmap in enumerate(glyph_set.bitmaps):
+        x, y = (0, 0) if boxes is None else boxes[i][:2]
+        h, w = bitmap.shape
+        cells[i, y:y + h, x:x + w] = bitmap
+    return cells
+
+
+def run_layout(base, layout, args, text, work_dir):
+    """Convert, build and run one layout. Returns the result row."""
+    bp, bn, am = layout
+    glyph_set = base.copy()
+    font = convert(glyph_set.font, glyph_set.size, char_set=glyph_set.char_set, bp=bp, bn=bn, am=am,
+                   compression=args.compress, crop=args.crop, bpp=args.bpp, name='bench', glyph_set=glyph_set)
+    sizes = font.save_c(work_dir, art=False, verbose=False)
+    save_renderer(work_dir)
+
+    with open(os.path.join(work_dir, 'main.c'), 'w') as f:
+        f.write(MAIN_C)
+    binary = os.path.join(work_dir, 'blit')
+    subprocess.run([args.cc, '-O2', '-std=c99', '-D_POSIX_C_SOURCE=199309L', '-o', binary,
+                    os.path.join(work_dir, 'main.c')], check=True)
+
+    cells_path = os.path.join(work_dir, 'cells.bin')
+    out = subprocess.run([binary, cells_path, text, str(args.seconds)], check=True, capture_output=True, text=True)
+    runs, glyphs, touched, seconds = out.stdout.split()
+
+    drawn = numpy.fromfile(cells_path, dtype=numpy.uint8).reshape(-1, glyph_set.max_height, glyph_set.max_width)
+    mismatched = int((drawn != expected_cells(glyph_set)).any(axis=(1, 2)).sum())
+    glyphs = int(glyphs)
+    return {
+        'bp': bp, 'bn': bn, 'am': am, 'mono': glyph_set.mono,
+        'glyphs_per_sec': glyphs / float(seconds),
+        'bytes_per_glyph': int(touched) / glyphs if glyphs else 0.0,
+        'font_bytes': sum(sizes.values()),
+        'mismatched_glyphs': mismatched,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks.blit', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--font', '-f', default=None, help='Font to benchmark. By default a generated font is used.')
+    parser.add_argument('--size', '-s', type=int, default=16, help='Font size in px. Default value 16.')
+    parser.add_argument('--set', choices=list(CHAR_SETS), default='ascii', help='Charset. Default value ascii.')
+    parser.add_argument('--bpp', type=int, choices=[1, 2, 4, 8], default=1)
+    parser.add_argument('--crop', action='store_true')
+    parser.add_argument('--compress', choices=['none', 'dedup', 'rle'], default='none')
+    parser.add_argument('--text', default=None, help='String to draw. By default every glyph of the charset once.')
+    parser.add_argument('--seconds', type=float, default=0.2, help='Time of every layout. Default value 0.2.')
+    parser.add_argument('--cc', default=os.environ.get('CC', 'gcc'), help='C compiler. Default $CC or gcc.')
+    parser.add_argument('--json', default=None, help='Also write results to this JSON file.')
+    args = parser.parse_args(argv)
+
+    if shutil.which(args.cc) is None:
+        print(f"C compiler {args.cc} not found")
+        return 2
+
+    font = args.font or bench_font()
+    rendered = GlyphSet(font=font, size=args.size, char_set=list(CHAR_SETS[args.set]), bpp=args.bpp)
+    text = args.text if args.text is not None else ''.join(map(chr, rendered.char_set))
+
+    results = []
+    print(f"{'bp':<10} {'bn':<6} {'am':<10} {'mono':<5} {'Glyphs/s':>12} {'Bytes/glyph':>11} {'Font bytes':>10}  Check")
+    for mono in (False, True):
+        base = rendered.placed(mono) if mono != rendered.mono else rendered
+        for layout in LAYOUTS:
+            with tempfile.TemporaryDirectory() as work_dir:
+                r = run_layout(base, layout, args, text, work_dir)
+            results.append(r)
+            check = 'ok' if not r['mismatched_glyphs'] else f"{r['mismatched_glyphs']} glyph(s) differ"
+            print(f"{r['bp']:<10} {r['bn']:<6} {r['am']:<10} {str(r['mono']):<5} {r['glyphs_per_sec']:>12.0f} "
+                  f"{r['bytes_per_glyph']:>11.1f} {r['font_bytes']:>10}  {check}", flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'size': args.size, 'set': args.set, 'bpp': args.bpp, 'crop': args.crop,
+                       'compress': args.compress, 'results': results}, f, indent=2)
+    return 1 if any(r['mismatched_glyphs'] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+"""Minimal TrueType font writer used to generate the benchmark font locally, no font file is shipped."""
+
+import struct
+import numpy
+
+UNITS_PER_EM = 1000
+ASCENDER = 800
+DESCENDER = -200
+ADVANCE = 600
+SPACE_ADVANCE = 250
+
+# Codepoint ranges of the generated font, every codepoint gets its own glyph
+RANGES = [
+    (0x21, 0x24f),      # ASCII + Latin
+    (0x400, 0x4ff),     # Cyrillic
+    (0x4e00, 0x9e1f),   # 20000 CJK ideographs
+]
+
+
+def glyph_outline(rng):
+    """Random closed polygons: a jagged ring and one or two bars, gives glyphs of different complexity."""
+    contours = []
+    points = int(rng.integers(6, 24))
+    angles = numpy.sort(rng.uniform(0, 2 * numpy.pi, points))[::-1]
+    radius = rng.uniform(150, 280, points)
+    cx, cy = rng.uniform(220, 380), rng.uniform(200, 450)
+    contours.append(numpy.stack((cx + radius * numpy.cos(angles), cy + radius * numpy.sin(angles)), axis=1))
+    for _ in range(int(rng.integers(1, 3))):
+        x0, y0 = rng.uniform(40, 400), rng.uniform(-150, 600)
+        w, h = rng.uniform(40, 160), rng.uniform(30, 120)
+        contours.append(numpy.array([[x0, y0], [x0, y0 + h], [x0 + w, y0 + h], [x0 + w, y0]]))
+    return [numpy.round(c).astype(numpy.int64) for c in contours]
+
+
+def glyf_entry(contours):
+    if not contours:
+        return b''
+    xy = numpy.concatenate(contours)
+    end_points = numpy.cumsum([len(c) for c in contours]) - 1
+    deltas = numpy.diff(xy, axis=0, prepend=[[0, 0]])
+    data = struct.pack('>hhhhh', len(contours), *xy.min(axis=0), *xy.max(axis=0))
+    data += struct.pack(f'>{len(end_points)}H', *end_points)
+    data += struct.pack('>H', 0)
+    # Every point is on curve, coordinates are int16 deltas
+    data += bytes([0x01]) * len(xy)
+    data += struct.pack(f'>{len(xy)}h', *deltas[:, 0])
+    data += struct.pack(f'>{len(xy)}h', *deltas[:, 1])
+    return data + b'\0' * (-len(data) % 4)
+
+
+def build_font(path: str, seed: int = 0):
+    rng = numpy.random.default_rng(seed)
+    codes = [0x20] + [c for start, end in RANGES for c in range(start, end + 1)]
+
+    # Glyph 0 is .notdef, glyph 1 is the space
+    glyphs = [glyf_entry([numpy.array([[50, 0], [50, 700], [450, 700], [450, 0]])]), b'']
+    glyphs += [glyf_entry(glyph_outline(rng)) for _ in codes[1:]]
+    glyph_num = len(glyphs)
+
+    loca = numpy.zeros(glyph_num + 1, dtype='>u4')
+    numpy.cumsum([len(g) for g in glyphs], out=loca[1:])
+
+    advances = [ADVANCE, SPACE_ADVANCE] + [ADVANCE] * (glyph_num - 2)
+    hmtx = b''.join(struct.pack('>Hh', a, 0) for a in advances)
+
+    # cmap format 12: consecutive codepoints map to consecutive glyphs
+    groups = []
+    glyph_id = 1
+    for start, end in [(0x20, 0x20)] + RANGES:
+        groups.append(struct.pack('>III', start, end, glyph_id))
+        glyph_id += end - start + 1
+    subtable = struct.pack('>HHIII', 12, 0, 16 + 12 * len(groups), 0, len(groups)) + b''.join(groups)
+    cmap = struct.pack('>HHHHI', 0, 1, 3, 10, 12) + subtable
+
+    max_points = 64
+    tables = {
+        b'cmap': cmap,
+        b'glyf': b''.join(glyphs),
+        b'head': struct.pack('>IIIIHHqqhhhhHHhhh', 0x00010000, 0x00010000, 0, 0x5F0F3CF5, 0, UNITS_PER_EM, 0, 0,
+                             -200, -200, 1000, 1000, 0, 8, 2, 1, 0),
+        b'hhea': struct.pack('>IhhhHhhhhhhhhhhhH', 0x00010000, ASCENDER, DESCENDER, 0, ADVANCE, 0, 0, 1000, 1, 0, 0,
+                             0, 0, 0, 0, 0, glyph_num),
+        b'hmtx': hmtx,
+        b'loca': loca.tobytes(),
+        b'maxp': struct.pack('>IHHHHHHHHHHHHHH', 0x00010000, glyph_num, max_points, 4, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0,
+                             0),
+        b'name': struct.pack('>HHH', 0, 0, 6),
+        b'post': struct.pack('>IIhhIIIII', 0x00030000, 0, -100, 50, 0, 0, 0, 0, 0),
+    }
+
+    # Table directory, tables are sorted by tag and 4 byte aligned
+    tags = sorted(tables)
+    offset = 12 + 16 * len(tags)
+    directory = struct.pack('>IHHHH', 0x00010000, len(tags), 0, 0, 0)
+    body = b''
+    for tag in tags:
+        data = tables[tag]
+        directory += struct.pack('>4sIII', tag, 0, offset + len(body), len(data))
+        body += data + b'\0' * (-len(data) % 4)
+
+    with open(path, 'wb') as f:
+        f.write(directory + body)
+    return codes
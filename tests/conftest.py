@@ -0,0 +1,36 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench import bench_font
+
+
+@pytest.fixture(scope='session')
+def font():
+    """Font generated by the benchmarks, no font file is shipped."""
+    return bench_font()
+
+
+@pytest.fixture(scope='session')
+def cc():
+    """Build and run a C program, returns its stdout as bytes. Skips the test without a C compiler."""
+    compiler = os.environ.get('CC', 'gcc')
+    if shutil.which(compiler) is None:
+        pytest.skip(f'C compiler {compiler} not found')
+
+    def run(source_path, *args):
+        binary = os.path.splitext(source_path)[0]
+        subprocess.run([compiler, '-std=c99', '-Wall', '-Werror', '-o', binary, source_path], check=True)
+        return subprocess.run([binary, *args], check=True, capture_output=True).stdout
+    return run
@@ -0,0 +1,52 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import json
+import os
+import re
+
+import pytest
+
+from ttf2c.batch import load_manifest, run_batch
+
+
+def write_manifest(tmp_path, manifest):
+    path = os.path.join(tmp_path, 'fonts.json')
+    with open(path, 'w') as f:
+        json.dump(manifest, f)
+    return path
+
+
+def test_one_font_many_sizes(font, tmp_path):
+    path = write_manifest(tmp_path, {
+        'output': 'out',
+        'range': '0x21-0x7e',
+        'text_report': 'report.json',
+        'jobs': [{'font': font, 'size': size} for size in (10, 12, 14, 16, 18)],
+    })
+    jobs = load_manifest(path)
+    results = run_batch(jobs, workers=2, manifest=path)
+
+    assert [r[0] for r in results] == list(range(5))
+    for (index, name, glyphs, size, _), job in zip(results, jobs):
+        assert name == job['name'] and glyphs == 94 and size > 0
+        assert os.path.isfile(os.path.join(tmp_path, 'out', name + '.c'))
+    # Without text there is no corpus to report
+    assert not os.path.exists(os.path.join(tmp_path, 'report.json'))
+
+    # Up to date jobs are reported from their stamps
+    assert [r[:4] for r in run_batch(jobs, workers=2, manifest=path)] == [r[:4] for r in results]
+
+
+@pytest.mark.parametrize('key, value', [
+    ('format', 'png'), ('bp', 'diagonal'), ('bn', 'middle'), ('am', 'spiral'), ('compress', 'zip'),
+    ('lookup', 'trie'), ('kern', 'yes'), ('bpp', 3), ('bpp', '2'), ('banks', 'page'), ('img_kind', ['map', 'gif']),
+])
+def test_invalid_choice(font, tmp_path, key, value):
+    path = write_manifest(tmp_path, {'jobs': [{'font': font, 'size': 12}, {'font': font, 'size': 12, key: value}]})
+    bad = value[-1] if isinstance(value, list) else value
+    with pytest.raises(ValueError, match=re.escape(f"Job 1: invalid {key} {bad!r}")):
+        load_manifest(path)
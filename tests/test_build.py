@@ -0,0 +1,99 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import os
+
+import pytest
+
+from ttf2c import Build, font_name, run
+from ttf2c.args import parse_args
+from ttf2c.build import escape_dep, output_file
+
+# Long ago, any file saved by a conversion gets a newer mtime
+OLD_MTIME = 1_000_000_000
+
+
+@pytest.fixture
+def project(font, tmp_path):
+    """Output directory, a --text file and the arguments of a conversion using both."""
+    output = os.path.join(tmp_path, 'out')
+    os.makedirs(output)
+    text = os.path.join(tmp_path, 'strings.txt')
+    with open(text, 'w', encoding='utf-8') as f:
+        f.write('Hello, world\n')
+    argv = ['-f', font, '-s', '14', '-o', output, '-t', text, '--renderer',
+            '--depfile', os.path.join(tmp_path, 'font.d')]
+    return output, text, argv
+
+
+def age(directory):
+    """Set an old mtime on every file of a directory, returns their names."""
+    names = sorted(os.listdir(directory))
+    for name in names:
+        os.utime(os.path.join(directory, name), (OLD_MTIME, OLD_MTIME))
+    return names
+
+
+def test_output_file(tmp_path):
+    path = os.path.join(tmp_path, 'a.txt')
+    with output_file(path) as f:
+        f.write('a')
+    os.utime(path, (OLD_MTIME, OLD_MTIME))
+    with output_file(path) as f:
+        f.write('a')
+    assert os.stat(path).st_mtime == OLD_MTIME
+    with output_file(path) as f:
+        f.write('b')
+    assert os.stat(path).st_mtime != OLD_MTIME
+    assert os.listdir(tmp_path) == ['a.txt']
+
+
+def test_second_run_keeps_mtimes(project, capsys):
+    output, _, argv = project
+    assert run(parse_args(argv)) is not False
+    names = age(output)
+    assert {'ttf2c-bench-1.c', 'ttf2c_render.h', 'ttf2c_rle.h', 'ttf2c-bench-1.ttf2c.json'} <= set(names)
+
+    capsys.readouterr()
+    assert run(parse_args(argv)) is not False
+    assert capsys.readouterr().out == 'ttf2c-bench-1: up to date\n'
+    assert all(os.stat(os.path.join(output, name)).st_mtime == OLD_MTIME for name in names)
+
+    # Converted again without the stamp, the unchanged files are not replaced either
+    run(parse_args(argv), incremental=False)
+    assert all(os.stat(os.path.join(output, name)).st_mtime == OLD_MTIME for name in names)
+
+
+def test_check(project):
+    output, text, argv = project
+    assert run(parse_args(argv + ['--check'])) is False
+    run(parse_args(argv))
+    assert run(parse_args(argv + ['--check'])) is True
+
+    with open(text, 'a', encoding='utf-8') as f:
+        f.write('More text\n')
+    assert run(parse_args(argv + ['--check'])) is False
+    run(parse_args(argv))
+    assert run(parse_args(argv + ['--check'])) is True
+
+    # A saved file edited by hand is stale too
+    with open(os.path.join(output, 'ttf2c_render.h'), 'a') as f:
+        f.write('\n')
+    assert 'was changed' in Build(vars(parse_args(argv)), font_name(argv[1])).stale()
+    assert run(parse_args(argv + ['--check'])) is False
+
+
+def test_depfile(project, font, tmp_path):
+    output, text, argv = project
+    run(parse_args(argv))
+    with open(os.path.join(tmp_path, 'font.d')) as f:
+        targets, deps = f.read().replace('\\\n', ' ').split(':', 1)
+    targets, deps = targets.split(), deps.split()
+    assert escape_dep(os.path.join(output, 'ttf2c-bench-1.c')) in targets
+    assert escape_dep(os.path.join(output, 'ttf2c_render.h')) in targets
+    assert escape_dep(os.path.abspath(font)) in deps
+    assert escape_dep(os.path.abspath(text)) in deps
+    assert any(dep.endswith('build.py') for dep in deps)
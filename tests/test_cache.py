@@ -0,0 +1,120 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import os
+
+import numpy
+import pytest
+
+from ttf2c import GlyphSet, Profile
+from ttf2c.cache import ENTRY_EXT, RenderCache, main
+
+ASCII = list(range(0x21, 0x7f))
+CYRILLIC = list(range(0x410, 0x450))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return RenderCache(os.path.join(tmp_path, 'cache'))
+
+
+def render(font, cache, char_set, size=14):
+    """Glyph set and the number of glyphs taken from the cache and rendered."""
+    profile = Profile()
+    glyph_set = GlyphSet(font=font, size=size, char_set=char_set, cache=cache, profile=profile)
+    return glyph_set, profile.counts['glyphs_cached'], profile.counts['glyphs_rendered']
+
+
+def same_glyphs(a, b):
+    return a.char_set == b.char_set and all(numpy.array_equal(x, y) for x, y in zip(a.bitmaps, b.bitmaps))
+
+
+def test_hit_and_miss(font, cache):
+    uncached = GlyphSet(font=font, size=14, char_set=ASCII)
+    first, cached, rendered = render(font, cache, ASCII)
+    assert (cached, rendered) == (0, len(ASCII))
+    second, cached, rendered = render(font, cache, ASCII)
+    assert (cached, rendered) == (len(ASCII), 0)
+    assert same_glyphs(first, uncached) and same_glyphs(second, uncached)
+
+    # Another size is another entry
+    render(font, cache, ASCII, size=16)
+    assert sorted(e[1]['size'] for e in cache.entries()) == [14, 16]
+
+
+def test_partial_reuse(font, cache):
+    render(font, cache, ASCII)
+    both, cached, rendered = render(font, cache, ASCII + CYRILLIC)
+    assert (cached, rendered) == (len(ASCII), len(CYRILLIC))
+    assert same_glyphs(both, GlyphSet(font=font, size=14, char_set=ASCII + CYRILLIC))
+    # Entries are merged, a subset comes from the cache alone
+    assert [e[2] for e in cache.entries()] == [len(ASCII) + len(CYRILLIC)]
+    assert render(font, cache, CYRILLIC[::3])[1:] == (len(CYRILLIC[::3]), 0)
+
+
+def test_lru_eviction(font, cache):
+    for size in (10, 12, 14):
+        render(font, cache, ASCII, size=size)
+    # The 10 px entry is used again, so 12 px is the least recently used one
+    keys = {e[1]['size']: e[0] for e in cache.entries()}
+    for used, size in enumerate((10, 12, 14)):
+        os.utime(cache.entry_path(keys[size]), (used, used))
+    render(font, cache, ASCII, size=10)
+
+    sizes = {e[1]['size']: e[3] for e in cache.entries()}
+    removed = cache.prune(sum(sizes.values()) - 1)
+    assert len(removed) == 1
+    assert sorted(e[1]['size'] for e in cache.entries()) == [10, 14]
+
+    # A store over the limit evicts others but keeps its own entry
+    cache.max_size = 1
+    render(font, cache, CYRILLIC, size=16)
+    assert [e[1]['size'] for e in cache.entries()] == [16]
+
+
+@pytest.mark.parametrize('damage', ['truncate_header', 'truncate_bitmaps', 'empty', 'garbage'])
+def test_damaged_entry(font, cache, damage):
+    render(font, cache, ASCII)
+    key = cache.entries()[0][0]
+    path = cache.entry_path(key)
+    with open(path, 'r+b') as f:
+        if damage == 'truncate_header':
+            f.truncate(10)
+        elif damage == 'truncate_bitmaps':
+            f.truncate(os.path.getsize(path) - 1)
+        elif damage == 'empty':
+            f.truncate(0)
+        else:
+            f.seek(0)
+            f.write(os.urandom(64))
+
+    # A damaged entry is a miss and is stored again
+    glyph_set, cached, rendered = render(font, cache, ASCII)
+    assert (cached, rendered) == (0, len(ASCII))
+    assert same_glyphs(glyph_set, GlyphSet(font=font, size=14, char_set=ASCII))
+    assert render(font, cache, ASCII)[1:] == (len(ASCII), 0)
+
+
+def test_damaged_entry_pruned(font, cache):
+    render(font, cache, ASCII)
+    with open(os.path.join(cache.path, 'f' * 32 + ENTRY_EXT), 'wb') as f:
+        f.write(b'TTF2CGC1')
+    assert len(cache.entries()) == 1
+    assert sorted(os.listdir(cache.path)) == [cache.entries()[0][0] + ENTRY_EXT]
+
+
+def test_cli(font, cache, capsys):
+    render(font, cache, ASCII, size=12)
+    render(font, cache, ASCII, size=14)
+    main(['info', '--dir', cache.path])
+    out = capsys.readouterr().out
+    assert out.count(os.path.basename(font)) == 2 and 'Total: 2 entries' in out
+
+    main(['prune', '--dir', cache.path, '--max-size', str(max(e[3] for e in cache.entries()))])
+    assert capsys.readouterr().out == 'Removed 1 entries\n'
+    main(['clear', '--dir', cache.path])
+    assert capsys.readouterr().out == 'Removed 1 entries\n'
+    assert cache.entries() == []
@@ -0,0 +1,82 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import os
+
+import numpy
+import pytest
+
+from ttf2c import GlyphSet
+from ttf2c.compress import MAX_LITERAL, MAX_REPEAT, RLE_DECODER_H, compress, rle_decode, rle_encode
+
+MAIN_C = """\
+#include <stdio.h>
+#include "ttf2c_rle.h"
+
+static const uint8_t data[] = {@DATA@};
+static const uint32_t offsets[] = {@OFFSETS@};
+static const uint16_t sizes[] = {@SIZES@};
+
+int main(void) {
+    static uint8_t out[65536];
+    for (unsigned i = 0; i < sizeof(sizes) / sizeof(sizes[0]); i++) {
+        ttf2c_rle_t rle;
+        ttf2c_rle_init(&rle, data + offsets[i]);
+        ttf2c_rle_read(&rle, out, sizes[i]);
+        fwrite(out, 1, sizes[i], stdout);
+    }
+    return 0;
+}
+"""
+
+
+def random_bytes(rng):
+    """Runs of random lengths around the literal and repeat limits, of few or many byte values."""
+    runs = []
+    values = int(rng.choice([2, 4, 256]))
+    for _ in range(int(rng.integers(0, 12))):
+        length = int(rng.choice([1, 2, 3, MAX_LITERAL, MAX_REPEAT, MAX_REPEAT + 1, int(rng.integers(1, 400))]))
+        if rng.random() < 0.5:
+            runs.append(numpy.full(length, rng.integers(0, values), dtype=numpy.uint8))
+        else:
+            runs.append(rng.integers(0, values, length, dtype=numpy.uint8))
+    return numpy.concatenate(runs) if runs else numpy.zeros(0, dtype=numpy.uint8)
+
+
+def test_rle_round_trip():
+    rng = numpy.random.default_rng(0)
+    for _ in range(2000):
+        data = random_bytes(rng)
+        stream = rle_encode(data)
+        assert rle_decode(stream, data.size) == data.tobytes()
+        assert len(stream) <= data.size + -(-data.size // MAX_LITERAL)
+
+
+@pytest.fixture(scope='module')
+def packed(font):
+    glyph_set = GlyphSet(font=font, size=16, char_set=list(range(0x21, 0x250)), bpp=2)
+    glyph_set.crop()
+    return glyph_set.pack(0, 'little')
+
+
+def test_compress_round_trip(packed):
+    compressed = compress(packed, 'rle')
+    assert compressed.size < packed.size
+    for i in range(len(packed)):
+        assert compressed.decode(i) == packed[i].tobytes()
+        assert compressed.owner[compressed.owner[i]] == compressed.owner[i]
+
+
+def test_rle_decoder_h(packed, cc, tmp_path):
+    compressed = compress(packed, 'rle')
+    with open(os.path.join(tmp_path, 'ttf2c_rle.h'), 'w') as f:
+        f.write(RLE_DECODER_H)
+    main = os.path.join(tmp_path, 'main.c')
+    with open(main, 'w') as f:
+        f.write(MAIN_C.replace('@DATA@', ','.join(map(str, compressed.data.tolist())))
+                .replace('@OFFSETS@', ','.join(map(str, compressed.offsets.tolist())))
+                .replace('@SIZES@', ','.join(map(str, compressed.raw_sizes.tolist()))))
+    assert cc(main) == packed.data.tobytes()
@@ -0,0 +1,46 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import os
+
+import pytest
+
+from ttf2c.corpus import read_strings
+
+JSON = """\
+{
+  "menu": {"title" : "Меню", "items":["Старт", "Стоп \\"x\\""]},
+  "key\\":": "значение:",
+  "list": ["a", "b"
+      , "c"],
+  "empty"
+  :
+  ""
+}
+"""
+
+C = """\
+/* "comment" */ const char *s = "Hello\\x21"; // "skipped"
+char c = '"'; const char *t = "a" "b";
+"""
+
+
+def strings(tmp_path, name, text, chunk_size):
+    path = os.path.join(tmp_path, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return list(read_strings(path, chunk_size=chunk_size))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 7, 64, 1 << 16])
+def test_json_values(tmp_path, chunk_size):
+    assert strings(tmp_path, 'ui.json', JSON, chunk_size) == \
+        ['Меню', 'Старт', 'Стоп "x"', 'значение:', 'a', 'b', 'c', '']
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 1 << 16])
+def test_c_literals(tmp_path, chunk_size):
+    assert strings(tmp_path, 'ui.c', C, chunk_size) == ['Hello!', 'a', 'b']
@@ -0,0 +1,28 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import json
+import os
+
+import numpy
+from PIL import Image
+
+from ttf2c import GlyphSet, draw_glyphs
+
+
+def test_glyph_map(font, tmp_path):
+    glyph_set = GlyphSet(font=font, size=14, char_set=list(range(0x21, 0x7f)))
+    glyphs = glyph_set.bitmaps
+    draw_glyphs(glyphs, str(tmp_path), kinds=['map'], codes=glyph_set.char_set)
+
+    with open(os.path.join(tmp_path, 'glyph_map.json'), encoding='utf-8') as f:
+        index = json.load(f)
+    atlas = numpy.asarray(Image.open(os.path.join(tmp_path, index['image'])))
+    assert (index['height'], index['width']) == atlas.shape
+    assert [g['code'] for g in index['glyphs']] == list(glyph_set.char_set)
+    for g, glyph in zip(index['glyphs'], glyphs):
+        assert (g['height'], g['width']) == glyph.shape
+        assert (atlas[g['y']:g['y'] + g['height'], g['x']:g['x'] + g['width']] == glyph.astype(bool)).all()
@@ -0,0 +1,77 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import os
+
+import numpy
+import pytest
+
+from ttf2c.kerning import plan_kerning
+from ttf2c.np2c import array_wrap, number_lines
+
+GLYPH_NUM = 60
+
+MAIN_C = """\
+#include <stdint.h>
+#include <stdio.h>
+
+@TABLES@
+int main(void) {
+    for (uint32_t left = 0; left <= @GLYPH_NUM@; left++) {
+        for (uint32_t right = 0; right <= @GLYPH_NUM@; right++) {
+            printf("%d\\n", probe_kerning(left, right));
+        }
+    }
+    return 0;
+}
+"""
+
+
+def random_pairs(seed=0):
+    """Kerning of a few left and right glyph groups, as fonts have for e.g. round and diagonal shapes."""
+    rng = numpy.random.default_rng(seed)
+    lefts = rng.integers(0, 4, GLYPH_NUM)
+    rights = rng.integers(0, 5, GLYPH_NUM)
+    values = rng.integers(-200, 200, (4, 5))
+    values[0] = 0
+    rows = [(left, right, values[lefts[left], rights[right]]) for left in range(GLYPH_NUM) for right in range(GLYPH_NUM)
+            if values[lefts[left], rights[right]]]
+    return numpy.array(rows, dtype=numpy.int64).reshape(-1, 3)
+
+
+def expected(pairs, threshold):
+    """Kerning matrix of the kept pairs, glyphs out of range read as 0."""
+    matrix = numpy.zeros((GLYPH_NUM + 1, GLYPH_NUM + 1), dtype=numpy.int64)
+    kept = pairs[numpy.abs(pairs[:, 2]) >= threshold]
+    matrix[kept[:, 0], kept[:, 1]] = numpy.clip(kept[:, 2], -128, 127)
+    return matrix
+
+
+@pytest.mark.parametrize('method', ['pairs', 'classes'])
+@pytest.mark.parametrize('threshold', [1, 100, 1000])
+def test_find(method, threshold):
+    pairs = random_pairs()
+    kerning = plan_kerning(pairs.copy(), GLYPH_NUM, method, threshold)
+    found = [[kerning.find(left, right) for right in range(GLYPH_NUM)] for left in range(GLYPH_NUM)]
+    assert (numpy.array(found) == expected(pairs, threshold)[:GLYPH_NUM, :GLYPH_NUM]).all()
+
+
+@pytest.mark.parametrize('method', ['pairs', 'classes'])
+@pytest.mark.parametrize('threshold', [1, 1000])
+def test_c_kerning(method, threshold, cc, tmp_path):
+    pairs = random_pairs()
+    kerning = plan_kerning(pairs.copy(), GLYPH_NUM, method, threshold)
+    tables = ''.join(array_wrap(f"{dtype}_t", f"probe_{suffix}", number_lines(values))
+                     for suffix, dtype, values in kerning.tables)
+    main = os.path.join(tmp_path, 'main.c')
+    with open(main, 'w') as f:
+        f.write(MAIN_C.replace('@TABLES@', tables + kerning.c_function('probe'))
+                .replace('@GLYPH_NUM@', str(GLYPH_NUM)))
+
+    found = numpy.array([int(line) for line in cc(main).split()]).reshape(GLYPH_NUM + 1, GLYPH_NUM + 1)
+    inside = [[kerning.find(left, right) for right in range(GLYPH_NUM)] for left in range(GLYPH_NUM)]
+    assert (found[:GLYPH_NUM, :GLYPH_NUM] == numpy.array(inside)).all()
+    assert (found == expected(pairs, threshold)).all()
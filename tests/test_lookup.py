@@ -0,0 +1,59 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import os
+
+import numpy
+import pytest
+
+from ttf2c import convert
+from ttf2c.lookup import LOOKUP_METHODS, plan_lookup
+
+# Runs, gaps and single codepoints of ASCII, Latin and Cyrillic
+CHAR_SET = list(range(0x21, 0x7f)) + [0xa9, 0xae] + list(range(0xc0, 0x100, 2)) + list(range(0x410, 0x450)) + [0x4e00]
+
+MAIN_C = """\
+#include <stdio.h>
+#include "probe.c"
+
+static const uint32_t codes[] = {@CODES@};
+
+int main(void) {
+    for (unsigned i = 0; i < sizeof(codes) / sizeof(codes[0]); i++) {
+        printf("%d\\n", (int)probe_font.lookup(codes[i]));
+    }
+    return 0;
+}
+"""
+
+
+def probe_codes():
+    """Every codepoint of the charset, its neighbours and codepoints far outside of it."""
+    codes = numpy.asarray(CHAR_SET)
+    return sorted(set(numpy.concatenate((codes - 1, codes, codes + 1)).tolist()) | {0, 0x20000, 0xffffffff})
+
+
+def expected(code):
+    return CHAR_SET.index(code) if code in CHAR_SET else -1
+
+
+@pytest.mark.parametrize('method', LOOKUP_METHODS)
+def test_find(method):
+    lookup = plan_lookup(CHAR_SET, method)
+    assert [lookup.find(code) for code in probe_codes()] == [expected(code) for code in probe_codes()]
+
+
+@pytest.mark.parametrize('method', [m for m in LOOKUP_METHODS if m != 'auto'])
+def test_c_lookup(method, font, cc, tmp_path):
+    result = convert(font, 12, char_set=CHAR_SET, lookup=method, name='probe')
+    assert list(result.char_set) == CHAR_SET
+    result.save_c(str(tmp_path), art=False, verbose=False)
+    main = os.path.join(tmp_path, 'main.c')
+    with open(main, 'w') as f:
+        f.write(MAIN_C.replace('@CODES@', ', '.join(f'{code}u' for code in probe_codes())))
+
+    found = [int(line) for line in cc(main).split()]
+    assert found == [result.lookup.find(code) for code in probe_codes()]
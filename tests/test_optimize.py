@@ -0,0 +1,38 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import pytest
+
+from ttf2c import GlyphSet, convert
+from ttf2c.optimize import rank_layouts
+
+# Runs and gaps, so every lookup method has different tables
+CHAR_SET = list(range(0x21, 0x7f)) + list(range(0xc0, 0x100, 3)) + list(range(0x410, 0x430))
+
+
+@pytest.mark.parametrize('bpp', [1, 2])
+def test_estimated_sizes(font, bpp, tmp_path):
+    """Every candidate of the ranking has the size of the C file saved with its options."""
+    glyph_set = GlyphSet(font=font, size=13, char_set=CHAR_SET, bpp=bpp)
+    candidates = rank_layouts(glyph_set)
+    assert len(candidates) == 240
+
+    for candidate in candidates:
+        o = candidate.options
+        rendered = glyph_set.placed(o['mono']) if o['mono'] != glyph_set.mono else glyph_set.copy()
+        result = convert(font, 13, char_set=CHAR_SET, bpp=bpp, mono=o['mono'], bp=o['bp'], bn=o['bn'], am=o['am'],
+                         crop=o['crop'], compression=o['compress'], lookup=o['lookup'], name='probe',
+                         glyph_set=rendered)
+        sizes = result.save_c(str(tmp_path), art=False, verbose=False)
+        assert sum(sizes.values()) == candidate.size, o
+
+
+@pytest.mark.parametrize('model', ['size', 'balanced', 'speed'])
+def test_optimize_saves_first(font, model, tmp_path):
+    result = convert(font, 13, char_set=CHAR_SET, optimize=model, name='probe')
+    costs = [c.cost for c in result.ranking]
+    assert costs == sorted(costs)
+    assert sum(result.save_c(str(tmp_path), art=False, verbose=False).values()) == result.ranking[0].size
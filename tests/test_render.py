@@ -0,0 +1,27 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import os
+from argparse import Namespace
+
+import pytest
+
+from ttf2c import GlyphSet
+from benchmarks.blit import LAYOUTS, run_layout
+
+
+@pytest.fixture(scope='module')
+def large_glyphs(font):
+    """Glyphs of several hundred bytes each, larger than any fixed decode buffer would be."""
+    return GlyphSet(font=font, size=48, char_set=list(range(0x21, 0x7f)), bpp=8)
+
+
+@pytest.mark.parametrize('compress, crop', [('none', False), ('rle', False), ('rle', True)])
+@pytest.mark.parametrize('layout', LAYOUTS)
+def test_draw_glyph(large_glyphs, layout, compress, crop, cc, tmp_path):
+    args = Namespace(compress=compress, crop=crop, bpp=8, cc=os.environ.get('CC', 'gcc'), seconds=0.0)
+    result = run_layout(large_glyphs, layout, args, 'Hello', str(tmp_path))
+    assert result['mismatched_glyphs'] == 0
@@ -0,0 +1,31 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import numpy
+import pytest
+
+from ttf2c import GlyphSet
+from ttf2c.ttf2np import RECORD_FIELDS
+
+# Large enough for several chunks per worker, with empty glyphs and codepoints the font does not have
+CHAR_SET = list(range(0x20, 0x250)) + list(range(0x400, 0x500)) + [0x3000, 0x4e00, 0x4e01]
+
+
+@pytest.mark.parametrize('jobs', [2, 3])
+@pytest.mark.parametrize('mono, bpp', [(False, 1), (True, 1), (False, 4)])
+def test_same_as_serial(font, jobs, mono, bpp):
+    serial = GlyphSet(font=font, size=15, char_set=CHAR_SET, mono=mono, bpp=bpp, jobs=1)
+    parallel = GlyphSet(font=font, size=15, char_set=CHAR_SET, mono=mono, bpp=bpp, jobs=jobs)
+
+    assert parallel.char_set == serial.char_set
+    for name in ('max_width', 'max_height', 'baseline', 'space_width_px', 'kerning_px'):
+        assert getattr(parallel, name) == getattr(serial, name), name
+    assert numpy.array_equal(parallel.widths, serial.widths)
+    assert parallel.buffer.dtype == serial.buffer.dtype
+    assert parallel.buffer.tobytes() == serial.buffer.tobytes()
+    for a, b in zip(parallel.glyph_set, serial.glyph_set):
+        assert [getattr(a, f) for f in RECORD_FIELDS] == [getattr(b, f) for f in RECORD_FIELDS]
+        assert bytes(a.buffer) == bytes(b.buffer)
@@ -4,51 +4,121 @@
 # See the README and LISENSE files for information on usage and redistribution.
 #
 
-import os
-from .args import args
+import sys
 from .ttf2np import GlyphSet
 from .np2c import generate_c_file
-from .glyph_img import draw_glyphs
+from .convert import Font, convert, font_name
+from .profile import Profile
+from .build import Build, recording
 
 
-def ttf2c():
-    glyph_set = GlyphSet(font=args.font, size=args.size, char_set=args.range, mono=args.mono)
+def __getattr__(name):
+    # Pillow and rpack are heavy, import them only when images are requested
+    if name == 'draw_glyphs':
+        from .glyph_img import draw_glyphs
+        return draw_glyphs
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    # Bit conversions over each glyph
-    # Inverse (mirror) array in X direction
-    if args.rx:
-        glyph_set.flip(1)
 
-    # Inverse (mirror) array in Y direction
-    if args.ry:
-        glyph_set.flip(0)
+def ttf2c(argv=None):
+    from .args import parse_args
+    if run(parse_args(argv)) is False:
+        sys.exit(1)
 
-    # Inverse bits (color)
-    if args.inv:
-        glyph_set.inverse()
 
-    # Pack bits to bytes
-    axis = 0
-    if args.bp == 'horizontal':
-        axis = 1
-    bitmap_packed = glyph_set.pack(axis, args.bn)
+def run(args, glyph_set=None, incremental=True):
+    """Convert a font with parsed command line arguments and save the results.
 
-    # Create images
+    `glyph_set` is an already rendered GlyphSet of the font, size, range, mono, bpp and kern of args, e.g. kept by the
+    conversion server, with the codepoints of args.text already merged into range. It is changed in place.
+    With `incremental` nothing is converted when the stamp of the last conversion is up to date, --check only reports
+    it. Returns False if --check found the files stale.
+    """
+    build = None
+    if incremental:
+        build = Build(vars(args), font_name(args.font))
+        reason = build.stale()
+        if args.check:
+            print(f"{build.name}: {reason or 'up to date'}")
+            return reason is None
+        # Images are not in the stamp, so they are always saved again
+        if reason is None and not args.img:
+            print(f"{build.name}: up to date")
+            build.finish()
+            return True
+
+    cache = None
+    if args.cache is not None:
+        from .cache import RenderCache
+        cache = RenderCache(args.cache or None)
+
+    profile = None
+    if args.profile or args.stats_json:
+        profile = Profile()
+
+    with recording() as written:
+        font = convert(args.font,
+                       args.size,
+                       char_set=args.range,
+                       mono=args.mono,
+                       inv=args.inv,
+                       bp=args.bp,
+                       bn=args.bn,
+                       am=args.am,
+                       rx=args.rx,
+                       ry=args.ry,
+                       jobs=args.jobs,
+                       cache=cache,
+                       compression=args.compress,
+                       crop=args.crop,
+                       lookup=args.lookup,
+                       bpp=args.bpp,
+                       kern=args.kern,
+                       kern_min=args.kern_min,
+                       text=args.text,
+                       banks=args.banks,
+                       bank_size=args.bank_size,
+                       bank_text=args.bank_text,
+                       optimize=args.optimize,
+                       profile=profile,
+                       glyph_set=glyph_set)
+
+        if font.corpus is not None:
+            print(f"Text: {len(font.corpus.font_codes)} codepoint(s) from {len(font.corpus.sources)} file(s), "
+                  f"{len(font.corpus.missing)} missing in the font")
+            if args.text_report:
+                font.corpus.save_report(args.text_report)
+
+        if font.ranking is not None:
+            from .optimize import print_ranking
+            print_ranking(font.ranking)
+
+        # The stamp keeps the size of the C arrays, or of the blob if only the blob is saved
+        sizes = {}
+
+        # Create C file, banked fonts always need the bank index of the C file
+        if args.format in ('c', 'both') or font.banks is not None:
+            sizes = font.save_c(args.output, art=not args.no_art, bank_arrays=args.format != 'blob')
+
+        # Reference renderer of the C file
+        if args.renderer:
+            from .render import save_renderer
+            save_renderer(args.output)
+
+        # Create binary blob
+        if args.format in ('blob', 'both'):
+            blob_sizes = font.save_blob(args.output)
+            sizes = sizes or blob_sizes
+
+    if build is not None:
+        build.finish(written, glyphs=len(font.char_set), bytes=sum(sizes.values()))
+
+    # Create images, they are not in the stamp
     if args.img:
-        draw_glyphs(glyph_set.bitmaps, args.img, inverse=args.inv)
-
-    base = os.path.basename(args.font)
-    font_name = os.path.splitext(base)[0]
-
-    # Create C file
-    generate_c_file(font_name,
-                    args.output,
-                    args.mono,
-                    glyph_set.char_set,
-                    bitmap_packed,
-                    glyph_set.bitmaps,
-                    glyph_set.baseline,
-                    glyph_set.max_height,
-                    glyph_set.max_width,
-                    glyph_set.kerning_px,
-                    glyph_set.space_width_px)
\ No newline at end of file
+        font.save_img(args.img, kinds=args.img_kind)
+
+    if profile is not None:
+        if args.profile:
+            profile.print()
+        if args.stats_json:
+            profile.save_json(args.stats_json)
@@ -30,6 +30,39 @@ def size_checker(size):
     return num
 
 
+def jobs_checker(jobs):
+    err_str = f'Invalid jobs value: {jobs}'
+    try:
+        num = int(jobs)
+    except:
+        raise argparse.ArgumentTypeError(err_str)
+    if num < 0:
+        raise argparse.ArgumentTypeError(err_str)
+    return num
+
+
+def kern_min_checker(kern_min):
+    err_str = f'Invalid kerning threshold: {kern_min}'
+    try:
+        num = int(kern_min)
+    except:
+        raise argparse.ArgumentTypeError(err_str)
+    if num < 1:
+        raise argparse.ArgumentTypeError(err_str)
+    return num
+
+
+def bank_size_checker(bank_size):
+    err_str = f'Invalid bank size: {bank_size}'
+    try:
+        num = int(bank_size)
+    except:
+        raise argparse.ArgumentTypeError(err_str)
+    if num < 64:
+        raise argparse.ArgumentTypeError(err_str)
+    return num
+
+
 def output_checker(path):
     abs_path = os.path.abspath(path)
     if not os.path.exists(abs_path):
@@ -76,6 +109,11 @@ def range_checker(glyph_range):
         return None
 
 
+def text_checker(pattern):
+    # Absolute patterns do not depend on the working directory, e.g. of the conversion server
+    return os.path.abspath(pattern)
+
+
 def img_path_checker(path):
     abs_path = os.path.abspath(path)
     if not os.path.exists(abs_path):
@@ -91,6 +129,7 @@ An important note: the upper left corner of glyph is taken as the XY basis (0, 0
 Examples:
 python.exe ttf2c.py -f MyFavoriteFont.ttf -s 33
 python.exe ttf2c.py -f MyFavoriteFont.ttf -s 19 --img './FontImages' --range 48-57, 59 --mono
+python.exe ttf2c.py -f MyFavoriteFont.ttf -s 16 --text 'ui/**/*.c' 'locale/*.po' --text-report text.json
 
 Used libraries:
 Name              License
@@ -109,6 +148,14 @@ output_description = """Path to dir where C file will be saved. By default save
 range_description = """Range of glyphs codes for conversion. Example: 0x30-0x39,0x2D or 48-57,45. By the default will be
  generated all glyphs of font. Not printable glyphs will be excluded from generation."""
 
+text_description = """Text files or glob patterns ('**' for subdirectories) of strings the firmware shows: UI string 
+tables, translations, C sources. Only glyphs of the codepoints they use are converted, codepoints of --range are added 
+to them. C sources (.c, .h, .cpp etc.), .po and .json files contribute the characters of their string literals, other 
+files all of their characters. Files are read as UTF-8 in chunks, codepoints the font does not have are skipped."""
+
+text_report_description = """Save a JSON report of the codepoints every --text file uses, the ones used by this file 
+only and the ones missing in the font."""
+
 img_description = """Path to the folder where the images of individual glyphs and the full set glyphs on one image will 
 be saved. With this parameter generates several type of images: separate glyphs images, glyph set in one line, glyph set
  map. The map is formed in an unordered way and is used for debugging and general viewing of the font."""
@@ -126,7 +173,9 @@ When packing the array of bits into bytes, vertical or horizontal option can be
 am_description = """Default value 'horizontal'. There are 2 different memory addressing mode 
 horizontal or vertical addressing mode. This parameter describes how bytes will be packed into the array. In case of 
 horizontal mode, bytes from the first row will be packed first, then bytes from the second row, etc. The same is for 
-vertical mode. The first column goes first, then the second, then the third."""
+vertical mode. The first column goes first, then the second, then the third. 'page' is the layout of page addressed 
+controllers like SSD1306, SH1106, ST7565: it sets --bp vertical and --bn little, every byte is 8 pixel column of a 
+page with LSB on top, pages go one after another. With --crop boxes stay aligned to pages."""
 
 rx_description = """Mirrors (reverse) the glyph on the X-axis. This option is used if you want to change the zero 
 coordinate of a glyph"""
@@ -138,6 +187,74 @@ bn_description = """Bit numbering or bit order or MSB, LSB. Default value 'littl
 8x1 bits can be represented as a set of 8 bytes in LSB as 0x01, 0x01, 0x01, 0x01, 0x01, 0x01, 0x01, 0x00, 0x01 or
 as 0x80, 0x80, 0x80, 0x80, 0x80, 0x80, 0x80, 0x00, 0x80 im MSB order"""
 
+jobs_description = """Number of processes used to render glyphs. Default value 1. 0 means one process per CPU core. 
+Parallel rendering pays off for fonts with thousands of glyphs, the result is identical to the serial one."""
+
+no_art_description = """Do not write the ascii art representation of glyphs into comments of the C file. The comments 
+take most of the file size and compile time for large fonts."""
+
+cache_description = """Keep rendered glyphs in an on disk cache and render only glyphs missing in it. Optional value is 
+the cache directory, by default $TTF2C_CACHE or ~/.cache/ttf2c. Use "python -m ttf2c.cache" to inspect and prune it."""
+
+compress_description = """Bitmap compression. Default value 'none'. 'dedup' stores identical glyphs once, 'rle' also 
+compresses every glyph with run length encoding. Compressed fonts always have an offset array, for 'rle' the streaming 
+decoder ttf2c_rle.h is saved next to the C file."""
+
+crop_description = """Store only the bounding box of the glyph ink instead of the whole max height (and max width in mono 
+mode) cell. Position and size of every box are saved in an additional box array: x, y, width, height."""
+
+lookup_description = """Structure used to find the glyph index of a codepoint, the generated function 
+<font>_lookup(code) (font_t.lookup) uses it. Default value 'auto'. 'linear' scans the charmap, 'bsearch' is a binary 
+search over the charmap, 'range' is a binary search over a table of runs of consecutive codepoints, 'hash' is a minimal 
+perfect hash with O(1) lookup. 'auto' takes 'range' when codepoints form runs of 4 or more glyphs on average, otherwise 
+'bsearch'."""
+
+bpp_description = """Bits per pixel. Default value 1. With 2, 4 or 8 bits glyphs are rendered anti-aliased and 
+every pixel keeps a gray level. Pixels are packed densely along --bp, --bn sets the order of bits in a byte."""
+
+kern_description = """Pair kerning from the 'kern' table of the font. Default value 'none'. Generates the function 
+<font>_kerning(left, right) (font_t.kern) which returns the kerning of two glyph indexes in px. 'pairs' is a binary 
+search over a sorted table of pairs, 'classes' groups glyphs with the same kerning into left and right classes and 
+keeps a matrix of class values, 'auto' takes the smaller one. Kerning of fonts with GPOS tables only is not read."""
+
+kern_min_description = """Drop kerning pairs smaller than this number of px. Default value 1."""
+
+format_description = """Output format. Default value 'c'. 'blob' saves <font>.bin, a binary blob with the same arrays as the C 
+file, and <font>_blob.h which declares it for linking with objcopy or .incbin. 'both' saves all of them."""
+
+img_kind_description = """Images saved with --img. Default all of them: 'individual' is one image per glyph, 'line' is 
+all glyphs in one line, 'map' is a texture atlas glyph_map.png with the rectangle of every glyph in glyph_map.json."""
+
+banks_description = """Split the font into banks of consecutive codepoints which firmware loads one at a time, e.g. from 
+external flash. Default value 'none'. 'block' starts a bank at every Unicode block, 'size' fills banks up to --bank-size 
+bytes. The C file keeps a small bank index and functions to find the bank of a codepoint and make a font_t of a bank 
+read into RAM, banks are arrays of the C file or, with --format blob, <font>_banks.bin."""
+
+bank_size_description = """Largest bank in bytes. Default value 4096 for --banks size, no limit for --banks block."""
+
+bank_text_description = """Text files or glob patterns of typical strings, banks are planned to break as few of them as 
+possible. By default the files of --text."""
+
+renderer_description = """Also save ttf2c_render.h, a reference renderer which draws UTF-8 strings into a framebuffer of one 
+byte per pixel with any font_t, and the RLE decoder it uses. Include it after the C file of the font."""
+
+optimize_description = """Try every combination of --bp, --am, --mono, --crop, --compress and --lookup, print the cheapest 
+ones and save the first. 'size' takes the fewest bytes, 'balanced' and 'speed' also count bytes for the decode work of 
+every glyph (lookup reads, offsets, box and RLE decoding). Glyphs are rendered once, the given layout options are 
+ignored, --bn, --inv, --rx, --ry, --bpp and --kern are kept."""
+
+depfile_description = """Write a Makefile/Ninja depfile: the saved files depend on the .ttf, the --text and --bank-text 
+files and the sources of the converter."""
+
+check_description = """Only report whether the saved files are stale, exit status 1 if they are. Nothing is rendered, the 
+inputs and outputs are hashed and compared with the stamp <output>/<font>.ttf2c.json of the last conversion."""
+
+profile_description = """Print wall time and peak memory of every conversion stage (charset, render, metrics, placement, 
+transform, optimize, crop, pack, compress, lookup, kerning, images, c_emission) and counters such as rendered and empty glyphs and bytes 
+of every array."""
+
+stats_json_description = """Save the same report as --profile in a JSON file, e.g. to track it in CI."""
+
 epilog = """
 Copyright (C) 2023 under GPLv3 by Vasilii Tsarevskii
 This program comes with ABSOLUTELY NO WARRANTY.
@@ -152,14 +269,41 @@ parser.add_argument('--font', '-f', type=font_path_checker, required=True, help=
 parser.add_argument('--size', '-s', type=size_checker, required=True, help=size_description)
 parser.add_argument('--output', '-o', type=output_checker, default='.', help=output_description)
 parser.add_argument('--range', '-r', type=range_checker, default=None, help=range_description)
+parser.add_argument('--text', '-t', type=text_checker, nargs='+', default=None, metavar='TEXT', help=text_description)
+parser.add_argument('--text-report', default=None, help=text_report_description)
+parser.add_argument('--format', choices=['c', 'blob', 'both'], default='c', help=format_description)
 parser.add_argument('--img', '-i', type=img_path_checker, help=img_description)
+parser.add_argument('--img-kind', nargs='+', choices=['individual', 'line', 'map'],
+                    default=['individual', 'line', 'map'], help=img_kind_description)
 parser.add_argument('--mono', '-m', action='store_true', help=mono_description)
 parser.add_argument('--inv', action='store_true', help=inv_description)
 parser.add_argument('--bp', choices=['vertical', 'horizontal'], default='vertical', help=bp_description)
-parser.add_argument('--am', choices=['vertical', 'horizontal'], default='horizontal', help=am_description)
+parser.add_argument('--am', choices=['vertical', 'horizontal', 'page'], default='horizontal', help=am_description)
 parser.add_argument('--rx', action='store_true', help=rx_description)
 parser.add_argument('--ry', action='store_true', help=ry_description)
 parser.add_argument('--bn', choices=['little', 'big'], default='little', help=bn_description)
-
-args = parser.parse_args()
+parser.add_argument('--jobs', '-j', type=jobs_checker, default=1, help=jobs_description)
+parser.add_argument('--no-art', action='store_true', help=no_art_description)
+parser.add_argument('--compress', choices=['none', 'dedup', 'rle'], default='none', help=compress_description)
+parser.add_argument('--crop', action='store_true', help=crop_description)
+parser.add_argument('--lookup', choices=['auto', 'linear', 'range', 'bsearch', 'hash'], default='auto',
+                    help=lookup_description)
+parser.add_argument('--bpp', type=int, choices=[1, 2, 4, 8], default=1, help=bpp_description)
+parser.add_argument('--kern', choices=['none', 'auto', 'pairs', 'classes'], default='none', help=kern_description)
+parser.add_argument('--kern-min', type=kern_min_checker, default=1, metavar='PX', help=kern_min_description)
+parser.add_argument('--banks', choices=['none', 'block', 'size'], default='none', help=banks_description)
+parser.add_argument('--bank-size', type=bank_size_checker, default=None, metavar='BYTES', help=bank_size_description)
+parser.add_argument('--bank-text', type=text_checker, nargs='+', default=None, metavar='TEXT',
+                    help=bank_text_description)
+parser.add_argument('--renderer', action='store_true', help=renderer_description)
+parser.add_argument('--optimize', choices=['size', 'balanced', 'speed'], default=None, help=optimize_description)
+parser.add_argument('--depfile', default=None, help=depfile_description)
+parser.add_argument('--check', action='store_true', help=check_description)
+parser.add_argument('--cache', nargs='?', const='', default=None, help=cache_description)
+parser.add_argument('--profile', action='store_true', help=profile_description)
+parser.add_argument('--stats-json', default=None, help=stats_json_description)
+
+
+def parse_args(argv=None):
+    return parser.parse_args(argv)
 
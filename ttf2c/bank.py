@@ -0,0 +1,452 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import os
+from collections import deque
+import numpy
+from .compress import COMPRESSION, RLE_DECODER_H, compress
+from .build import output_file
+from .np2c import LAYOUT, ArrayLayout, var_size, font_typedefs, hex_lines, number_lines, array_wrap
+from .blob import SECTIONS
+from .unicode_blocks import UNICODE_BLOCKS
+
+BANK_METHODS = ['none', 'block', 'size']
+DEFAULT_BANK_SIZE = 4096
+# Sections of a bank and banks in the bank data start at multiples of BANK_ALIGN bytes
+BANK_ALIGN = 4
+
+BLOCK_STARTS = numpy.array([start for start, end, name in UNICODE_BLOCKS], dtype=numpy.int64)
+
+
+def bank_align(value: int):
+    return (value + BANK_ALIGN - 1) // BANK_ALIGN * BANK_ALIGN
+
+
+def block_of(codes):
+    """Index of the Unicode block of every codepoint in UNICODE_BLOCKS."""
+    return numpy.searchsorted(BLOCK_STARTS, numpy.asarray(codes, dtype=numpy.int64), side='right') - 1
+
+
+def block_name(code: int):
+    start, end, name = UNICODE_BLOCKS[int(block_of(code))]
+    return name if start <= code <= end else 'No block'
+
+
+def cut_weights(spans, glyph_num):
+    """Number of strings a bank starting at glyph k splits, for k = 0..glyph_num."""
+    weights = numpy.zeros(glyph_num + 2, dtype=numpy.int64)
+    for (first, last), count in spans.items():
+        weights[first + 1] += count
+        weights[last + 1] -= count
+    return numpy.cumsum(weights)[:glyph_num + 1]
+
+
+def split_segment(prefix, start, stop, budget, cost):
+    """Glyph ranges of the cheapest split of glyphs start:stop into banks of at most `budget` bytes.
+
+    `prefix` is the cumulative size of glyphs, cost[i] is the cost of a bank starting at glyph i. A glyph larger than
+    the budget gets a bank of its own. The cheapest bank to end at every glyph is taken from a sliding window minimum,
+    so the split is linear in the number of glyphs.
+    """
+    best = [0] * (stop - start + 1)
+    parent = [start] * (stop - start + 1)
+    window = deque()
+    first = start
+    for end in range(start + 1, stop + 1):
+        i = end - 1
+        value = best[i - start] + cost[i]
+        while window and window[-1][0] >= value:
+            window.pop()
+        window.append((value, i))
+        while first < end - 1 and prefix[end] - prefix[first] > budget:
+            first += 1
+        while window[0][1] < first:
+            window.popleft()
+        best[end - start], parent[end - start] = window[0]
+
+    ranges = []
+    end = stop
+    while end > start:
+        ranges.append((parent[end - start], end))
+        end = parent[end - start]
+    return ranges[::-1]
+
+
+def plan_banks(char_set, glyph_bytes, method: str = 'size', budget: int = None, spans=None):
+    """Split glyphs into banks of consecutive codepoints, returns (start, stop) glyph index ranges.
+
+    'block' starts a bank at every Unicode block and splits blocks larger than `budget`, if it is given. 'size' fills
+    banks up to `budget` bytes. Out of the splits with the fewest strings of `spans` (see corpus.string_spans) broken
+    between banks the one with the fewest banks is taken.
+    """
+    glyph_num = len(char_set)
+    cuts = [0, glyph_num]
+    if method == 'block':
+        blocks = block_of(char_set)
+        cuts = [0] + (numpy.flatnonzero(blocks[1:] != blocks[:-1]) + 1).tolist() + [glyph_num]
+    elif budget is None:
+        budget = DEFAULT_BANK_SIZE
+    if budget is None:
+        return list(zip(cuts[:-1], cuts[1:]))
+
+    prefix = numpy.concatenate(([0], numpy.cumsum(glyph_bytes))).tolist()
+    # A string split between banks outweighs any number of banks
+    cost = (cut_weights(spans or {}, glyph_num) * (glyph_num + 1) + 1).tolist()
+    # Room for the padding of sections
+    budget = max(budget - BANK_ALIGN * len(SECTIONS), 1)
+
+    ranges = []
+    for start, stop in zip(cuts[:-1], cuts[1:]):
+        ranges += split_segment(prefix, start, stop, budget, cost)
+    return ranges
+
+
+def glyph_bytes(char_set, bitmaps_pack, mono, compressed=None, boxes=None, budget=None):
+    """Bytes every glyph takes in a bank: charmap, offset, width and box entries and the (compressed) bitmap."""
+    arrays = ArrayLayout(mono, char_set, bitmaps_pack, compressed, boxes)
+    sizes = numpy.diff(bitmaps_pack.offsets) if compressed is None else compressed.sizes
+    per_glyph = arrays.charmap_bits // 8 + int(arrays.has_width) + 4 * int(arrays.has_box)
+    if arrays.has_offset:
+        per_glyph += var_size(budget or arrays.bitmap.size) // 8
+    return numpy.asarray(sizes, dtype=numpy.int64) + per_glyph
+
+
+class Banks:
+    """Font split into banks of consecutive codepoints.
+
+    Every bank is a self contained image of the font arrays of its glyphs: charmap, offset, width, box and bitmap in
+    this order, little endian, every section aligned to BANK_ALIGN bytes. Offsets are relative to the bitmap of the
+    bank, compression works inside a bank. ``ranges`` are (start, stop) glyph indexes of banks, ``data`` their bytes.
+    """
+
+    def __init__(self, method, ranges, data, char_set, charmap_bits, offset_bits, has_offset, has_width, has_box,
+                 compression, spans=None):
+        self.method = method
+        self.ranges = ranges
+        self.data = data
+        self.char_set = char_set
+        self.charmap_bits = charmap_bits
+        self.offset_bits = offset_bits
+        self.has_offset = has_offset
+        self.has_width = has_width
+        self.has_box = has_box
+        self.compression = compression
+        self.spans = spans
+
+        # Position of every bank in the bank data
+        self.offsets = numpy.zeros(len(data) + 1, dtype=numpy.int64)
+        numpy.cumsum([d.size for d in data], out=self.offsets[1:])
+
+    def __len__(self):
+        return len(self.ranges)
+
+    @property
+    def sizes(self):
+        return [int(d.size) for d in self.data]
+
+    @property
+    def size(self):
+        return int(self.offsets[-1])
+
+    @property
+    def index_size(self):
+        """Bytes of the bank index: offset, size, first and last codepoint, glyph number and first glyph index."""
+        return len(self) * bank_align(8 + 2 * self.charmap_bits // 8 + 2 * var_size(len(self.char_set)) // 8)
+
+    def bank(self, code: int):
+        """Host side implementation of the generated bank function."""
+        firsts = [self.char_set[start] for start, stop in self.ranges]
+        i = int(numpy.searchsorted(firsts, code, side='right')) - 1
+        if i >= 0 and code <= self.char_set[self.ranges[i][1] - 1]:
+            return i
+        return -1
+
+    def touched(self):
+        """Average number of banks strings of the corpus use, counted over strings with two or more glyphs."""
+        if not self.spans:
+            return None
+        starts = numpy.array([start for start, stop in self.ranges])
+        total = count_sum = 0
+        for (first, last), count in self.spans.items():
+            total += count * int(numpy.searchsorted(starts, last, side='right') -
+                                 numpy.searchsorted(starts, first, side='right') + 1)
+            count_sum += count
+        return total / count_sum
+
+    def save_data(self, font_name: str, output_path: str):
+        """Save all banks in <font_name>_banks.bin at the offsets of the bank index."""
+        with output_file(os.path.join(output_path, font_name + '_banks.bin'), 'wb') as f:
+            for data in self.data:
+                f.write(data.tobytes())
+        return self.size
+
+
+def build_banks(char_set, bitmaps_pack, widths, mono, boxes=None, compression: str = 'none', method: str = 'size',
+                budget: int = None, spans=None):
+    """Plan banks and make the bytes of every bank."""
+    compressed = compress(bitmaps_pack, compression) if compression != 'none' else None
+    sizes = glyph_bytes(char_set, bitmaps_pack, mono, compressed, boxes, budget)
+    ranges = plan_banks(char_set, sizes, method, budget, spans)
+
+    layouts = []
+    for start, stop in ranges:
+        packed = bitmaps_pack.slice(start, stop)
+        bank_compressed = compress(packed, compression) if compression != 'none' else None
+        layouts.append(ArrayLayout(mono, char_set[start:stop], packed, bank_compressed,
+                                   None if boxes is None else boxes[start:stop]))
+
+    # Element types are the same in all banks
+    charmap_bits = var_size(max(char_set, default=0))
+    offset_bits = max((arrays.offset_bits for arrays in layouts), default=8)
+    has_offset = not mono or compression != 'none' or boxes is not None
+
+    data = []
+    for (start, stop), arrays in zip(ranges, layouts):
+        content = {
+            'charmap': numpy.asarray(char_set[start:stop], dtype=f'<u{charmap_bits // 8}'),
+            'offset': numpy.asarray(arrays.offsets, dtype=f'<u{offset_bits // 8}') if has_offset else None,
+            'width': None if mono else numpy.asarray(widths[start:stop], dtype=numpy.uint8),
+            'box': None if boxes is None else numpy.asarray(boxes[start:stop], dtype=numpy.uint8),
+            'bitmap': arrays.bitmap,
+        }
+        parts = []
+        for name in SECTIONS:
+            if content[name] is not None:
+                section = content[name].tobytes()
+                parts += [section, b'\0' * (bank_align(len(section)) - len(section))]
+        data.append(numpy.frombuffer(b''.join(parts), dtype=numpy.uint8))
+
+    return Banks(method, ranges, data, char_set, charmap_bits, offset_bits, has_offset, not mono, boxes is not None,
+                 compression, spans)
+
+
+def generate_banked_c_file(font_name,
+                           output_path,
+                           banks,
+                           mono,
+                           baseline_px,
+                           max_height_px,
+                           max_width_px,
+                           kerning_px,
+                           space_width_px,
+                           layout=('vertical', 'little', 'horizontal'),
+                           bpp: int = 1,
+                           kern=None,
+                           arrays: bool = True,
+                           verbose: bool = True):
+    """Save the C file of a banked font: bank index, font_t template, kerning, functions to find and open a bank and,
+    with `arrays`, every bank as its own array. Without arrays the banks are read from <font_name>_banks.bin.
+    """
+    glyph_num = len(banks.char_set)
+    charmap_t = f"uint{banks.charmap_bits}_t"
+    offs_t = f"uint{banks.offset_bits}_t"
+    glyphi_t = f"uint{var_size(glyph_num)}_t"
+    bp, bn, am = (LAYOUT[k][v] for k, v in zip(('bp', 'bn', 'am'), layout))
+    compression = COMPRESSION[banks.compression]
+    kerning_bytes = kern.size if kern is not None else 0
+    sizes = banks.sizes
+    touched = banks.touched()
+
+    header = \
+    "/******************************************************************************\n" \
+     "*\n" \
+    f"* Created by ttf2c converter.\n" \
+     "* https://github.com/insane-person/ttf2c\n" \
+     "*\n" \
+    f"* Font: {font_name}\n" \
+     "*\n" \
+    f"* Banks: {len(banks)}, {banks.method}, size of bank index: {banks.index_size} byte(s)\n" \
+    f"* Size of banks: {banks.size} byte(s), largest bank: {max(sizes, default=0)} byte(s)\n" \
+    f"* Bank data: {'arrays of this file' if arrays else font_name + '_banks.bin'}, little endian\n" \
+    f"* Layout: bp {layout[0]}, bn {layout[1]}, am {layout[2]}\n" \
+    f"* Bits per pixel: {bpp}\n" \
+    f"* Compression: {banks.compression}\n" \
+     "******************************************************************************/\n" \
+     "#include <stdint.h>\n" \
+     "\n" + \
+    font_typedefs(charmap_t, offs_t, glyphi_t) + \
+     "typedef struct {\n" \
+     "    uint32_t offset;\n" \
+     "    uint32_t size;\n" \
+     "    charmap_t first;\n" \
+     "    charmap_t last;\n" \
+     "    glyphi_t glyph_num;\n" \
+     "    glyphi_t glyph_base;\n" \
+     "} font_bank_t;\n" \
+     "\n"
+
+    path = os.path.join(output_path, font_name + '.c')
+    with output_file(path, encoding='utf-8', buffering=1 << 20) as f:
+        f.write(header)
+
+        # Every bank is its own array, TTF2C_BANK_ATTR can put it into a section of the external flash
+        if arrays:
+            f.write("#ifndef TTF2C_BANK_ATTR\n"
+                    "#ifdef __GNUC__\n"
+                    f"#define TTF2C_BANK_ATTR(bank) __attribute__((aligned({BANK_ALIGN})))\n"
+                    "#else\n"
+                    "#define TTF2C_BANK_ATTR(bank)\n"
+                    "#endif\n"
+                    "#endif\n\n")
+            for i, ((start, stop), data) in enumerate(zip(banks.ranges, banks.data)):
+                f.write(f"// Bank {i}: {banks.char_set[start]:#x}-{banks.char_set[stop - 1]:#x}, "
+                        f"{stop - start} glyph(s), {data.size} byte(s)\n")
+                f.write(f"static const uint8_t {font_name}_bank{i}[] TTF2C_BANK_ATTR({i}) = {{\n")
+                f.write(hex_lines(data))
+                f.write("};\n\n")
+            f.write(f"const uint8_t *const {font_name}_bank_data[] = {{\n")
+            f.write("".join(f"    {font_name}_bank{i},\n" for i in range(len(banks))))
+            f.write("};\n\n")
+
+        # Bank index: offset in the bank data, size, codepoint range and glyph indexes of every bank
+        f.write(f"const uint32_t {font_name}_bank_num = {len(banks)};\n\n")
+        f.write(f"const font_bank_t {font_name}_banks[] = {{\n")
+        for (start, stop), offset, size in zip(banks.ranges, banks.offsets.tolist(), sizes):
+            first, last = banks.char_set[start], banks.char_set[stop - 1]
+            blocks = block_name(first)
+            if block_name(last) != blocks:
+                blocks += f" - {block_name(last)}"
+            f.write(f"    {{{offset}, {size}, {first:#04x}, {last:#04x}, {stop - start}, {start}}}, // {blocks}\n")
+        f.write("};\n\n")
+
+        # Kerning of a pair of glyph indexes of the whole font: glyph_base of the bank + index in the bank
+        if kern is not None:
+            for suffix, dtype, values in kern.tables:
+                f.write(array_wrap(f"{dtype}_t", f"{font_name}_{suffix}", number_lines(values)))
+            f.write(kern.c_function(font_name))
+
+        # font_t.lookup and font_t.kern take no font, so every bank has its own functions with bank glyph indexes.
+        # They use the data the bank was last read to by <font>_bank_font
+        f.write(f"static const uint8_t *{font_name}_bank_loaded[{len(banks)}];\n\n"
+                f"static int32_t {font_name}_bank_find(uint32_t bank, uint32_t code) {{\n"
+                f"    charmap_t const *charmap = (charmap_t const*){font_name}_bank_loaded[bank];\n"
+                f"    uint32_t lo = 0, hi = {font_name}_banks[bank].glyph_num;\n"
+                 "    uint32_t n = hi;\n"
+                 "    if (!charmap) return -1;\n"
+                 "    while (lo < hi) {\n"
+                 "        uint32_t mid = (lo + hi) / 2;\n"
+                 "        if (charmap[mid] < code) lo = mid + 1;\n"
+                 "        else hi = mid;\n"
+                 "    }\n"
+                 "    return (lo < n && charmap[lo] == code) ? (int32_t)lo : -1;\n"
+                 "}\n\n")
+        for i, (start, _) in enumerate(banks.ranges):
+            f.write(f"static int32_t {font_name}_bank{i}_lookup(uint32_t code) {{ "
+                    f"return {font_name}_bank_find({i}, code); }}\n")
+            if kern is not None:
+                f.write(f"static int8_t {font_name}_bank{i}_kern(uint32_t left, uint32_t right) {{ "
+                        f"return {font_name}_kerning(left + {start}u, right + {start}u); }}\n")
+        f.write("\n")
+        f.write(f"static int32_t (*const {font_name}_bank_lookups[])(uint32_t code) = {{\n")
+        f.write("".join(f"    {font_name}_bank{i}_lookup,\n" for i in range(len(banks))))
+        f.write("};\n\n")
+        if kern is not None:
+            f.write(f"static int8_t (*const {font_name}_bank_kerns[])(uint32_t left, uint32_t right) = {{\n")
+            f.write("".join(f"    {font_name}_bank{i}_kern,\n" for i in range(len(banks))))
+            f.write("};\n\n")
+
+        # Fields of a bank font which are the same in all banks
+        f.write(f"const font_t {font_name}_font = {{\n"
+                f"    .charmap = (void*)0,\n"
+                f"    .offset = (void*)0,\n"
+                f"    .width = (void*)0,\n"
+                f"    .bitmap = (void*)0,\n"
+                f"    .box = (void*)0,\n"
+                f"    .glyph_num = 0,\n"
+                f"    .baseline = {baseline_px},\n"
+                f"    .height = {max_height_px},\n"
+                f"    .mono = {int(mono)},\n"
+                f"    .max_width = {max_width_px},\n"
+                f"    .kerning = {kerning_px},\n"
+                f"    .space = {space_width_px},\n"
+                f"    .compression = {compression},\n"
+                f"    .bp = {bp},\n"
+                f"    .bn = {bn},\n"
+                f"    .am = {am},\n"
+                f"    .lookup = (void*)0,\n"
+                f"    .bpp = {bpp},\n"
+                f"    .kern = (void*)0\n"
+                 "};\n\n")
+
+        # Bank of a codepoint or -1
+        f.write(f"int32_t {font_name}_bank(uint32_t code) {{\n"
+                f"    uint32_t lo = 0, hi = {len(banks)};\n"
+                 "    while (lo < hi) {\n"
+                 "        uint32_t mid = (lo + hi) / 2;\n"
+                f"        if (code < {font_name}_banks[mid].first) hi = mid;\n"
+                f"        else if (code > {font_name}_banks[mid].last) lo = mid + 1;\n"
+                 "        else return (int32_t)mid;\n"
+                 "    }\n"
+                 "    return -1;\n"
+                 "}\n\n")
+
+        # font_t of a bank read to `data`, its arrays point into data
+        align = f"+ {BANK_ALIGN - 1}u) & ~{BANK_ALIGN - 1}u"
+        body = \
+            f"    const font_bank_t *b = &{font_name}_banks[bank];\n" \
+             "    uint32_t pos = 0;\n" \
+            f"    *font = {font_name}_font;\n" \
+            f"    {font_name}_bank_loaded[bank] = data;\n" \
+            f"    font->lookup = {font_name}_bank_lookups[bank];\n"
+        if kern is not None:
+            body += f"    font->kern = {font_name}_bank_kerns[bank];\n"
+        body += \
+             "    font->glyph_num = b->glyph_num;\n" \
+             "    font->charmap = (charmap_t const*)data;\n" \
+            f"    pos += (b->glyph_num * sizeof(charmap_t) {align};\n"
+        if banks.has_offset:
+            body += \
+             "    font->offset = (offs_t const*)(data + pos);\n" \
+            f"    pos += (b->glyph_num * sizeof(offs_t) {align};\n"
+        if banks.has_width:
+            body += \
+             "    font->width = data + pos;\n" \
+            f"    pos += (b->glyph_num {align};\n"
+        if banks.has_box:
+            body += \
+             "    font->box = data + pos;\n" \
+            f"    pos += (4u * b->glyph_num {align};\n"
+        body += "    font->bitmap = data + pos;\n"
+        f.write(f"void {font_name}_bank_font(uint32_t bank, const uint8_t *data, font_t *font) {{\n" + body + "}\n\n")
+
+        # Glyph index of a codepoint inside a bank font or -1
+        f.write(f"int32_t {font_name}_bank_lookup(const font_t *font, uint32_t code) {{\n"
+                 "    uint32_t lo = 0, hi = font->glyph_num;\n"
+                 "    while (lo < hi) {\n"
+                 "        uint32_t mid = (lo + hi) / 2;\n"
+                 "        if (font->charmap[mid] < code) lo = mid + 1;\n"
+                 "        else hi = mid;\n"
+                 "    }\n"
+                 "    return (lo < font->glyph_num && font->charmap[lo] == code) ? (int32_t)lo : -1;\n"
+                 "}\n\n")
+
+    if compression == COMPRESSION['rle']:
+        with output_file(os.path.join(output_path, 'ttf2c_rle.h'), encoding='utf-8') as f:
+            f.write(RLE_DECODER_H)
+
+    result = {
+        'bank_index': banks.index_size,
+        'banks': banks.size,
+        'kerning': kerning_bytes,
+    }
+    if not verbose:
+        return result
+
+    print(f"Glyph number: {glyph_num}")
+    print(f"Baseline: {int(baseline_px)} px")
+    print(f"Max height: {int(max_height_px)} px")
+    print(f"Max width: {int(max_width_px)} px")
+    print(f"Bits per pixel: {bpp}")
+    print(f"Banks: {len(banks)}, {banks.method}")
+    print(f"Size of bank index: {banks.index_size} byte(s)")
+    print(f"Size of banks: {banks.size} byte(s), smallest {min(sizes, default=0)} byte(s), "
+          f"largest {max(sizes, default=0)} byte(s)")
+    if touched is not None:
+        print(f"Strings of the text use {touched:.2f} bank(s) on average")
+    if kern is not None:
+        print(f"Size of kerning tables: {kerning_bytes} byte(s), {kern.method}, {len(kern.pairs)} pair(s)")
+    print(f"Overal size: {sum(result.values())} byte(s)")
+    return result
@@ -0,0 +1,254 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from .args import parser, font_path_checker, size_checker, range_checker, output_checker, img_path_checker
+from .convert import convert, font_name
+from .render import save_renderer
+from .build import Build, recording
+
+# Manifest keys of a job and their defaults, same names as the command line options
+JOB_DEFAULTS = {
+    'font': None,
+    'size': None,
+    'range': None,
+    'text': None,
+    'text_report': None,
+    'name': None,
+    'output': '.',
+    'format': 'c',
+    'img': None,
+    'img_kind': ['individual', 'line', 'map'],
+    'mono': False,
+    'inv': False,
+    'bp': 'vertical',
+    'bn': 'little',
+    'am': 'horizontal',
+    'rx': False,
+    'ry': False,
+    'no_art': False,
+    'compress': 'none',
+    'crop': False,
+    'lookup': 'auto',
+    'bpp': 1,
+    'kern': 'none',
+    'kern_min': 1,
+    'banks': 'none',
+    'bank_size': None,
+    'bank_text': None,
+    'optimize': None,
+    'renderer': False,
+    'depfile': None,
+}
+
+# Allowed values of manifest keys, the choices of the command line options
+CHOICES = {action.dest: action.choices for action in parser._actions
+           if action.choices is not None and action.dest in JOB_DEFAULTS}
+
+
+def load_manifest(path: str):
+    """Read a JSON or TOML manifest: {"output": ..., "jobs": [{"font": ..., "size": ...}, ...]}.
+
+    Top level keys other than "jobs" are defaults for every job. Relative paths are resolved against the manifest
+    directory.
+    """
+    if os.path.splitext(path)[-1].lower() == '.toml':
+        import tomllib
+        with open(path, 'rb') as f:
+            manifest = tomllib.load(f)
+    else:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    defaults = {k: v for k, v in manifest.items() if k != 'jobs'}
+
+    jobs = []
+    for i, entry in enumerate(manifest.get('jobs', [])):
+        job = dict(JOB_DEFAULTS)
+        job.update(defaults)
+        job.update(entry)
+
+        unknown = set(job) - set(JOB_DEFAULTS)
+        if unknown:
+            raise ValueError(f"Job {i}: unknown key(s) {', '.join(sorted(unknown))}")
+        if job['font'] is None or job['size'] is None:
+            raise ValueError(f"Job {i}: 'font' and 'size' are required")
+        for key, choices in CHOICES.items():
+            # Options without a default, e.g. optimize, may be left out
+            if job[key] is None and JOB_DEFAULTS[key] is None:
+                continue
+            for value in job[key] if isinstance(job[key], list) else [job[key]]:
+                if value not in choices:
+                    raise ValueError(f"Job {i}: invalid {key} {value!r}, choose from {', '.join(map(str, choices))}")
+
+        for key in ('font', 'output', 'img', 'text_report', 'depfile'):
+            if job[key] is not None:
+                job[key] = os.path.join(base_dir, job[key])
+        for key in ('text', 'bank_text'):
+            if isinstance(job[key], str):
+                job[key] = [job[key]]
+            if job[key] is not None:
+                job[key] = [os.path.join(base_dir, pattern) for pattern in job[key]]
+
+        try:
+            job['font'] = font_path_checker(job['font'])
+            job['size'] = size_checker(job['size'])
+            if isinstance(job['range'], str):
+                job['range'] = range_checker(job['range'])
+            job['output'] = output_checker(job['output'])
+            if job['img'] is not None:
+                job['img'] = img_path_checker(job['img'])
+        except (argparse.ArgumentTypeError, ValueError) as e:
+            raise ValueError(f"Job {i}: {e}")
+
+        # Several sizes of one font usually go to the same directory
+        if job['name'] is None:
+            job['name'] = f"{font_name(job['font'])}_{job['size']}"
+        jobs.append(job)
+    return jobs
+
+
+def _run_font_jobs(font, jobs, manifest=None):
+    """Run all jobs of one font in the current process, the face is parsed once. Up to date jobs are skipped."""
+    face = None
+    results = []
+    for index, job in jobs:
+        start = time.perf_counter()
+        build = Build(job, job['name'], extra_deps=[manifest] if manifest else ())
+        if build.stale() is None and not job['img']:
+            build.finish()
+            info = build.stamp['info']
+            results.append((index, job['name'], info.get('glyphs', 0), info.get('bytes', 0),
+                            time.perf_counter() - start))
+            continue
+
+        if face is None:
+            from freetype import Face
+            face = Face(font)
+        with recording() as written:
+            result = convert(font,
+                             job['size'],
+                             char_set=job['range'],
+                             mono=job['mono'],
+                             inv=job['inv'],
+                             bp=job['bp'],
+                             bn=job['bn'],
+                             am=job['am'],
+                             rx=job['rx'],
+                             ry=job['ry'],
+                             face=face,
+                             name=job['name'],
+                             compression=job['compress'],
+                             crop=job['crop'],
+                             lookup=job['lookup'],
+                             bpp=job['bpp'],
+                             kern=job['kern'],
+                             kern_min=job['kern_min'],
+                             text=job['text'],
+                             banks=job['banks'],
+                             bank_size=job['bank_size'],
+                             bank_text=job['bank_text'],
+                             optimize=job['optimize'])
+            if job['text_report'] and result.corpus is not None:
+                result.corpus.save_report(job['text_report'])
+            # The summary shows sizes of the C arrays, or of the blob if only the blob is saved
+            if job['format'] == 'c':
+                sizes = result.save_c(job['output'], art=not job['no_art'], verbose=False)
+            elif job['format'] in ('blob', 'both'):
+                sizes = result.save_blob(job['output'], verbose=False)
+                # Banked fonts always need the bank index of the C file
+                if job['format'] == 'both' or result.banks is not None:
+                    sizes = result.save_c(job['output'], art=not job['no_art'], verbose=False,
+                                          bank_arrays=job['format'] != 'blob')
+            else:
+                raise ValueError(f"Unknown format: {job['format']}")
+            if job['renderer']:
+                save_renderer(job['output'])
+        build.finish(written, glyphs=len(result.char_set), bytes=sum(sizes.values()))
+        if job['img']:
+            result.save_img(job['img'], kinds=job['img_kind'])
+        results.append((index, job['name'], len(result.char_set), sum(sizes.values()),
+                        time.perf_counter() - start))
+    return results
+
+
+def run_batch(jobs: list, workers: int = 0, manifest: str = None):
+    """Run manifest jobs grouped by font, groups are converted concurrently. Returns results in manifest order.
+
+    Fonts with more jobs than a fair share of a worker are split into several groups, each one parses the face again.
+    `manifest` is listed in the depfiles of jobs.
+    """
+    by_font = {}
+    for index, job in enumerate(jobs):
+        by_font.setdefault(job['font'], []).append((index, job))
+
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+
+    # Parsing a face is cheap next to rendering, so one font in many sizes is spread over all workers
+    share = max(1, -(-len(jobs) // workers))
+    groups = [(font, font_jobs[i:i + share]) for font, font_jobs in by_font.items()
+              for i in range(0, len(font_jobs), share)]
+    workers = min(workers, len(groups)) or 1
+
+    results = []
+    if workers == 1:
+        for font, font_jobs in groups:
+            results += _run_font_jobs(font, font_jobs, manifest)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_run_font_jobs, font, font_jobs, manifest) for font, font_jobs in groups]
+            for future in futures:
+                results += future.result()
+
+    results.sort()
+    return results
+
+
+def print_summary(results):
+    print(f"{'Job':>4}  {'Name':<32} {'Glyphs':>7} {'Bytes':>9} {'Time, s':>8}")
+    for index, name, glyphs, size, seconds in results:
+        print(f"{index:>4}  {name:<32} {glyphs:>7} {size:>9} {seconds:>8.3f}")
+    print(f"Total: {len(results)} job(s), {sum(r[3] for r in results)} byte(s), "
+          f"{sum(r[4] for r in results):.3f} s of conversion time")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='ttf2c.batch',
+                                     description='Convert several fonts and sizes described in a JSON/TOML manifest.')
+    parser.add_argument('manifest', help='Path to the .json or .toml manifest.')
+    parser.add_argument('--workers', '-w', type=int, default=0,
+                        help='Number of worker processes. Default value 0 means one per CPU core.')
+    parser.add_argument('--check', action='store_true',
+                        help='Only report stale jobs, exit status 1 if there are any. Nothing is rendered.')
+    args = parser.parse_args(argv)
+
+    try:
+        jobs = load_manifest(args.manifest)
+    except ValueError as e:
+        sys.exit(f"{args.manifest}: {e}")
+    if args.check:
+        stale = 0
+        for index, job in enumerate(jobs):
+            reason = Build(job, job['name']).stale()
+            stale += reason is not None
+            print(f"{index:>4}  {job['name']:<32} {reason or 'up to date'}")
+        sys.exit(1 if stale else 0)
+
+    start = time.perf_counter()
+    results = run_batch(jobs, args.workers, os.path.abspath(args.manifest))
+    print_summary(results)
+    print(f"Wall time: {time.perf_counter() - start:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import mmap
+import os
+import re
+import struct
+import numpy
+from .compress import COMPRESSION, rle_decode
+from .np2c import LAYOUT, ArrayLayout
+from .build import output_file
+
+# Blob layout, all numbers are little endian: header, then the sections in SECTIONS order, each one aligned to ALIGN
+# bytes. A section of an array the font does not have is empty. The header keeps the font_t fields and the
+# (offset, size) of every section relative to the start of the blob.
+MAGIC = b'T2CF'
+VERSION = 1
+ALIGN = 8
+SECTIONS = ('charmap', 'offset', 'width', 'box', 'bitmap')
+HEADER = struct.Struct('<4sHHI' 'HHHHh' 'BBBBBBBB' '2x' + 'II' * len(SECTIONS))
+HEADER_FIELDS = ('magic', 'version', 'header_size', 'glyph_num',
+                 'baseline', 'height', 'max_width', 'space', 'kerning',
+                 'mono', 'compression', 'bp', 'bn', 'am', 'bpp', 'charmap_bits', 'offset_bits')
+
+
+def symbol_name(name: str):
+    """C identifier objcopy makes of a file name."""
+    return re.sub(r'\W', '_', name)
+
+
+def align(value: int):
+    return (value + ALIGN - 1) // ALIGN * ALIGN
+
+
+def generate_blob(font_name,
+                  output_path,
+                  mono,
+                  char_set,
+                  bitmaps_pack,
+                  widths,
+                  baseline_px,
+                  max_height_px,
+                  max_width_px,
+                  kerning_px,
+                  space_width_px,
+                  compressed=None,
+                  boxes=None,
+                  layout=('vertical', 'little', 'horizontal'),
+                  bpp: int = 1,
+                  verbose: bool = True):
+    """Save the font as <font_name>.bin and the <font_name>_blob.h header which declares it for the linker.
+
+    Arrays are the same as in the C file of generate_c_file, the lookup function is the only part of the C file the
+    blob does not have.
+    """
+    arrays = ArrayLayout(mono, char_set, bitmaps_pack, compressed, boxes)
+
+    content = {
+        'charmap': numpy.asarray(char_set, dtype=f'<u{arrays.charmap_bits // 8}'),
+        'offset': numpy.asarray(arrays.offsets, dtype=f'<u{arrays.offset_bits // 8}') if arrays.has_offset else None,
+        'width': numpy.asarray(widths, dtype=numpy.uint8) if arrays.has_width else None,
+        'box': numpy.asarray(boxes, dtype=numpy.uint8) if arrays.has_box else None,
+        'bitmap': arrays.bitmap,
+    }
+
+    sections = []
+    position = align(HEADER.size)
+    for name in SECTIONS:
+        data = content[name]
+        size = 0 if data is None else data.nbytes
+        sections += [position if size else 0, size]
+        position = align(position + size)
+
+    bp, bn, am = (LAYOUT[k][v] for k, v in zip(('bp', 'bn', 'am'), layout))
+    header = HEADER.pack(MAGIC, VERSION, HEADER.size, arrays.glyph_num,
+                         baseline_px, max_height_px, max_width_px, space_width_px, kerning_px,
+                         int(mono), arrays.compression, bp, bn, am, bpp, arrays.charmap_bits, arrays.offset_bits,
+                         *sections)
+
+    path = os.path.join(output_path, font_name + '.bin')
+    with output_file(path, 'wb') as f:
+        f.write(header)
+        for name, offset in zip(SECTIONS, sections[::2]):
+            if offset:
+                f.write(b'\0' * (offset - f.tell()))
+                f.write(content[name].tobytes())
+        f.write(b'\0' * (position - f.tell()))
+
+    with output_file(os.path.join(output_path, font_name + '_blob.h'), encoding='utf-8') as f:
+        f.write(BLOB_H.format(name=font_name, symbol=symbol_name(font_name), guard=symbol_name(font_name).upper(),
+                              version=VERSION, size=position))
+
+    sizes = dict(arrays.sizes, header=position - sum(arrays.sizes.values()))
+    if verbose:
+        print(f"Glyph number: {arrays.glyph_num}")
+        for name in SECTIONS:
+            print(f"Size of {name} section: {sizes[name]} byte(s)")
+        print(f"Header and padding: {sizes['header']} byte(s)")
+        print(f"Blob size: {position} byte(s)")
+    return sizes
+
+
+class FontBlob:
+    """Read only view of a font blob. The file is memory mapped, arrays and glyphs are zero copy NumPy views into it.
+
+    Glyphs of RLE compressed fonts are decoded on access. Views keep the map open, close() works only when no
+    view of the blob is alive.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self.__mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = numpy.frombuffer(self.__mm, dtype=numpy.uint8)
+
+        if self.data.size < HEADER.size:
+            raise ValueError('Not a ttf2c font blob')
+        values = HEADER.unpack_from(self.__mm, 0)
+        header = dict(zip(HEADER_FIELDS, values))
+        if header['magic'] != MAGIC:
+            raise ValueError('Not a ttf2c font blob')
+        if header['version'] != VERSION:
+            raise ValueError(f"Unsupported font blob version {header['version']}, expected {VERSION}")
+
+        self.glyph_num = header['glyph_num']
+        self.baseline = header['baseline']
+        self.height = header['height']
+        self.max_width = header['max_width']
+        self.space = header['space']
+        self.kerning = header['kerning']
+        self.mono = bool(header['mono'])
+        self.bpp = header['bpp']
+        self.compression = {v: k for k, v in COMPRESSION.items()}[header['compression']]
+        self.bp, self.bn, self.am = ({v: k for k, v in LAYOUT[key].items()}[header[key]]
+                                     for key in ('bp', 'bn', 'am'))
+
+        dtypes = {
+            'charmap': f"<u{header['charmap_bits'] // 8}",
+            'offset': f"<u{header['offset_bits'] // 8}",
+            'width': numpy.uint8,
+            'box': numpy.uint8,
+            'bitmap': numpy.uint8,
+        }
+        sections = values[len(HEADER_FIELDS):]
+        for name, offset, size in zip(SECTIONS, sections[::2], sections[1::2]):
+            view = None
+            if size:
+                view = self.data[offset:offset + size].view(dtypes[name])
+            setattr(self, name, view)
+        if self.box is not None:
+            self.box = self.box.reshape(-1, 4)
+
+        self.shapes = self.__packed_shapes()
+        if self.offset is None:
+            # Mono glyphs of the same size go one after another
+            self.offset = numpy.arange(self.glyph_num) * int(self.shapes[0].prod() if self.glyph_num else 0)
+
+        self.__sorted = bool((self.charmap[1:] > self.charmap[:-1]).all())
+
+    def __packed_shapes(self):
+        """(rows, columns) in bytes of every stored glyph, the same as PackedGlyphs.shapes."""
+        if self.box is not None:
+            widths = self.box[:, 2].astype(numpy.intp)
+            heights = self.box[:, 3].astype(numpy.intp)
+        else:
+            widths = numpy.full(self.glyph_num, self.max_width, dtype=numpy.intp)
+            if self.width is not None:
+                widths = self.width.astype(numpy.intp)
+            heights = numpy.full(self.glyph_num, self.height, dtype=numpy.intp)
+
+        if self.bp == 'vertical':
+            shapes = numpy.stack(((heights * self.bpp + 7) // 8, widths), axis=1)
+        else:
+            shapes = numpy.stack((heights, (widths * self.bpp + 7) // 8), axis=1)
+        if self.am == 'vertical':
+            shapes = shapes[:, ::-1]
+        return shapes
+
+    def __len__(self):
+        return self.glyph_num
+
+    def __getitem__(self, i):
+        rows, columns = self.shapes[i].tolist()
+        start = int(self.offset[i])
+        if self.compression == 'rle':
+            stream = self.bitmap[start:].data
+            return numpy.frombuffer(rle_decode(stream, rows * columns), dtype=numpy.uint8).reshape(rows, columns)
+        return self.bitmap[start:start + rows * columns].reshape(rows, columns)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def index(self, code: int):
+        """Glyph index of a codepoint or -1."""
+        if self.__sorted:
+            i = int(numpy.searchsorted(self.charmap, code))
+            return i if i < self.glyph_num and self.charmap[i] == code else -1
+        found = numpy.flatnonzero(self.charmap == code)
+        return int(found[0]) if found.size else -1
+
+    def close(self):
+        self.data = self.charmap = self.offset = self.width = self.box = self.bitmap = None
+        self.__mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+BLOB_H = """\
+/******************************************************************************
+*
+* Created by ttf2c converter.
+* https://github.com/insane-person/ttf2c
+*
+* Font: {name}
+* Binary font blob {name}.bin, version {version}, {size} byte(s), little endian.
+*
+* Link the blob with objcopy, it defines _binary_{symbol}_bin_start:
+*
+*     objcopy -I binary -O <bfd target> -B <arch> \\
+*         --rename-section .data=.rodata,alloc,load,readonly,data,contents \\
+*         --set-section-alignment .data=8 {name}.bin {name}_bin.o
+*
+* or define TTF2C_INCBIN in one source file before including this header to
+* embed it with the assembler .incbin directive.
+******************************************************************************/
+#ifndef {guard}_BLOB_H
+#define {guard}_BLOB_H
+
+#include <stdint.h>
+
+#ifndef TTF2C_BLOB_T
+#define TTF2C_BLOB_T
+
+typedef struct {{
+    uint32_t offset;
+    uint32_t size;
+}} ttf2c_section_t;
+
+typedef struct {{
+    char magic[4];
+    uint16_t version;
+    uint16_t header_size;
+    uint32_t glyph_num;
+    uint16_t baseline;
+    uint16_t height;
+    uint16_t max_width;
+    uint16_t space;
+    int16_t kerning;
+    uint8_t mono;
+    uint8_t compression;
+    uint8_t bp;
+    uint8_t bn;
+    uint8_t am;
+    uint8_t bpp;
+    uint8_t charmap_bits;
+    uint8_t offset_bits;
+    uint8_t reserved[2];
+    ttf2c_section_t charmap;
+    ttf2c_section_t offset;
+    ttf2c_section_t width;
+    ttf2c_section_t box;
+    ttf2c_section_t bitmap;
+}} ttf2c_blob_t;
+
+/* Pointer to a section of the blob, NULL for arrays the font does not have */
+#define TTF2C_BLOB_SECTION(blob, name) \\
+    ((blob)->name.size ? (const void *)((const uint8_t *)(blob) + (blob)->name.offset) : (const void *)0)
+
+#endif
+
+#ifdef TTF2C_INCBIN
+__asm__(".section .rodata\\n"
+        ".balign 8\\n"
+        ".global _binary_{symbol}_bin_start\\n"
+        "_binary_{symbol}_bin_start:\\n"
+        ".incbin \\"{name}.bin\\"\\n"
+        ".global _binary_{symbol}_bin_end\\n"
+        "_binary_{symbol}_bin_end:\\n"
+        ".previous\\n");
+#endif
+
+extern const uint8_t _binary_{symbol}_bin_start[];
+extern const uint8_t _binary_{symbol}_bin_end[];
+
+#define {symbol}_blob ((const ttf2c_blob_t *)_binary_{symbol}_bin_start)
+
+#endif
+"""
@@ -0,0 +1,190 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+"""Build system integration: outputs replaced only when they change, stamps of inputs and make/ninja depfiles."""
+
+import functools
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+STAMP_VERSION = 1
+STAMP_SUFFIX = '.ttf2c.json'
+CHUNK_SIZE = 1 << 16
+
+# Options which do not change the saved files
+VOLATILE_OPTIONS = ('jobs', 'cache', 'profile', 'stats_json', 'check', 'depfile')
+
+# Permissions of new files, mkstemp creates them readable by the owner only
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+_recorder = threading.local()
+
+
+def file_hash(path: str):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def same_content(a: str, b: str):
+    """Compare two files block by block, the first difference ends the comparison."""
+    if os.path.getsize(a) != os.path.getsize(b):
+        return False
+    with open(a, 'rb') as fa, open(b, 'rb') as fb:
+        for block in iter(lambda: fa.read(CHUNK_SIZE), b''):
+            if block != fb.read(CHUNK_SIZE):
+                return False
+    return True
+
+
+@contextmanager
+def recording():
+    """Collect absolute paths of files saved with output_file in this thread."""
+    outer = getattr(_recorder, 'paths', None)
+    _recorder.paths = []
+    try:
+        yield _recorder.paths
+    finally:
+        _recorder.paths = outer
+
+
+@contextmanager
+def output_file(path: str, mode: str = 'w', **kwargs):
+    """Open a temporary file next to `path` which replaces it on close only if the content differs.
+
+    Readers never see a half written file and unchanged files keep their mtime, so dependent builds are not triggered.
+    """
+    path = os.path.abspath(path)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        if os.path.isfile(path) and same_content(tmp, path):
+            os.unlink(tmp)
+        else:
+            os.chmod(tmp, 0o666 & ~UMASK)
+            os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    paths = getattr(_recorder, 'paths', None)
+    if paths is not None and path not in paths:
+        paths.append(path)
+
+
+@functools.lru_cache(maxsize=None)
+def converter_files():
+    """Sources of the converter, a change of any of them is a new converter version."""
+    return tuple(sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))))
+
+
+@functools.lru_cache(maxsize=None)
+def converter_version():
+    h = hashlib.sha256()
+    for path in converter_files():
+        h.update(os.path.basename(path).encode())
+        h.update(file_hash(path).encode())
+    return h.hexdigest()[:16]
+
+
+def escape_dep(path: str):
+    """Path in a Makefile/Ninja depfile."""
+    return path.replace('$', '$$').replace('#', '\\#').replace(' ', '\\ ')
+
+
+def save_depfile(path: str, targets, inputs):
+    with output_file(path, encoding='utf-8') as f:
+        f.write(' '.join(escape_dep(t) for t in targets) + ':')
+        for dep in list(inputs) + list(converter_files()):
+            f.write(f' \\\n  {escape_dep(dep)}')
+        f.write('\n')
+
+
+class Build:
+    """Inputs and outputs of one conversion, kept in the stamp <output>/<name>.ttf2c.json.
+
+    The stamp has a hash of the options, the converter version and the content of every input file, and the hash of
+    every saved file. A conversion with the same hash whose outputs are unchanged is up to date. `extra_deps` are only
+    listed in the depfile, e.g. the batch manifest, whose jobs are compared by their options.
+    """
+
+    def __init__(self, options: dict, name: str, extra_deps=()):
+        self.options = options
+        self.name = name
+        self.stamp_path = os.path.join(options['output'], name + STAMP_SUFFIX)
+
+        # Imported here, the corpus saves its report with output_file
+        from .corpus import expand_sources
+        self.inputs = [os.path.abspath(options['font'])]
+        for key in ('text', 'bank_text'):
+            if options.get(key):
+                self.inputs += expand_sources(options[key])
+        self.extra_deps = [os.path.abspath(p) for p in extra_deps]
+
+        h = hashlib.sha256()
+        stable = {k: v for k, v in options.items() if k not in VOLATILE_OPTIONS}
+        h.update(json.dumps(stable, sort_keys=True, default=str).encode())
+        h.update(converter_version().encode())
+        for path in self.inputs:
+            h.update(path.encode())
+            h.update(file_hash(path).encode())
+        self.key = h.hexdigest()
+        self.stamp = self.load_stamp()
+
+    def load_stamp(self):
+        try:
+            with open(self.stamp_path, encoding='utf-8') as f:
+                stamp = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return stamp if stamp.get('version') == STAMP_VERSION else None
+
+    @property
+    def outputs(self):
+        """Absolute paths of the files saved by the last conversion."""
+        if self.stamp is None:
+            return []
+        base = os.path.dirname(self.stamp_path)
+        return [os.path.normpath(os.path.join(base, p)) for p in self.stamp['outputs']]
+
+    def stale(self):
+        """Reason to convert again or None if the saved files are up to date."""
+        if self.stamp is None:
+            return 'never converted'
+        if self.stamp['key'] != self.key:
+            return 'options, inputs or converter changed'
+        for path, digest in zip(self.outputs, self.stamp['outputs'].values()):
+            if not os.path.isfile(path):
+                return f'{path} is missing'
+            if file_hash(path) != digest:
+                return f'{path} was changed'
+        return None
+
+    def finish(self, outputs=None, **info):
+        """Save the stamp of a conversion which saved `outputs`, and the depfile. Without outputs only the depfile."""
+        if outputs is not None:
+            base = os.path.dirname(self.stamp_path)
+            self.stamp = {
+                'version': STAMP_VERSION,
+                'key': self.key,
+                'converter': converter_version(),
+                'outputs': {os.path.relpath(p, base): file_hash(p) for p in outputs},
+                'info': info,
+            }
+            with output_file(self.stamp_path, encoding='utf-8') as f:
+                json.dump(self.stamp, f, indent=2)
+                f.write('\n')
+        if self.options.get('depfile'):
+            save_depfile(self.options['depfile'], self.outputs, self.inputs + self.extra_deps)
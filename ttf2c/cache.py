@@ -0,0 +1,212 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+import numpy
+from .ttf2np import GlyphRecord, RECORD_FIELDS
+from .build import file_hash
+
+# Entry file layout: header, json meta, metrics table (int32, one row of RECORD_FIELDS per codepoint, sorted by
+# codepoint), raw FreeType bitmaps of all glyphs in the same order
+MAGIC = b'TTF2CGC1'
+HEADER = struct.Struct('<8sII')
+ENTRY_EXT = '.glyphs'
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+def default_cache_dir():
+    path = os.environ.get('TTF2C_CACHE')
+    if path:
+        return path
+    base = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'ttf2c')
+
+
+class RenderCache:
+    """On disk cache of rendered glyph records with size bounded LRU eviction.
+
+    Records are keyed by font file hash, pixel size, FreeType load flags and FreeType version. Each key is stored as
+    one memory mappable file, only requested codepoints are read from it.
+    """
+
+    def __init__(self, path: str = None, max_size: int = DEFAULT_MAX_SIZE):
+        self.path = os.path.abspath(path or default_cache_dir())
+        self.max_size = max_size
+        os.makedirs(self.path, exist_ok=True)
+
+    @staticmethod
+    def meta(font: str, size: int, flags: int):
+        import freetype
+        return {
+            'font': os.path.basename(font),
+            'font_hash': file_hash(font),
+            'size': size,
+            'flags': flags,
+            'freetype': '.'.join(str(v) for v in freetype.version()),
+        }
+
+    @staticmethod
+    def key(meta: dict):
+        items = (meta['font_hash'], meta['size'], meta['flags'], meta['freetype'])
+        return hashlib.sha256(repr(items).encode()).hexdigest()[:32]
+
+    def entry_path(self, key: str):
+        return os.path.join(self.path, key + ENTRY_EXT)
+
+    @staticmethod
+    def __read_header(mm):
+        """Meta, metrics table and offset of the bitmaps of an entry. The metrics do not reference mm."""
+        magic, meta_len, glyph_num = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a ttf2c glyph cache file')
+        meta = json.loads(bytes(mm[HEADER.size:HEADER.size + meta_len]))
+        metrics_offset = (HEADER.size + meta_len + 7) & ~7
+        metrics_end = metrics_offset + glyph_num * len(RECORD_FIELDS) * 4
+        if metrics_end > len(mm):
+            raise ValueError('Truncated ttf2c glyph cache file')
+        metrics = numpy.frombuffer(mm[metrics_offset:metrics_end], dtype='<i4')
+        return meta, metrics.reshape(glyph_num, len(RECORD_FIELDS)), metrics_end
+
+    def load(self, key: str, char_set: list = None):
+        """Return {codepoint: GlyphRecord} of cached glyphs, restricted to char_set if given.
+
+        A truncated or corrupt entry is removed and reported as a miss, its glyphs are rendered and stored again.
+        """
+        path = self.entry_path(key)
+        records = {}
+        try:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                meta, metrics, blob_offset = self.__read_header(mm)
+                codes = metrics[:, 0]
+                sizes = metrics[:, RECORD_FIELDS.index('rows')] * metrics[:, RECORD_FIELDS.index('pitch')]
+                offsets = numpy.concatenate(([0], numpy.cumsum(sizes))) + blob_offset
+                if (sizes < 0).any() or offsets[-1] > len(mm) or (numpy.diff(codes) <= 0).any():
+                    raise ValueError('Corrupt ttf2c glyph cache file')
+
+                if char_set is None:
+                    found = numpy.arange(len(codes))
+                else:
+                    wanted = numpy.asarray(char_set, dtype=numpy.int64)
+                    found = numpy.searchsorted(codes, wanted).clip(0, max(len(codes) - 1, 0))
+                    found = found[codes[found] == wanted] if len(codes) else found[:0]
+
+                for i in found.tolist():
+                    fields = dict(zip(RECORD_FIELDS, metrics[i].tolist()))
+                    fields['empty'] = bool(fields['empty'])
+                    fields['buffer'] = mm[offsets[i]:offsets[i + 1]]
+                    records[fields['code']] = GlyphRecord(**fields)
+        except FileNotFoundError:
+            return {}
+        except (ValueError, struct.error, OSError):
+            # An empty file can not be mapped at all, other damage shows up in the header or the sizes
+            self.remove(key)
+            return {}
+
+        # Mark the entry as recently used
+        os.utime(path)
+        return records
+
+    def remove(self, key: str):
+        try:
+            os.remove(self.entry_path(key))
+        except OSError:
+            pass
+
+    def store(self, key: str, meta: dict, records: list):
+        """Merge records into the entry of key and evict old entries if the cache is over its size."""
+        merged = self.load(key)
+        for r in records:
+            merged[r.code] = r
+        merged = [merged[c] for c in sorted(merged)]
+
+        meta_bytes = json.dumps(meta).encode()
+        metrics = numpy.array([[getattr(r, f) for f in RECORD_FIELDS] for r in merged], dtype='<i4')
+        padding = ((HEADER.size + len(meta_bytes) + 7) & ~7) - HEADER.size - len(meta_bytes)
+
+        # Write to a temporary file and replace, readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(meta_bytes), len(merged)))
+            f.write(meta_bytes + b'\0' * padding)
+            f.write(metrics.tobytes())
+            for r in merged:
+                f.write(r.buffer)
+        os.replace(tmp_path, self.entry_path(key))
+
+        self.prune(keep=key)
+
+    def entries(self):
+        """List of (key, meta, glyph number, bytes, last use time) sorted from least to most recently used."""
+        result = []
+        for name in os.listdir(self.path):
+            if not name.endswith(ENTRY_EXT):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                stat = os.stat(path)
+                with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    meta, metrics, _ = self.__read_header(mm)
+                    glyph_num = len(metrics)
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError, struct.error):
+                # Entries are replaced atomically, a damaged one is never read successfully
+                self.remove(name[:-len(ENTRY_EXT)])
+                continue
+            result.append((name[:-len(ENTRY_EXT)], meta, glyph_num, stat.st_size, stat.st_mtime))
+        result.sort(key=lambda e: e[4])
+        return result
+
+    def prune(self, max_size: int = None, keep: str = None):
+        """Remove least recently used entries until the cache fits max_size bytes. Returns removed keys."""
+        if max_size is None:
+            max_size = self.max_size
+        entries = self.entries()
+        total = sum(e[3] for e in entries)
+
+        removed = []
+        for key, meta, glyph_num, size, mtime in entries:
+            if total <= max_size:
+                break
+            if key == keep:
+                continue
+            os.remove(self.entry_path(key))
+            total -= size
+            removed.append(key)
+        return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='ttf2c.cache', description='Inspect and prune the glyph render cache.')
+    parser.add_argument('command', choices=['info', 'prune', 'clear'])
+    parser.add_argument('--dir', '-d', default=None, help='Cache directory. Default: $TTF2C_CACHE or ~/.cache/ttf2c')
+    parser.add_argument('--max-size', type=int, default=DEFAULT_MAX_SIZE,
+                        help=f'Size limit in bytes for prune. Default value {DEFAULT_MAX_SIZE}.')
+    args = parser.parse_args(argv)
+
+    cache = RenderCache(args.dir, max_size=args.max_size)
+    if args.command == 'info':
+        entries = cache.entries()
+        print(f"Cache: {cache.path}")
+        for key, meta, glyph_num, size, mtime in reversed(entries):
+            used = time.strftime('%Y-%m-%d %H:%M', time.localtime(mtime))
+            print(f"{key}  {meta['font']:<32} {meta['size']:>4} px {glyph_num:>7} glyph(s) {size:>10} byte(s)  {used}")
+        print(f"Total: {len(entries)} entries, {sum(e[3] for e in entries)} byte(s)")
+    else:
+        removed = cache.prune(0 if args.command == 'clear' else args.max_size)
+        print(f"Removed {len(removed)} entries")
+
+
+if __name__ == "__main__":
+    main()
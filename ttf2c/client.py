@@ -0,0 +1,115 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import argparse
+import base64
+import http.client
+import json
+import os
+import socket
+import sys
+import tempfile
+from .args import parse_args
+from .build import Build, output_file
+from .convert import font_name
+
+DEFAULT_HTTP_PORT = 8573
+
+
+def default_address():
+    """Unix socket in the temp directory, localhost HTTP where Unix sockets are not available."""
+    address = os.environ.get('TTF2C_SERVER')
+    if address:
+        return address
+    if os.name == 'posix':
+        return os.path.join(tempfile.gettempdir(), f'ttf2c-{os.getuid()}.sock')
+    return f'http://127.0.0.1:{DEFAULT_HTTP_PORT}'
+
+
+def parse_address(address: str):
+    """('http', host, port) for http://host:port addresses, ('unix', path, None) otherwise."""
+    if address.startswith('http://'):
+        host, _, port = address[len('http://'):].rstrip('/').rpartition(':')
+        return 'http', host or '127.0.0.1', int(port)
+    return 'unix', address, None
+
+
+# Requests and responses are JSON objects. Over a Unix socket a connection carries one request line and one response
+# line, over HTTP the request is the body of POST /convert (or GET /status) and the response is the body of the reply.
+def request(address: str, message: dict):
+    """Send one request to a ttf2c server and return its response."""
+    kind, host, port = parse_address(address)
+    body = json.dumps(message).encode()
+
+    if kind == 'http':
+        connection = http.client.HTTPConnection(host, port)
+        try:
+            if message.get('command') == 'status':
+                connection.request('GET', '/status')
+            else:
+                connection.request('POST', '/convert', body, {'Content-Type': 'application/json'})
+            return json.loads(connection.getresponse().read())
+        finally:
+            connection.close()
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(host)
+        s.sendall(body + b'\n')
+        with s.makefile('rb') as f:
+            return json.loads(f.readline())
+
+
+def main(argv=None):
+    """Same options as the ttf2c command, the conversion runs in the server."""
+    client_parser = argparse.ArgumentParser(add_help=False)
+    client_parser.add_argument('--server', default=default_address())
+    client_parser.add_argument('--status', action='store_true')
+    client_args, argv = client_parser.parse_known_args(argv)
+
+    build = None
+    try:
+        if client_args.status:
+            response = request(client_args.server, {'command': 'status'})
+        else:
+            # Options are checked here, paths are absolute, so the server does not depend on our working directory
+            options = vars(parse_args(argv))
+            # Up to date files are found without the server
+            build = Build(options, font_name(options['font']))
+            reason = build.stale()
+            if options['check']:
+                print(f"{build.name}: {reason or 'up to date'}")
+                sys.exit(0 if reason is None else 1)
+            if reason is None and not options['img']:
+                print(f"{build.name}: up to date")
+                build.finish()
+                return
+            response = request(client_args.server, {'command': 'convert', 'options': options})
+    except (OSError, ValueError) as e:
+        sys.exit(f"ttf2c server {client_args.server} is not available: {e}")
+
+    if not response.pop('ok', False):
+        sys.exit(f"ttf2c server: {response.get('error')}")
+
+    if client_args.status:
+        for key, value in response.items():
+            print(f"{key}: {value}")
+        return
+
+    outputs = []
+    for path, data in response['files'].items():
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with output_file(path, 'wb') as f:
+            f.write(base64.b64decode(data))
+        # Images and stats are not build outputs
+        in_img = options['img'] is not None and path.startswith(os.path.join(options['img'], ''))
+        if not in_img and path != options['stats_json']:
+            outputs.append(os.path.abspath(path))
+    build.finish(outputs)
+    sys.stdout.write(response['stdout'])
+
+
+if __name__ == '__main__':
+    main()
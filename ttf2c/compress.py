@@ -0,0 +1,201 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import numpy
+
+# Values of font_t.compression
+COMPRESSION = {
+    'none': 0,
+    'dedup': 1,
+    'rle': 2,
+}
+
+MAX_LITERAL = 128
+MAX_REPEAT = 129
+
+
+def rle_encode(data: numpy.array):
+    """PackBits like encoding of a byte array.
+
+    Control byte 0x00-0x7F is followed by 1-128 literal bytes, control byte 0x80-0xFF repeats the next byte 2-129
+    times.
+    """
+    data = numpy.asarray(data, dtype=numpy.uint8).ravel()
+    if data.size == 0:
+        return b''
+
+    # Find runs of equal bytes at once, then walk over runs instead of bytes
+    starts = numpy.flatnonzero(numpy.concatenate(([True], data[1:] != data[:-1])))
+    lengths = numpy.diff(numpy.append(starts, data.size))
+
+    out = bytearray()
+    literal = bytearray()
+
+    def flush_literal():
+        for i in range(0, len(literal), MAX_LITERAL):
+            chunk = literal[i:i + MAX_LITERAL]
+            out.append(len(chunk) - 1)
+            out.extend(chunk)
+        literal.clear()
+
+    for value, length in zip(data[starts].tolist(), lengths.tolist()):
+        if length == 1 or (length == 2 and literal):
+            # A short run costs as much as literal bytes, keep the current literal going
+            literal += bytes([value]) * length
+            continue
+        flush_literal()
+        while length >= 2:
+            n = min(length, MAX_REPEAT)
+            if length - n == 1 and n > 2:
+                # Leave two bytes for the next repeat instead of a one byte literal
+                n -= 1
+            out.append(0x80 + n - 2)
+            out.append(value)
+            length -= n
+        if length == 1:
+            literal.append(value)
+    flush_literal()
+    return bytes(out)
+
+
+def rle_decode(data: bytes, size: int):
+    out = bytearray()
+    i = 0
+    while len(out) < size:
+        control = data[i]
+        if control & 0x80:
+            out += bytes([data[i + 1]]) * ((control & 0x7f) + 2)
+            i += 2
+        else:
+            out += data[i + 1:i + control + 2]
+            i += control + 2
+    return bytes(out)
+
+
+class CompressedGlyphs:
+    """Compressed glyph streams of a PackedGlyphs.
+
+    ``data`` holds unique streams back to back, ``offsets[i]`` is the start of the stream of glyph ``i`` (identical
+    glyphs share one stream), ``owner[i]`` is the index of the glyph whose stream glyph ``i`` uses.
+    """
+
+    def __init__(self, method, data, offsets, sizes, owner, raw_sizes):
+        self.method = method
+        self.data = data
+        self.offsets = offsets
+        self.sizes = sizes
+        self.owner = owner
+        self.raw_sizes = raw_sizes
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i] + self.sizes[i]]
+
+    @property
+    def size(self):
+        return self.data.size
+
+    @property
+    def raw_size(self):
+        return int(self.raw_sizes.sum())
+
+    def decode(self, i):
+        stream = self[i].tobytes()
+        if self.method == 'rle':
+            return rle_decode(stream, int(self.raw_sizes[i]))
+        return stream
+
+
+def compress(bitmaps_pack, method: str = 'rle'):
+    """Deduplicate packed glyphs and optionally apply RLE to each unique glyph."""
+    glyph_num = len(bitmaps_pack)
+    offsets = numpy.zeros(glyph_num, dtype=numpy.intp)
+    sizes = numpy.zeros(glyph_num, dtype=numpy.intp)
+    owner = numpy.arange(glyph_num, dtype=numpy.intp)
+    raw_sizes = numpy.diff(bitmaps_pack.offsets)
+
+    streams = []
+    seen = {}
+    offset = 0
+    for i in range(glyph_num):
+        # Equal shape is part of the key, equal bytes of different shape are different glyphs
+        raw = bitmaps_pack[i]
+        key = (raw.shape, raw.tobytes())
+        if key in seen:
+            owner[i] = seen[key]
+            offsets[i] = offsets[owner[i]]
+            sizes[i] = sizes[owner[i]]
+            continue
+        seen[key] = i
+
+        stream = rle_encode(raw) if method == 'rle' else key[1]
+        streams.append(stream)
+        offsets[i] = offset
+        sizes[i] = len(stream)
+        offset += len(stream)
+
+    data = numpy.frombuffer(b''.join(streams), dtype=numpy.uint8)
+    return CompressedGlyphs(method, data, offsets, sizes, owner, raw_sizes)
+
+
+RLE_DECODER_H = """\
+/******************************************************************************
+*
+* Created by ttf2c converter.
+* https://github.com/insane-person/ttf2c
+*
+* Streaming decoder of RLE compressed glyphs (font_t.compression == 2).
+* Glyph i starts at font.bitmap + font.offset[i]. Bytes come out in the
+* same order as in an uncompressed glyph, so a glyph can be decoded row by
+* row into a buffer of one row:
+*
+*     ttf2c_rle_t rle;
+*     ttf2c_rle_init(&rle, font.bitmap + font.offset[i]);
+*     for (row = 0; row < rows; row++) {
+*         ttf2c_rle_read(&rle, row_buf, row_bytes);
+*         ...
+*     }
+******************************************************************************/
+#ifndef TTF2C_RLE_H
+#define TTF2C_RLE_H
+
+#include <stdint.h>
+
+typedef struct {
+    uint8_t const* src;
+    uint8_t count;
+    uint8_t repeat;
+    uint8_t value;
+} ttf2c_rle_t;
+
+static inline void ttf2c_rle_init(ttf2c_rle_t* rle, uint8_t const* src) {
+    rle->src = src;
+    rle->count = 0;
+    rle->repeat = 0;
+    rle->value = 0;
+}
+
+static inline void ttf2c_rle_read(ttf2c_rle_t* rle, uint8_t* dst, uint16_t n) {
+    while (n--) {
+        if (rle->count == 0) {
+            uint8_t control = *rle->src++;
+            rle->repeat = control & 0x80;
+            if (rle->repeat) {
+                rle->count = (uint8_t)((control & 0x7f) + 2);
+                rle->value = *rle->src++;
+            } else {
+                rle->count = (uint8_t)(control + 1);
+            }
+        }
+        *dst++ = rle->repeat ? rle->value : *rle->src++;
+        rle->count--;
+    }
+}
+
+#endif
+"""
@@ -0,0 +1,287 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import os
+from .ttf2np import GlyphSet
+from .corpus import TextCorpus, expand_sources, string_spans
+from .bank import build_banks, generate_banked_c_file
+from .optimize import COST_MODELS, rank_layouts
+from .np2c import generate_c_file
+from .blob import generate_blob
+from .compress import compress
+from .lookup import plan_lookup
+from .kerning import plan_kerning
+from .profile import NULL_PROFILE
+
+
+class Font:
+    """Converted font kept in memory: glyph set, packed bitmaps and the options they were made with."""
+
+    def __init__(self, name, glyph_set, bitmaps_pack, inv, bp, bn, am='horizontal', compressed=None,
+                 cell_bitmap_size=None, lookup=None, kern=None, corpus=None, banks=None, ranking=None,
+                 profile=None):
+        self.name = name
+        self.glyph_set = glyph_set
+        self.bitmaps_pack = bitmaps_pack
+        self.compressed = compressed
+        self.cell_bitmap_size = cell_bitmap_size
+        self.lookup = lookup
+        self.kern = kern
+        self.corpus = corpus
+        self.banks = banks
+        self.ranking = ranking
+        self.inv = inv
+        self.bp = bp
+        self.bn = bn
+        self.am = am
+        self.profile = profile or NULL_PROFILE
+
+    @property
+    def char_set(self):
+        return self.glyph_set.char_set
+
+    @property
+    def bitmaps(self):
+        return self.glyph_set.bitmaps
+
+    def save_c(self, output_path: str = '.', art: bool = True, verbose: bool = True, bank_arrays: bool = True):
+        """Save the C file. A banked font gets the bank index, with `bank_arrays` also an array of every bank."""
+        if self.banks is not None:
+            return self.save_banked_c(output_path, bank_arrays, verbose)
+        with self.profile.stage('c_emission'):
+            sizes = generate_c_file(self.name,
+                                    output_path,
+                                    self.glyph_set.mono,
+                                    self.glyph_set.char_set,
+                                    self.bitmaps_pack,
+                                    self.glyph_set.bitmaps,
+                                    self.glyph_set.baseline,
+                                    self.glyph_set.max_height,
+                                    self.glyph_set.max_width,
+                                    self.glyph_set.kerning_px,
+                                    self.glyph_set.space_width_px,
+                                    art=art,
+                                    verbose=verbose,
+                                    compressed=self.compressed,
+                                    widths=self.glyph_set.widths,
+                                    boxes=self.glyph_set.boxes,
+                                    cell_bitmap_size=self.cell_bitmap_size,
+                                    layout=(self.bp, self.bn, self.am),
+                                    lookup=self.lookup,
+                                    kern=self.kern,
+                                    bpp=self.glyph_set.bpp)
+        for array, size in sizes.items():
+            self.profile.count(f'{array}_bytes', size)
+        return sizes
+
+    def save_banked_c(self, output_path: str = '.', arrays: bool = True, verbose: bool = True):
+        with self.profile.stage('c_emission'):
+            sizes = generate_banked_c_file(self.name,
+                                           output_path,
+                                           self.banks,
+                                           self.glyph_set.mono,
+                                           self.glyph_set.baseline,
+                                           self.glyph_set.max_height,
+                                           self.glyph_set.max_width,
+                                           self.glyph_set.kerning_px,
+                                           self.glyph_set.space_width_px,
+                                           layout=(self.bp, self.bn, self.am),
+                                           bpp=self.glyph_set.bpp,
+                                           kern=self.kern,
+                                           arrays=arrays,
+                                           verbose=verbose)
+        for array, size in sizes.items():
+            self.profile.count(f'{array}_bytes', size)
+        return sizes
+
+    def save_blob(self, output_path: str = '.', verbose: bool = True):
+        """Save the binary blob, for a banked font <font>_banks.bin with all banks."""
+        if self.banks is not None:
+            with self.profile.stage('blob_emission'):
+                size = self.banks.save_data(self.name, output_path)
+            if verbose:
+                print(f"Size of {self.name}_banks.bin: {size} byte(s)")
+            return {'banks': size}
+        with self.profile.stage('blob_emission'):
+            sizes = generate_blob(self.name,
+                                  output_path,
+                                  self.glyph_set.mono,
+                                  self.glyph_set.char_set,
+                                  self.bitmaps_pack,
+                                  self.glyph_set.widths,
+                                  self.glyph_set.baseline,
+                                  self.glyph_set.max_height,
+                                  self.glyph_set.max_width,
+                                  self.glyph_set.kerning_px,
+                                  self.glyph_set.space_width_px,
+                                  compressed=self.compressed,
+                                  boxes=self.glyph_set.boxes,
+                                  layout=(self.bp, self.bn, self.am),
+                                  bpp=self.glyph_set.bpp,
+                                  verbose=verbose)
+        for section, size in sizes.items():
+            self.profile.count(f'blob_{section}_bytes', size)
+        return sizes
+
+    def save_img(self, path: str, kinds=('individual', 'line', 'map')):
+        # Pillow and rpack are only needed here
+        from .glyph_img import draw_glyphs
+        with self.profile.stage('images'):
+            draw_glyphs(self.glyph_set.cell_bitmaps, path, inverse=self.inv, bpp=self.glyph_set.bpp, kinds=kinds,
+                        codes=self.glyph_set.char_set)
+
+
+def font_name(font: str):
+    base = os.path.basename(font)
+    return os.path.splitext(base)[0]
+
+
+def convert(font: str,
+            size: int,
+            char_set: list = None,
+            mono: bool = False,
+            inv: bool = False,
+            bp: str = 'vertical',
+            bn: str = 'little',
+            am: str = 'horizontal',
+            rx: bool = False,
+            ry: bool = False,
+            jobs: int = 1,
+            face=None,
+            name: str = None,
+            cache=None,
+            compression: str = 'none',
+            crop: bool = False,
+            lookup: str = 'auto',
+            bpp: int = 1,
+            kern: str = 'none',
+            kern_min: int = 1,
+            text=None,
+            banks: str = 'none',
+            bank_size: int = None,
+            bank_text=None,
+            optimize=None,
+            profile=None,
+            glyph_set: GlyphSet = None):
+    """Convert a .ttf font to packed glyph bitmaps in memory. Parameters are the same as the CLI options.
+
+    `text` is a list of text files or glob patterns (or a scanned ttf2c.corpus.TextCorpus), the codepoints they use
+    which the font has are converted in addition to char_set, see Font.corpus for the sources of every codepoint.
+    `banks` splits the font into banks by Unicode 'block' or by 'size' of `bank_size` bytes, banks are planned to keep
+    strings of `bank_text` (files or glob patterns, by default the text of `text`) in as few banks as possible.
+    `optimize` is the name of a cost model of ttf2c.optimize.COST_MODELS or a CostModel. The cheapest combination of
+    bp, am, mono, crop, compression and lookup replaces the given ones, Font.ranking keeps all of them ranked.
+    `profile` is a ttf2c.profile.Profile which collects timings, peak memory and counters of every stage.
+    `glyph_set` is an already rendered glyph set of the font, size, char_set, mono and bpp (with kerning pairs if
+    `kern` is not 'none'), it is changed in place, pass GlyphSet.copy() to keep the original. With `text` it must be
+    rendered for the codepoints TextCorpus.char_set returned.
+    """
+    if profile is None:
+        profile = NULL_PROFILE
+
+    # Codepoints used by the text sources, only ones the font has glyphs for
+    corpus = None
+    if text is not None:
+        with profile.stage('charset'):
+            corpus = text if isinstance(text, TextCorpus) else TextCorpus.scan(text)
+            # A given glyph set is already rendered for the codepoints of the corpus
+            if glyph_set is None:
+                if face is None:
+                    from freetype import Face
+                    face = Face(font)
+                char_set = corpus.char_set(face, char_set)
+        profile.count('text_sources', len(corpus.sources))
+        profile.count('text_codepoints', len(corpus.font_codes))
+        profile.count('text_missing', len(corpus.missing))
+
+    if glyph_set is None:
+        glyph_set = GlyphSet(font=font, size=size, char_set=char_set, mono=mono, jobs=jobs, face=face,
+                             cache=cache, bpp=bpp, kern=kern != 'none', profile=profile)
+
+    kerning = None
+    if kern != 'none':
+        with profile.stage('kerning'):
+            kerning = plan_kerning(glyph_set.kerning_pairs, len(glyph_set.char_set), kern, kern_min)
+        profile.count('kerning_pairs_kept', len(kerning.pairs))
+
+    # Search the layout options for the cheapest one, it replaces bp, bn, am, mono, crop, compression and lookup
+    ranking = None
+    if optimize is not None:
+        model = COST_MODELS[optimize] if isinstance(optimize, str) else optimize
+        with profile.stage('optimize'):
+            ranking = rank_layouts(glyph_set, inv=inv, rx=rx, ry=ry, bn=bn, kern=kerning, model=model)
+        profile.count('layouts_compared', len(ranking))
+        best = ranking[0].options
+        bp, bn, am, crop, compression, lookup = (best[k] for k in ('bp', 'bn', 'am', 'crop', 'compress', 'lookup'))
+        if best['mono'] != glyph_set.mono:
+            glyph_set = glyph_set.placed(best['mono'])
+
+    with profile.stage('transform'):
+        # Bit conversions over each glyph
+        # Inverse (mirror) array in X direction
+        if rx:
+            glyph_set.flip(1)
+
+        # Inverse (mirror) array in Y direction
+        if ry:
+            glyph_set.flip(0)
+
+        # Inverse bits (color)
+        if inv:
+            glyph_set.inverse()
+
+    # Page layout of SSD1306/ST7565 like controllers: bytes are 8 pixel columns with LSB on top,
+    # pages go one after another
+    if am == 'page':
+        bp = 'vertical'
+        bn = 'little'
+
+    # Pack bits to bytes
+    axis = 0
+    if bp == 'horizontal':
+        axis = 1
+
+    # Keep only the ink box of glyphs
+    cell_bitmap_size = None
+    if crop:
+        with profile.stage('crop'):
+            cell_bitmap_size = glyph_set.pack_size(axis)
+            glyph_set.crop(align=8 // bpp if am == 'page' else 1)
+
+    with profile.stage('pack'):
+        bitmap_packed = glyph_set.pack(axis, bn, 'vertical' if am == 'vertical' else 'horizontal')
+    profile.count('glyphs', len(bitmap_packed))
+    profile.count('packed_bytes', bitmap_packed.size)
+
+    # Deduplicate and compress packed glyphs
+    compressed = None
+    if compression != 'none':
+        with profile.stage('compress'):
+            compressed = compress(bitmap_packed, compression)
+        profile.count('compressed_bytes', compressed.size)
+
+    if name is None:
+        name = font_name(font)
+    with profile.stage('lookup'):
+        lookup = plan_lookup(glyph_set.char_set, lookup)
+
+    # Banks of consecutive codepoints, which firmware loads one at a time
+    font_banks = None
+    if banks != 'none':
+        with profile.stage('banks'):
+            spans = None
+            if bank_text is not None:
+                spans = string_spans(expand_sources(bank_text), glyph_set.char_set)
+            elif corpus is not None:
+                spans = string_spans(corpus.paths, glyph_set.char_set)
+            font_banks = build_banks(glyph_set.char_set, bitmap_packed, glyph_set.widths, glyph_set.mono,
+                                     boxes=glyph_set.boxes, compression=compression, method=banks, budget=bank_size,
+                                     spans=spans)
+        profile.count('banks', len(font_banks))
+
+    return Font(name, glyph_set, bitmap_packed, inv=inv, bp=bp, bn=bn, am=am, compressed=compressed,
+                cell_bitmap_size=cell_bitmap_size, lookup=lookup, kern=kerning, corpus=corpus,
+                banks=font_banks, ranking=ranking, profile=profile)
@@ -0,0 +1,228 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import glob
+import json
+import os
+import re
+from .build import output_file
+
+CHUNK_SIZE = 1 << 16
+REPORT_VERSION = 1
+
+# Files of these types are scanned for string literals, other files contribute every character
+SOURCE_KINDS = {
+    '.c': 'c', '.h': 'c', '.cc': 'c', '.cpp': 'c', '.cxx': 'c', '.hh': 'c', '.hpp': 'c', '.inc': 'c',
+    '.po': 'po', '.pot': 'po',
+    '.json': 'json',
+}
+
+# Tokens of every kind of source, group 1 is the body of a complete string literal. Every position of the text is
+# matched by some alternative, the last ones match unterminated comments and literals up to the end of the chunk.
+# JSON object keys are not text, a JSON string takes the whitespace after it, so one at the end of a chunk waits for
+# the next chunk to tell whether a colon follows.
+TOKENS = {
+    'c': re.compile(r'//[^\n]*|/\*.*?\*/|\'(?:[^\'\\\n]|\\.)*\'|"((?:[^"\\\n]|\\.)*)"|[^/\'"]+|'
+                    r'/\*.*|\'(?:[^\'\\\n]|\\.)*\\?|"(?:[^"\\\n]|\\.)*\\?|.', re.DOTALL),
+    'po': re.compile(r'#[^\n]*|"((?:[^"\\\n]|\\.)*)"|[^#"]+|"(?:[^"\\\n]|\\.)*\\?|.', re.DOTALL),
+    'json': re.compile(r'"(?:[^"\\]|\\.)*"\s*:|"((?:[^"\\]|\\.)*)"\s*|[^"]+|"(?:[^"\\]|\\.)*\\?|.', re.DOTALL),
+}
+
+# First characters of tokens which change the meaning of the text after them
+OPENERS = {'c': '/\'"', 'po': '#"', 'json': '"'}
+
+C_ESCAPE = re.compile(r'\\(?:x([0-9a-fA-F]+)|([0-7]{1,3})|u([0-9a-fA-F]{4})|U([0-9a-fA-F]{8})|(.))', re.DOTALL)
+C_SIMPLE_ESCAPES = {'a': '\a', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v'}
+
+
+def source_kind(path: str):
+    """'c', 'po' or 'json' for sources scanned for string literals, 'text' for plain text."""
+    return SOURCE_KINDS.get(os.path.splitext(path)[-1].lower(), 'text')
+
+
+def expand_sources(patterns):
+    """Files of paths and glob patterns ('**' matches directories recursively), sorted and without duplicates."""
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    paths = []
+    for pattern in patterns:
+        matches = [pattern] if os.path.isfile(pattern) else sorted(glob.glob(pattern, recursive=True))
+        files = [os.path.abspath(p) for p in matches if os.path.isfile(p)]
+        if not files:
+            raise ValueError(f'No text files match: {pattern}')
+        paths += [p for p in files if p not in paths]
+    return paths
+
+
+def c_unescape(body: str):
+    """Text of a C string literal body. \\x and octal escapes are bytes of the UTF-8 string."""
+    if '\\' not in body:
+        return body
+    data = bytearray()
+    position = 0
+    for m in C_ESCAPE.finditer(body):
+        data += body[position:m.start()].encode('utf-8', 'surrogatepass')
+        hex_value, octal, short, long, other = m.groups()
+        if hex_value is not None:
+            data.append(int(hex_value, 16) & 0xff)
+        elif octal is not None:
+            data.append(int(octal, 8) & 0xff)
+        elif short is not None or long is not None:
+            data += chr(min(int(short or long, 16), 0x10ffff)).encode('utf-8', 'surrogatepass')
+        else:
+            data += C_SIMPLE_ESCAPES.get(other, other).encode('utf-8', 'surrogatepass')
+        position = m.end()
+    data += body[position:].encode('utf-8', 'surrogatepass')
+    return data.decode('utf-8', 'replace')
+
+
+def json_unescape(body: str):
+    try:
+        return json.loads(f'"{body}"')
+    except ValueError:
+        return body
+
+
+def read_literals(f, kind: str, chunk_size: int = CHUNK_SIZE):
+    """Yield string literals of a text stream. Only the current chunk and an unfinished token are kept."""
+    tokens = TOKENS[kind]
+    openers = OPENERS[kind]
+    unescape = json_unescape if kind == 'json' else c_unescape
+    tail = ''
+    while True:
+        chunk = f.read(chunk_size)
+        text = tail + chunk
+        end = 0
+        for m in tokens.finditer(text):
+            # A comment or literal which reaches the end of the chunk can continue in the next one
+            if chunk and m.end() == len(text) and m.group(0)[0] in openers:
+                break
+            if m.group(1) is not None:
+                yield unescape(m.group(1))
+            end = m.end()
+        tail = text[end:]
+        if not chunk:
+            return
+
+
+def read_lines(f, chunk_size: int = CHUNK_SIZE):
+    """Yield lines of a text stream read in chunks."""
+    tail = ''
+    for chunk in iter(lambda: f.read(chunk_size), ''):
+        lines = (tail + chunk).split('\n')
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
+
+
+def read_strings(path: str, kind: str = None, chunk_size: int = CHUNK_SIZE):
+    """Yield the strings of a source file: string literals of C, .po and JSON files, lines of other files. Files are
+    read as UTF-8, invalid bytes become U+FFFD."""
+    kind = kind or source_kind(path)
+    with open(path, encoding='utf-8', errors='replace', newline='') as f:
+        if kind == 'text':
+            yield from read_lines(f, chunk_size)
+        else:
+            yield from read_literals(f, kind, chunk_size)
+
+
+def scan_source(path: str, kind: str = None, chunk_size: int = CHUNK_SIZE):
+    """Sorted codepoints of printable characters used by a source file, invalid UTF-8 is skipped."""
+    chars = set()
+    for string in read_strings(path, kind, chunk_size):
+        chars.update(string)
+    return sorted(ord(c) for c in chars if c.isprintable() and c != '\ufffd')
+
+
+def string_spans(paths, char_set, chunk_size: int = CHUNK_SIZE):
+    """How often strings of the sources use glyphs first:last of char_set, only glyphs of char_set are counted.
+
+    Returns {(first index, last index): number of strings} of strings with glyphs at two or more indexes.
+    """
+    index = {code: i for i, code in enumerate(char_set)}
+    spans = {}
+    for path in paths:
+        for string in read_strings(path, chunk_size=chunk_size):
+            indexes = [index[c] for c in map(ord, string) if c in index]
+            if indexes:
+                span = (min(indexes), max(indexes))
+                if span[0] != span[1]:
+                    spans[span] = spans.get(span, 0) + 1
+    return spans
+
+
+class TextCorpus:
+    """Codepoints used by a set of text sources: UI string tables, translations, C sources.
+
+    ``sources`` is a list of (path, kind, codepoints). C, .po and JSON files contribute the characters of their string
+    literals, other files all of their characters.
+    """
+
+    def __init__(self, sources):
+        self.sources = sources
+        self.missing = []
+        self.font_codes = []
+
+    @classmethod
+    def scan(cls, patterns, chunk_size: int = CHUNK_SIZE):
+        sources = []
+        for path in expand_sources(patterns):
+            kind = source_kind(path)
+            sources.append((path, kind, scan_source(path, kind, chunk_size)))
+        return cls(sources)
+
+    @property
+    def paths(self):
+        return [path for path, kind, codes in self.sources]
+
+    @property
+    def codepoints(self):
+        """Sorted distinct codepoints of all sources."""
+        codes = set()
+        for path, kind, source_codes in self.sources:
+            codes.update(source_codes)
+        return sorted(codes)
+
+    def char_set(self, face, extra=None):
+        """Codepoints of the corpus the face has glyphs for, merged with the `extra` codepoints (e.g. --range)."""
+        self.font_codes = []
+        self.missing = []
+        for code in self.codepoints:
+            (self.font_codes if face.get_char_index(code) else self.missing).append(code)
+        return sorted(set(self.font_codes).union(extra or []))
+
+    def report(self):
+        """Codepoints of every source, the ones no other source uses and the ones missing in the font."""
+        users = {}
+        for path, kind, codes in self.sources:
+            for code in codes:
+                users[code] = users.get(code, 0) + 1
+
+        missing = set(self.missing)
+        sources = []
+        for path, kind, codes in self.sources:
+            codes = [c for c in codes if c not in missing]
+            unique = [c for c in codes if users[c] == 1]
+            sources.append({'path': path,
+                            'kind': kind,
+                            'codepoints': len(codes),
+                            'codes': codes,
+                            'text': ''.join(chr(c) for c in codes),
+                            'unique': unique,
+                            'unique_text': ''.join(chr(c) for c in unique)})
+        return {
+            'version': REPORT_VERSION,
+            'codepoints': len(self.font_codes),
+            'sources': sources,
+            'missing': self.missing,
+            'missing_text': ''.join(chr(c) for c in self.missing),
+        }
+
+    def save_report(self, path: str):
+        with output_file(path, encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+            f.write('\n')
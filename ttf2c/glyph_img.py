@@ -4,49 +4,127 @@
 # See the README and LISENSE files for information on usage and redistribution.
 #
 
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import numpy
 import rpack
+import json
 import math
 import os
+from .build import output_file
 
+# Individual glyph images, all glyphs in one line, all glyphs packed into a texture atlas with a JSON index
+IMAGE_KINDS = ('individual', 'line', 'map')
 
-def draw_glyphs(glyphs: numpy.array, path: str, spaces: int = 1, inverse: bool = False):
-    sizes = []
-    glyphs_area = 0
 
-    glyph_line = numpy.full(shape=(glyphs[0].shape[0], 0), fill_value=inverse, dtype=bool)
-    spacer = numpy.full(shape=(glyphs[0].shape[0], spaces), fill_value=inverse, dtype=bool)
+def pack_rows(sizes, row_width, positions=None):
+    """Place rectangles of the same height row after row, a row is at most `row_width` wide.
 
-    for i, glyph in enumerate(glyphs):
-        # Draw single glyph img
-        im = Image.fromarray(glyph)
-        fp = os.path.join(path, f"glyph_{i}.png")
-        im.save(fp)
+    Returns the (width, height) of the map, positions are appended to `positions` if it is given.
+    """
+    height = sizes[0][1]
+    x = y = map_width = 0
+    for w, h in sizes:
+        if x and x + w > row_width:
+            x = 0
+            y += height
+        if positions is not None:
+            positions.append((x, y))
+        x += w
+        map_width = max(map_width, x)
+    return map_width, y + height
+
+
+def pack_rectangles(sizes):
+    """Positions of (width, height) rectangles in a roughly square map and the (width, height) of the map."""
+    length_of_edge = math.ceil(math.sqrt(sum(w * h for w, h in sizes)))
+
+    if len({h for w, h in sizes}) != 1:
+        positions = rpack.pack(sizes, length_of_edge, length_of_edge * 2)
+        return positions, rpack.bbox_size(sizes, positions)
+
+    # Glyph cells have the same height, so filling rows one after another wastes space only at the row ends.
+    # Unlike rpack it takes linear time, rpack needs minutes for tens of thousands of glyphs. A few row widths
+    # around the square edge are tried and the smallest map is taken.
+    widest = max(w for w, h in sizes)
+    row_widths = [max(widest, length_of_edge * k // 8) for k in range(6, 17)]
+    row_width = min(row_widths, key=lambda r: math.prod(pack_rows(sizes, r)))
+    positions = []
+    return positions, pack_rows(sizes, row_width, positions)
 
-        # create list of glyph sizes with offset
-        glyphs_area += (glyph.shape[0] + 2 * spaces) * (glyph.shape[1] + 2 * spaces)
-        sizes.append((glyph.shape[1] + 2 * spaces, glyph.shape[0] + 2 * spaces))
 
-        # create glyphs array in one line
-        glyph_line = numpy.concatenate((glyph_line, spacer, glyph), axis=1)
+def draw_glyphs(glyphs: numpy.array, path: str, spaces: int = 1, inverse: bool = False, bpp: int = 1,
+                kinds=IMAGE_KINDS, codes=None, threads: int = None):
+    """Save images of glyphs into the `path` folder, `kinds` selects which of IMAGE_KINDS are drawn.
 
-    length_of_edge = math.ceil(math.sqrt(glyphs_area))
-    positions = rpack.pack(sizes, length_of_edge, length_of_edge * 2)
+    The map is saved as glyph_map.png with glyph_map.json which holds the rectangle of every glyph in it, `codes`
+    are the codepoints of glyphs for the index. Individual images are encoded by `threads` threads, one per CPU by
+    default.
+    """
+    dtype = bool
+    background = inverse
+    scale = None
+    if bpp > 1:
+        # Stretch gray levels to 8 bit grayscale images
+        scale = numpy.uint8(255 // ((1 << bpp) - 1))
+        dtype = numpy.uint8
+        background = (1 << bpp) - 1 if inverse else 0
 
-    size_x, size_y = rpack.bbox_size(sizes, positions)
-    glyph_map = numpy.full(shape=(size_y, size_x), fill_value=inverse, dtype=bool)
+    def image(glyph):
+        if scale is not None:
+            glyph = glyph * scale
+        return Image.fromarray(glyph)
 
-    for i, (x, y) in enumerate(positions):
-        glyph = glyphs[i]
-        glyph_size_x = glyph.shape[1]
-        glyph_size_y = glyph.shape[0]
-        glyph_map[(y + spaces):(y + glyph_size_y + spaces), (x + spaces):(x + glyph_size_x + spaces)] = glyph
+    if 'individual' in kinds:
+        def save(i):
+            image(glyphs[i]).save(os.path.join(path, f"glyph_{i}.png"))
+
+        # PNG compression releases the GIL, so threads encode glyphs in parallel. Glyphs are submitted in batches
+        # to keep the number of pending futures small.
+        workers = threads or os.cpu_count() or 1
+        if workers == 1:
+            for i in range(len(glyphs)):
+                save(i)
+        else:
+            batch = workers * 64
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for start in range(0, len(glyphs), batch):
+                    for _ in executor.map(save, range(start, min(start + batch, len(glyphs)))):
+                        pass
+
+    if 'line' in kinds:
+        # One preallocated canvas, every glyph is preceded by a spacer
+        height = max(glyph.shape[0] for glyph in glyphs)
+        width = sum(glyph.shape[1] for glyph in glyphs) + spaces * len(glyphs)
+        glyph_line = numpy.full(shape=(height, width), fill_value=background, dtype=dtype)
+        x = 0
+        for glyph in glyphs:
+            x += spaces
+            glyph_line[:glyph.shape[0], x:x + glyph.shape[1]] = glyph
+            x += glyph.shape[1]
+        image(glyph_line).save(os.path.join(path, "glyph_line.png"))
+
+    if 'map' in kinds:
+        # create list of glyph sizes with offset
+        sizes = [(glyph.shape[1] + 2 * spaces, glyph.shape[0] + 2 * spaces) for glyph in glyphs]
+        positions, (size_x, size_y) = pack_rectangles(sizes)
+        glyph_map = numpy.full(shape=(size_y, size_x), fill_value=background, dtype=dtype)
 
-    im = Image.fromarray(glyph_map)
-    fp = os.path.join(path, "glyph_map.png")
-    im.save(fp)
+        for i, (x, y) in enumerate(positions):
+            glyph = glyphs[i]
+            glyph_size_x = glyph.shape[1]
+            glyph_size_y = glyph.shape[0]
+            glyph_map[(y + spaces):(y + glyph_size_y + spaces), (x + spaces):(x + glyph_size_x + spaces)] = glyph
+        image(glyph_map).save(os.path.join(path, "glyph_map.png"))
 
-    im = Image.fromarray(glyph_line)
-    fp = os.path.join(path, "glyph_line.png")
-    im.save(fp)
+        # Index of the atlas, one glyph rectangle per line. Entries are streamed, large charsets do not build the
+        # whole index in memory
+        header = {'image': 'glyph_map.png', 'width': int(size_x), 'height': int(size_y), 'bpp': int(bpp),
+                  'inverse': bool(inverse)}
+        with output_file(os.path.join(path, "glyph_map.json"), encoding='utf-8') as f:
+            f.write(json.dumps(header)[:-1] + ', "glyphs": [')
+            for i, (x, y) in enumerate(positions):
+                glyph = {'index': i, 'code': None if codes is None else int(codes[i]), 'x': int(x + spaces),
+                         'y': int(y + spaces), 'width': int(glyphs[i].shape[1]), 'height': int(glyphs[i].shape[0])}
+                f.write(('\n ' if i == 0 else ',\n ') + json.dumps(glyph))
+            f.write('\n]}\n')
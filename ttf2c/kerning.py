@@ -0,0 +1,223 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+from ctypes import byref, create_string_buffer
+import struct
+import numpy
+from freetype.raw import FT_Get_Kerning, FT_Load_Sfnt_Table
+from freetype.ft_types import FT_Long, FT_ULong
+from freetype.ft_structs import FT_Vector
+from freetype.ft_enums import FT_KERNING_DEFAULT
+from .lookup import int_type
+
+KERNING_METHODS = ['none', 'auto', 'pairs', 'classes']
+
+KERN_TAG = int.from_bytes(b'kern', 'big')
+# Coverage bits of a version 0 'kern' subtable
+KERN_HORIZONTAL = 0x1
+KERN_MINIMUM = 0x2
+KERN_CROSS_STREAM = 0x4
+
+
+def load_kern_table(face):
+    """Raw 'kern' table of the face or None."""
+    length = FT_ULong(0)
+    if FT_Load_Sfnt_Table(face._FT_Face, FT_ULong(KERN_TAG), FT_Long(0), None, byref(length)) or not length.value:
+        return None
+    buffer = create_string_buffer(length.value)
+    if FT_Load_Sfnt_Table(face._FT_Face, FT_ULong(KERN_TAG), FT_Long(0), buffer, byref(length)):
+        return None
+    return buffer.raw
+
+
+def kern_table_pairs(table: bytes):
+    """Left and right glyph ids of all horizontal pairs of format 0 subtables, both Microsoft and Apple tables."""
+    pairs = []
+    version, = struct.unpack_from('>H', table, 0)
+    if version == 0:
+        tables, = struct.unpack_from('>H', table, 2)
+        offset = 4
+    else:
+        tables, = struct.unpack_from('>I', table, 4)
+        offset = 8
+
+    for _ in range(tables):
+        if version == 0:
+            _, length, coverage = struct.unpack_from('>HHH', table, offset)
+            header = 6
+            kern_format = coverage >> 8
+            usable = coverage & KERN_HORIZONTAL and not coverage & (KERN_MINIMUM | KERN_CROSS_STREAM)
+        else:
+            length, coverage, _ = struct.unpack_from('>IHH', table, offset)
+            header = 8
+            kern_format = coverage & 0xff
+            # Vertical, cross stream and variation subtables have the high bits set
+            usable = not coverage & 0xe000
+
+        if kern_format == 0:
+            count, = struct.unpack_from('>H', table, offset + header)
+            if usable:
+                entries = numpy.frombuffer(table, dtype='>u2', count=count * 3, offset=offset + header + 8)
+                pairs.append(entries.reshape(count, 3)[:, :2].astype(numpy.int64))
+            # The 16 bit length overflows in large subtables, the number of pairs does not
+            length = header + 8 + count * 6
+        offset += length
+
+    if not pairs:
+        return numpy.zeros((0, 2), dtype=numpy.int64)
+    return numpy.unique(numpy.concatenate(pairs), axis=0)
+
+
+def kerning_pairs(face, char_set):
+    """Kerning of glyph pairs of char_set in whole pixels at the current size of the face.
+
+    Candidate pairs come from the 'kern' table, values from FT_Get_Kerning. Returns an (n, 3) array of left glyph
+    index, right glyph index and value, sorted by the left and right index. Fonts with GPOS kerning only have no
+    pairs, FreeType does not read it.
+    """
+    table = load_kern_table(face) if face.has_kerning else None
+    if table is None:
+        return numpy.zeros((0, 3), dtype=numpy.int64)
+
+    # Glyph id to indexes of char_set, several codepoints can share a glyph
+    indexes = {}
+    for i, code in enumerate(char_set):
+        indexes.setdefault(face.get_char_index(code), []).append(i)
+
+    rows = []
+    vector = FT_Vector(0, 0)
+    for left, right in kern_table_pairs(table).tolist():
+        if left not in indexes or right not in indexes:
+            continue
+        # Face.get_kerning takes codepoints, the table has glyph ids. Default mode values are grid fitted.
+        if FT_Get_Kerning(face._FT_Face, left, right, FT_KERNING_DEFAULT, byref(vector)):
+            continue
+        value = vector.x // 64
+        if value:
+            rows += [(li, ri, value) for li in indexes[left] for ri in indexes[right]]
+
+    pairs = numpy.array(rows, dtype=numpy.int64).reshape(-1, 3)
+    return pairs[numpy.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+
+class Kerning:
+    """Pair kerning emitted as C tables and a `int8_t <font>_kerning(uint32_t left, uint32_t right)` function.
+
+    'pairs' is a sorted table of left * glyph_num + right keys with their values, 'classes' maps every glyph to a left
+    and a right class and keeps a matrix of class values. ``tables`` is a list of (name suffix, NumPy element type,
+    values), the C type is the NumPy type with _t.
+    """
+
+    def __init__(self, method, glyph_num, pairs, tables, right_classes=0):
+        self.method = method
+        self.glyph_num = glyph_num
+        self.pairs = pairs
+        self.tables = tables
+        self.right_classes = right_classes
+
+    @property
+    def size(self):
+        return sum(numpy.dtype(dtype).itemsize * len(values) for name, dtype, values in self.tables)
+
+    def table(self, name):
+        for table_name, dtype, values in self.tables:
+            if table_name == name:
+                return values
+
+    def find(self, left, right):
+        """Host side implementation of the generated kerning function."""
+        if self.method == 'classes':
+            index = self.table('kern_left')[left] * self.right_classes + self.table('kern_right')[right]
+            return int(self.table('kern_class')[index])
+        if not len(self.pairs):
+            return 0
+        keys = self.table('kern_key')
+        key = left * self.glyph_num + right
+        i = numpy.searchsorted(keys, key)
+        return int(self.table('kern_value')[i]) if i < len(keys) and keys[i] == key else 0
+
+    def c_function(self, font_name):
+        """Source of `int8_t <font_name>_kerning(uint32_t left, uint32_t right)` with glyph indexes."""
+        head = f"int8_t {font_name}_kerning(uint32_t left, uint32_t right) {{\n"
+        if self.method == 'classes':
+            body = \
+                f"    if (left >= {self.glyph_num} || right >= {self.glyph_num}) return 0;\n" \
+                f"    return {font_name}_kern_class[{font_name}_kern_left[left] * {self.right_classes}u + " \
+                f"{font_name}_kern_right[right]];\n"
+        elif not len(self.pairs):
+            body = \
+                 "    (void)left;\n" \
+                 "    (void)right;\n" \
+                 "    return 0;\n"
+        else:
+            key_t = f"{self.tables[0][1]}_t"
+            body = \
+                f"    if (left >= {self.glyph_num} || right >= {self.glyph_num}) return 0;\n" \
+                f"    {key_t} key = ({key_t})left * {self.glyph_num}u + right;\n" \
+                f"    uint32_t lo = 0, hi = {len(self.pairs)};\n" \
+                 "    while (lo < hi) {\n" \
+                 "        uint32_t mid = (lo + hi) / 2;\n" \
+                f"        if ({font_name}_kern_key[mid] < key) lo = mid + 1;\n" \
+                 "        else hi = mid;\n" \
+                 "    }\n" \
+                f"    return (lo < {len(self.pairs)} && {font_name}_kern_key[lo] == key) ? " \
+                f"{font_name}_kern_value[lo] : 0;\n"
+        return head + body + "}\n\n"
+
+
+def pair_tables(pairs, glyph_num):
+    keys = pairs[:, 0] * glyph_num + pairs[:, 1]
+    return [('kern_key', f"uint{int_type(max(glyph_num * glyph_num - 1, 0))}", keys),
+            ('kern_value', 'int8', pairs[:, 2])]
+
+
+def unique_classes(matrix, axis):
+    """Classes of equal rows (axis 0) or columns (axis 1) of matrix, the class of the first one is 0."""
+    values, classes = numpy.unique(matrix, axis=axis, return_inverse=True)
+    classes = classes.reshape(-1)
+    order = numpy.argsort(numpy.arange(values.shape[axis]) != classes[0], kind='stable')
+    return numpy.take(values, order, axis=axis), numpy.argsort(order)[classes]
+
+
+def class_tables(pairs, glyph_num):
+    """Glyphs with the same kerning row (column) share a left (right) class, class 0 is glyphs without kerning."""
+    lefts, left_of = numpy.unique(pairs[:, 0], return_inverse=True)
+    rights, right_of = numpy.unique(pairs[:, 1], return_inverse=True)
+
+    # Row and column 0 stand for glyphs without kerning
+    matrix = numpy.zeros((len(lefts) + 1, len(rights) + 1), dtype=numpy.int64)
+    matrix[left_of.reshape(-1) + 1, right_of.reshape(-1) + 1] = pairs[:, 2]
+    matrix, left_class = unique_classes(matrix, 0)
+    matrix, right_class = unique_classes(matrix, 1)
+
+    left = numpy.zeros(glyph_num, dtype=numpy.int64)
+    right = numpy.zeros(glyph_num, dtype=numpy.int64)
+    left[lefts] = left_class[1:]
+    right[rights] = right_class[1:]
+    return [('kern_left', f"uint{int_type(matrix.shape[0] - 1)}", left),
+            ('kern_right', f"uint{int_type(matrix.shape[1] - 1)}", right),
+            ('kern_class', 'int8', matrix.reshape(-1))], matrix.shape[1]
+
+
+def plan_kerning(pairs, glyph_num, method: str = 'auto', threshold: int = 1):
+    """Kerning table of pairs (left index, right index, px) without pairs below `threshold` pixels, None for 'none'.
+
+    'auto' takes the smaller of 'pairs' and 'classes'. A font without kerning gets 'pairs' without tables.
+    """
+    if method == 'none':
+        return None
+
+    pairs = pairs[numpy.abs(pairs[:, 2]) >= max(threshold, 1)]
+    pairs[:, 2] = numpy.clip(pairs[:, 2], -128, 127)
+
+    candidates = []
+    if method in ('auto', 'pairs') or not len(pairs):
+        tables = pair_tables(pairs, glyph_num) if len(pairs) else []
+        candidates.append(Kerning('pairs', glyph_num, pairs, tables))
+    if method in ('auto', 'classes') and len(pairs):
+        tables, right_classes = class_tables(pairs, glyph_num)
+        candidates.append(Kerning('classes', glyph_num, pairs, tables, right_classes))
+    return min(candidates, key=lambda kerning: kerning.size)
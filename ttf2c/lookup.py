@@ -0,0 +1,193 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import numpy
+
+LOOKUP_METHODS = ['auto', 'linear', 'range', 'bsearch', 'hash']
+
+# Keys per bucket of the perfect hash, more keys give smaller displacement table and longer search
+HASH_BUCKET_SIZE = 4
+HASH_MAX_DISPLACEMENT = 0xffff
+HASH_BATCH = 256
+
+
+def mix32(x):
+    """32 bit integer hash, the generated C code computes exactly the same values."""
+    x = numpy.asarray(x, dtype=numpy.uint64) & 0xffffffff
+    x ^= x >> 16
+    x = (x * 0x45d9f3b) & 0xffffffff
+    x ^= x >> 16
+    x = (x * 0x45d9f3b) & 0xffffffff
+    x ^= x >> 16
+    return x
+
+
+def hash_slot(codes, displacement, size):
+    return mix32(numpy.asarray(codes, dtype=numpy.uint64) + displacement * 0x9e3779b9) % size
+
+
+def int_type(value):
+    for bits in [8, 16, 32]:
+        if value < (1 << bits):
+            return bits
+    return 64
+
+
+def code_runs(char_set):
+    """Start codepoints, lengths and first glyph indexes of runs of consecutive codepoints."""
+    codes = numpy.asarray(char_set, dtype=numpy.int64)
+    starts = numpy.flatnonzero(numpy.concatenate(([True], numpy.diff(codes) != 1)))
+    lengths = numpy.diff(numpy.append(starts, codes.size))
+    return codes[starts], lengths, starts
+
+
+class Lookup:
+    """Codepoint to glyph index structure emitted next to the charmap.
+
+    ``tables`` is a list of (name suffix, element bits, values) of additional C arrays.
+    """
+
+    def __init__(self, method, char_set, tables, buckets=0):
+        self.method = method
+        self.char_set = char_set
+        self.tables = tables
+        self.buckets = buckets
+
+    @property
+    def size(self):
+        return sum(bits // 8 * len(values) for name, bits, values in self.tables)
+
+    def table(self, name):
+        for table_name, bits, values in self.tables:
+            if table_name == name:
+                return values
+
+    def find(self, code):
+        """Host side implementation of the generated lookup function."""
+        if self.method == 'range':
+            starts, lengths, bases = self.table('range_start'), self.table('range_length'), self.table('range_base')
+            i = numpy.searchsorted(starts, code, side='right') - 1
+            if i >= 0 and code < starts[i] + lengths[i]:
+                return int(bases[i] + code - starts[i])
+            return -1
+        if self.method == 'hash':
+            bucket = int(mix32(code) % self.buckets)
+            index = int(self.table('hash_index')[hash_slot(code, self.table('hash_disp')[bucket], len(self.char_set))])
+            return index if self.char_set[index] == code else -1
+        i = numpy.searchsorted(self.char_set, code)
+        return int(i) if i < len(self.char_set) and self.char_set[i] == code else -1
+
+    def c_function(self, font_name, glyph_num):
+        """Source of `int32_t <font_name>_lookup(uint32_t code)`, returns glyph index or -1."""
+        head = f"int32_t {font_name}_lookup(uint32_t code) {{\n"
+        if self.method == 'linear':
+            body = \
+                f"    for (uint32_t i = 0; i < {glyph_num}; i++) {{\n" \
+                f"        if ({font_name}_charmap[i] == code) return (int32_t)i;\n" \
+                 "    }\n" \
+                 "    return -1;\n"
+        elif self.method == 'bsearch':
+            body = \
+                f"    uint32_t lo = 0, hi = {glyph_num};\n" \
+                 "    while (lo < hi) {\n" \
+                 "        uint32_t mid = (lo + hi) / 2;\n" \
+                f"        if ({font_name}_charmap[mid] < code) lo = mid + 1;\n" \
+                 "        else hi = mid;\n" \
+                 "    }\n" \
+                f"    return (lo < {glyph_num} && {font_name}_charmap[lo] == code) ? (int32_t)lo : -1;\n"
+        elif self.method == 'range':
+            body = \
+                f"    uint32_t lo = 0, hi = {len(self.table('range_start'))};\n" \
+                 "    while (lo < hi) {\n" \
+                 "        uint32_t mid = (lo + hi) / 2;\n" \
+                f"        uint32_t start = {font_name}_range_start[mid];\n" \
+                 "        if (code < start) hi = mid;\n" \
+                f"        else if (code - start >= {font_name}_range_length[mid]) lo = mid + 1;\n" \
+                f"        else return (int32_t)({font_name}_range_base[mid] + (code - start));\n" \
+                 "    }\n" \
+                 "    return -1;\n"
+        else:
+            body = \
+                 "    uint32_t x = code;\n" \
+                 "    x ^= x >> 16; x *= 0x45d9f3bu; x ^= x >> 16; x *= 0x45d9f3bu; x ^= x >> 16;\n" \
+                f"    x = code + {font_name}_hash_disp[x % {self.buckets}u] * 0x9e3779b9u;\n" \
+                 "    x ^= x >> 16; x *= 0x45d9f3bu; x ^= x >> 16; x *= 0x45d9f3bu; x ^= x >> 16;\n" \
+                f"    uint32_t i = {font_name}_hash_index[x % {glyph_num}u];\n" \
+                f"    return {font_name}_charmap[i] == code ? (int32_t)i : -1;\n"
+        return head + body + "}\n\n"
+
+
+def build_hash(char_set):
+    """Minimal perfect hash by hash and displace: keys are split in buckets, every bucket gets a displacement
+    which moves all its keys to free slots."""
+    glyph_num = len(char_set)
+    codes = numpy.asarray(char_set, dtype=numpy.uint64)
+    buckets = max(1, -(-glyph_num // HASH_BUCKET_SIZE))
+
+    while True:
+        bucket_of = mix32(codes) % buckets
+        order = numpy.argsort(-numpy.bincount(bucket_of.astype(numpy.intp), minlength=buckets), kind='stable')
+        members = [numpy.flatnonzero(bucket_of == b) for b in range(buckets)]
+
+        displacement = numpy.zeros(buckets, dtype=numpy.int64)
+        index = numpy.zeros(glyph_num, dtype=numpy.int64)
+        free = numpy.ones(glyph_num, dtype=bool)
+        failed = False
+        for b in order.tolist():
+            keys = members[b]
+            if keys.size == 0:
+                break
+            # Try a batch of displacements at once: all slots must be free and different
+            for first in range(0, HASH_MAX_DISPLACEMENT + 1, HASH_BATCH):
+                d = numpy.arange(first, min(first + HASH_BATCH, HASH_MAX_DISPLACEMENT + 1), dtype=numpy.uint64)
+                slots = numpy.sort(hash_slot(codes[keys][None, :], d[:, None], glyph_num).astype(numpy.intp), axis=1)
+                good = free[slots].all(axis=1) & (numpy.diff(slots, axis=1) != 0).all(axis=1)
+                if good.any():
+                    found = int(good.argmax())
+                    slots = hash_slot(codes[keys], d[found], glyph_num).astype(numpy.intp)
+                    free[slots] = False
+                    index[slots] = keys
+                    displacement[b] = int(d[found])
+                    break
+            else:
+                failed = True
+                break
+        if not failed:
+            return buckets, displacement, index
+        # More buckets make every one easier to place
+        buckets *= 2
+
+
+def plan_lookup(char_set, method: str = 'auto'):
+    """Analyse char_set and build the lookup structure.
+
+    'auto' takes the range table when codepoints form long runs (on average 4 or more per run), otherwise the binary
+    search over the charmap, which needs no extra tables. Unsorted charmaps can only be scanned linearly.
+    """
+    glyph_num = len(char_set)
+    if list(char_set) != sorted(char_set):
+        if method not in ('auto', 'linear'):
+            raise ValueError(f"Charmap must be sorted for '{method}' lookup")
+        method = 'linear'
+
+    starts, lengths, bases = code_runs(char_set)
+    if method == 'auto':
+        method = 'range' if glyph_num and len(starts) * 4 <= glyph_num else 'bsearch'
+
+    charmap_bits = int_type(max(char_set, default=0))
+    index_bits = int_type(glyph_num)
+
+    if method == 'range':
+        tables = [('range_start', charmap_bits, starts),
+                  ('range_length', int_type(int(lengths.max(initial=0))), lengths),
+                  ('range_base', index_bits, bases)]
+        return Lookup(method, char_set, tables)
+    if method == 'hash':
+        buckets, displacement, index = build_hash(char_set)
+        tables = [('hash_disp', int_type(int(displacement.max(initial=0))), displacement),
+                  ('hash_index', index_bits, index)]
+        return Lookup(method, char_set, tables, buckets)
+    return Lookup(method, char_set, [])
@@ -5,6 +5,31 @@
 #
 
 import os
+import numpy
+from .compress import COMPRESSION, RLE_DECODER_H
+from .build import output_file
+from .lookup import plan_lookup
+
+# Values of font_t.bp, font_t.bn and font_t.am
+LAYOUT = {
+    'bp': {'vertical': 0, 'horizontal': 1},
+    'bn': {'little': 0, 'big': 1},
+    'am': {'horizontal': 0, 'vertical': 1, 'page': 2},
+}
+
+# "0xNN, " strings for every byte value and the ascii art pixels, used to format whole glyphs at once
+HEX_TABLE = numpy.array([f"{i:#04x}, " for i in range(256)])
+ART_TABLE = numpy.array(['.', '▀'])
+GRAY_ART_RAMP = numpy.array(['.', '░', '▒', '▓', '█'])
+
+
+def art_table(bpp: int):
+    """Ascii art character of every gray level."""
+    if bpp == 1:
+        return ART_TABLE
+    max_level = (1 << bpp) - 1
+    levels = numpy.arange(max_level + 1)
+    return GRAY_ART_RAMP[(levels * (len(GRAY_ART_RAMP) - 1) + max_level // 2) // max_level]
 
 
 def var_size(value):
@@ -21,6 +46,103 @@ def array_wrap(data_type: str, pointer: str, content: str):
     return f"static const {data_type} {pointer}[] = {{\n" + content + "};\n\n"
 
 
+def join_rows(table: numpy.array, prefix: str):
+    """Join a 2D array of equal length strings into lines, each row becomes one line starting with prefix."""
+    rows = numpy.ascontiguousarray(table)
+    rows = rows.view(f"U{rows.shape[1] * rows.dtype.itemsize // 4}").ravel()
+    return prefix + f"\n{prefix}".join(rows.tolist()) + "\n"
+
+
+def hex_rows(packed: numpy.array):
+    return join_rows(HEX_TABLE[packed], "    ")
+
+
+def ascii_art(bitmap: numpy.array, table: numpy.array = ART_TABLE):
+    return join_rows(table[bitmap.view(numpy.uint8)], "//")
+
+
+def number_lines(values, per_line: int = 16):
+    values = [str(v) for v in numpy.asarray(values).tolist()]
+    return "".join("    " + ", ".join(values[i:i + per_line]) + ",\n" for i in range(0, len(values), per_line))
+
+
+def hex_lines(data: numpy.array, per_line: int = 16):
+    """Format a flat byte array as hex rows of per_line bytes."""
+    full = data.size // per_line * per_line
+    lines = ""
+    if full:
+        lines += hex_rows(data[:full].reshape(-1, per_line))
+    if full < data.size:
+        lines += hex_rows(data[full:].reshape(1, -1))
+    return lines
+
+
+def font_typedefs(charmap_t: str, offs_t: str, glyphi_t: str):
+    """Element types and the font_t structure of a C file."""
+    return \
+    f"typedef {charmap_t} charmap_t;\n" \
+    f"typedef {offs_t} offs_t;\n" \
+    f"typedef {glyphi_t} glyphi_t;\n" \
+     "\n"\
+     "typedef struct {\n"\
+     "    charmap_t const* charmap;\n"\
+     "    offs_t const* offset;\n"\
+     "    uint8_t const* width;\n"\
+     "    uint8_t const* bitmap;\n"\
+     "    uint8_t const* box;\n"\
+     "    glyphi_t glyph_num;\n"\
+     "    uint8_t baseline;\n"\
+     "    uint8_t height;\n"\
+     "    uint8_t mono;\n"\
+     "    uint8_t max_width;\n"\
+     "    uint8_t kerning;\n"\
+     "    uint8_t space;\n"\
+     "    uint8_t compression;\n"\
+     "    uint8_t bp;\n"\
+     "    uint8_t bn;\n"\
+     "    uint8_t am;\n"\
+     "    int32_t (*lookup)(uint32_t code);\n"\
+     "    uint8_t bpp;\n"\
+     "    int8_t (*kern)(uint32_t left, uint32_t right);\n"\
+     "} font_t;\n"\
+     "\n"
+
+
+class ArrayLayout:
+    """Arrays of a font and their element sizes. The C file and the binary blob are both made from it."""
+
+    def __init__(self, mono, char_set, bitmaps_pack, compressed=None, boxes=None):
+        self.glyph_num = len(char_set)
+        self.compression = COMPRESSION['none']
+        self.bitmap = bitmaps_pack.data
+        self.offsets = bitmaps_pack.offsets[:self.glyph_num]
+        if compressed is not None:
+            self.compression = COMPRESSION[compressed.method]
+            self.bitmap = compressed.data
+            self.offsets = compressed.offsets
+
+        # Compressed and cropped glyphs have different sizes, so offsets are needed even in mono mode
+        self.has_offset = not mono or compressed is not None or boxes is not None
+        self.has_width = not mono
+        self.has_box = boxes is not None
+
+        # Create variables types
+        self.glyph_index_bits = var_size(self.glyph_num)
+        self.charmap_bits = var_size(max(char_set, default=0))
+        self.offset_bits = var_size(self.bitmap.size if self.has_offset else 0)
+
+    @property
+    def sizes(self):
+        """Size in bytes of every array, 0 for arrays the font does not have."""
+        return {
+            'charmap': self.charmap_bits // 8 * self.glyph_num,
+            'width': self.glyph_num if self.has_width else 0,
+            'offset': self.offset_bits // 8 * self.glyph_num if self.has_offset else 0,
+            'bitmap': int(self.bitmap.size),
+            'box': 4 * self.glyph_num if self.has_box else 0,
+        }
+
+
 def generate_c_file(font_name,
                     output_path,
                     mono,
@@ -31,99 +153,71 @@ def generate_c_file(font_name,
                     max_height_px,
                     max_width_px,
                     kerning_px,
-                    space_width_px):
-
-    # Init vars to determine the size of С variables
-    max_glyph_value = 0
-    offset = 0
-    bitmap_array_size = 0
-
-    # Array strings
-    charmap_string = ""
-    bitmap_string = ""
-    offset_string = ""
-    width_string = ""
-
-    # Fill array strings and size variables
-    for i, glyph_id in enumerate(char_set):
-        # Create universal comment:
-        comment_short = f"{i}, '{chr(glyph_id)}' "
-        comment = f", //{comment_short} \n"
-
-        # Char map
-        max_glyph_value = max(glyph_id, max_glyph_value)
-        charmap_string += array_element(glyph_id, comment)
-
-        # Offset + width
-        if not mono:
-            offset_string += array_element(offset, comment)
-            width_string += array_element(bitmaps[i].shape[1], comment)
-
-            offset += bitmaps_pack[i].size
-
-        # Bitmap
-        bitmap_array_size += bitmaps_pack[i].size
-        # Write glyph representation by ascii art in comment
-        bitmap_string += f"//Char {comment_short}size:{bitmaps_pack[i].shape[1]}x{bitmaps_pack[i].shape[0]}\n"
-        for x in bitmaps[i]:
-            bitmap_string += f'//'
-            for y in x:
-                if y:
-                    bitmap_string += f'▀'
-                else:
-                    bitmap_string += f'.'
-            bitmap_string += f'\n'
-
-        # Write glyph array
-        for x in bitmaps_pack[i]:
-            bitmap_string += f"    "
-            for y in x:
-                bitmap_string += f"{y:#04x}, "
-            bitmap_string += '\n'
-        bitmap_string += '\n'
-
-    # Create variables types
-    glyph_num = len(char_set)
-    glyph_index_bits = var_size(glyph_num.bit_length())
-
-    charmap_bits = var_size(max_glyph_value)
-    charmap_bytes = (charmap_bits // 8) * len(bitmaps_pack)
-
-    offset_bits = var_size(offset)
-    offset_bytes = (charmap_bits // 8) * len(bitmaps_pack)
-
-    width_bytes = len(bitmaps_pack)
-
-    glyphi_t = f"uint{glyph_index_bits}_t"
-    charmap_t = f"uint{charmap_bits}_t"
-    offs_t = f"uint{offset_bits}_t"
+                    space_width_px,
+                    art: bool = True,
+                    verbose: bool = True,
+                    compressed=None,
+                    widths=None,
+                    boxes=None,
+                    cell_bitmap_size=None,
+                    layout=('vertical', 'little', 'horizontal'),
+                    lookup=None,
+                    kern=None,
+                    bpp: int = 1):
+
+    # Sizes are known before anything is written, so the file can be streamed section by section
+    arrays = ArrayLayout(mono, char_set, bitmaps_pack, compressed, boxes)
+    glyph_num = arrays.glyph_num
+    compression = arrays.compression
+    offsets = arrays.offsets
+    array_sizes = arrays.sizes
+    charmap_bytes = array_sizes['charmap']
+    offset_bytes = array_sizes['offset']
+    width_bytes = array_sizes['width']
+    bitmap_array_size = array_sizes['bitmap']
+    box_bytes = array_sizes['box']
+
+    # Codepoint to glyph index structure
+    if lookup is None:
+        lookup = plan_lookup(char_set)
+    lookup_bytes = lookup.size
+    kerning_bytes = kern.size if kern is not None else 0
+
+    # Glyph widths are the cell widths, bitmaps may be cropped
+    if widths is None:
+        widths = [bitmap.shape[1] for bitmap in bitmaps]
+
+    glyphi_t = f"uint{arrays.glyph_index_bits}_t"
+    charmap_t = f"uint{arrays.charmap_bits}_t"
+    offs_t = f"uint{arrays.offset_bits}_t"
 
     # Create array(pointers) names
     charmap_p = f"{font_name}_charmap"
     offset_p = f"{font_name}_offset"
     width_p = f"{font_name}_width"
     bitmap_p = f"{font_name}_bitmap"
+    box_p = f"{font_name}_box" if arrays.has_box else "(void*)0"
+    kern_p = f"{font_name}_kerning" if kern is not None else "(void*)0"
 
-    # Wrap arrays
-    charmap_string = array_wrap(charmap_t, charmap_p, charmap_string)
-    bitmap_string = array_wrap("uint8_t", bitmap_p, bitmap_string)
-    offset_string = array_wrap(offs_t, offset_p, offset_string)
-    width_string = array_wrap("uint8_t", width_p, width_string)
+    if not arrays.has_width:
+        width_p = "(void*)0"
 
+    if not arrays.has_offset:
+        offset_p = "(void*)0"
 
-    if mono:
-        offset_bytes = 0
-        width_bytes = 0
+    bp, bn, am = (LAYOUT[k][v] for k, v in zip(('bp', 'bn', 'am'), layout))
+    art_chars = art_table(bpp)
 
-        offs_t = f"uint8_t"
-        offset_string = ""
-        width_string = ""
-        offset_p = "(void*)0"
-        width_p = "(void*)0"
+    kern_line = ""
+    if kern is not None:
+        kern_line = f"* Kerning: {kern.method}, {len(kern.pairs)} pair(s), " \
+                    f"size of kerning tables: {kerning_bytes} byte(s)\n"
 
+    # Universal comments
+    comments_short = [f"{i}, '{chr(glyph_id)}' " for i, glyph_id in enumerate(char_set)]
+    comments = [f", //{comment_short} \n" for comment_short in comments_short]
 
-    # Create output file
-    template = \
+    header = \
     "/******************************************************************************\n" \
      "*\n" \
     f"* Created by ttf2c converter.\n" \
@@ -135,61 +229,148 @@ def generate_c_file(font_name,
     f"* Size of width array:  {width_bytes} byte(s)\n" \
     f"* Size of offset array: {offset_bytes} byte(s)\n" \
     f"* Size of bitmap array: {bitmap_array_size} byte(s)\n" \
+    f"* Layout: bp {layout[0]}, bn {layout[1]}, am {layout[2]}\n" \
+    f"* Bits per pixel: {bpp}\n" \
+    f"* Lookup: {lookup.method}, size of lookup tables: {lookup_bytes} byte(s)\n" \
+    f"* Compression: {compressed.method if compressed is not None else 'none'}\n" \
+    f"{f'* Size of box array: {box_bytes} byte(s)' + chr(10) if boxes is not None else ''}" \
+    f"{kern_line}" \
      "******************************************************************************/\n" \
      "#include <stdint.h>\n" \
-     "\n"\
-    f"typedef {charmap_t} charmap_t;\n" \
-    f"typedef {offs_t} offs_t;\n" \
-    f"typedef {glyphi_t} glyphi_t;\n" \
-     "\n"\
-     "typedef struct {\n"\
-     "    charmap_t const* charmap;\n"\
-     "    offs_t const* offset;\n"\
-     "    uint8_t const* width;\n"\
-     "    uint8_t const* bitmap;\n"\
-     "    glyphi_t glyph_num;\n"\
-     "    uint8_t baseline;\n"\
-     "    uint8_t height;\n"\
-     "    uint8_t mono;\n"\
-     "    uint8_t max_width;\n"\
-     "    uint8_t kerning;\n"\
-     "    uint8_t space;\n"\
-     "} font_t;\n"\
-     "\n"\
-    f"{charmap_string}" \
-    f"{offset_string}" \
-    f"{width_string}" \
-    f"{bitmap_string}" \
+     "\n" + \
+    font_typedefs(charmap_t, offs_t, glyphi_t)
+
+    footer = \
     f"const font_t {font_name}_font = {{\n" \
     f"    .charmap = {charmap_p},\n" \
     f"    .offset = {offset_p},\n" \
     f"    .width = {width_p},\n" \
     f"    .bitmap = {bitmap_p},\n" \
+    f"    .box = {box_p},\n" \
     f"    .glyph_num = {glyph_num},\n" \
     f"    .baseline = {baseline_px},\n" \
     f"    .height = {max_height_px},\n" \
     f"    .mono = {int(mono)},\n" \
     f"    .max_width = {max_width_px},\n" \
     f"    .kerning = {kerning_px},\n" \
-    f"    .space = {space_width_px}\n" \
+    f"    .space = {space_width_px},\n" \
+    f"    .compression = {compression},\n" \
+    f"    .bp = {bp},\n" \
+    f"    .bn = {bn},\n" \
+    f"    .am = {am},\n" \
+    f"    .lookup = {font_name}_lookup,\n" \
+    f"    .bpp = {bpp},\n" \
+    f"    .kern = {kern_p}\n" \
      "};\n" \
      "\n"
 
     file_name = os.path.splitext(font_name)[0] + '.c'
     path = os.path.join(output_path, file_name)
 
-    # Save to file
-    f = open(path, "w", encoding='utf-8')
-    f.write(template)
-    f.close()
+    # Stream to file
+    with output_file(path, encoding='utf-8', buffering=1 << 20) as f:
+        f.write(header)
+
+        # Char map
+        f.write(array_wrap(charmap_t, charmap_p, "".join(
+            array_element(glyph_id, comment) for glyph_id, comment in zip(char_set, comments))))
+
+        # Lookup tables
+        for suffix, bits, values in lookup.tables:
+            f.write(array_wrap(f"uint{bits}_t", f"{font_name}_{suffix}", number_lines(values)))
+
+        # Offset + width
+        if arrays.has_offset:
+            f.write(array_wrap(offs_t, offset_p, "".join(
+                array_element(int(o), comment) for o, comment in zip(offsets, comments))))
+        if arrays.has_width:
+            f.write(array_wrap("uint8_t", width_p, "".join(
+                array_element(int(width), comment) for width, comment in zip(widths, comments))))
+
+        # Ink box of every glyph inside its cell: x, y, width, height
+        if boxes is not None:
+            f.write(array_wrap("uint8_t", box_p, "".join(
+                f"    {x}, {y}, {w}, {h}{comment}" for (x, y, w, h), comment in zip(boxes.tolist(), comments))))
+
+        # Bitmap
+        f.write(f"static const uint8_t {bitmap_p}[] = {{\n")
+        for i, comment_short in enumerate(comments_short):
+            packed = bitmaps_pack[i]
+            if compressed is not None and compressed.owner[i] != i:
+                # Same bytes as an earlier glyph, only its offset is stored
+                continue
+            f.write(f"//Char {comment_short}size:{packed.shape[1]}x{packed.shape[0]}")
+            if boxes is not None:
+                f.write(f" box:{boxes[i][0]},{boxes[i][1]} {boxes[i][2]}x{boxes[i][3]}")
+            if compressed is not None:
+                f.write(f" {compressed.method}:{compressed.sizes[i]}/{packed.size} byte(s)")
+            f.write("\n")
+            # Write glyph representation by ascii art in comment
+            if art and bitmaps[i].size:
+                f.write(ascii_art(bitmaps[i], art_chars))
+            # Write glyph array
+            if compressed is not None:
+                f.write(hex_lines(compressed[i]))
+            elif packed.size:
+                f.write(hex_rows(packed))
+            f.write('\n')
+        f.write("};\n\n")
+
+        # Returns glyph index of a codepoint or -1
+        f.write(lookup.c_function(font_name, glyph_num))
+
+        # Kerning of a pair of glyph indexes in px
+        if kern is not None:
+            for suffix, dtype, values in kern.tables:
+                f.write(array_wrap(f"{dtype}_t", f"{font_name}_{suffix}", number_lines(values)))
+            f.write(kern.c_function(font_name))
+
+        f.write(footer)
+
+    if compression == COMPRESSION['rle']:
+        with output_file(os.path.join(output_path, 'ttf2c_rle.h'), encoding='utf-8') as f:
+            f.write(RLE_DECODER_H)
+
+    sizes = {
+        'charmap': charmap_bytes,
+        'width': width_bytes,
+        'offset': offset_bytes,
+        'bitmap': bitmap_array_size,
+        'box': box_bytes,
+        'lookup': lookup_bytes,
+        'kerning': kerning_bytes,
+    }
+    if not verbose:
+        return sizes
 
     # print statistics
     print(f"Glyph number: {len(char_set)}")
     print(f"Baseline: {int(baseline_px)} px")
     print(f"Max height: {int(max_height_px)} px")
     print(f"Max width: {int(max_width_px)} px")
+    print(f"Bits per pixel: {bpp}")
     print(f"Size of glyph map array: {charmap_bytes} byte(s)")
     print(f"Size of width array:  {width_bytes} byte(s)")
     print(f"Size of offset array: {offset_bytes} byte(s)")
     print(f"Size of bitmap array: {bitmap_array_size} byte(s)")
-    print(f"Overal size: {charmap_bytes + width_bytes + offset_bytes + bitmap_array_size} byte(s)")
\ No newline at end of file
+    print(f"Size of lookup tables: {lookup_bytes} byte(s), {lookup.method}")
+    if kern is not None:
+        print(f"Size of kerning tables: {kerning_bytes} byte(s), {kern.method}, {len(kern.pairs)} pair(s)")
+    if boxes is not None:
+        print(f"Size of box array: {box_bytes} byte(s)")
+        if cell_bitmap_size is not None:
+            # Glyphs which fill their cells save less than the box array takes
+            saved = cell_bitmap_size - bitmaps_pack.size - box_bytes
+            if saved >= 0:
+                result = f"saved {saved} byte(s) including box array"
+            else:
+                result = f"grew by {-saved} byte(s) including box array, --crop does not pay off for this font"
+            print(f"Crop: {bitmaps_pack.size} byte(s) of bitmaps instead of {cell_bitmap_size} byte(s) in full cells, "
+                  f"{result}")
+    if compressed is not None:
+        unique = int((compressed.owner == numpy.arange(len(compressed))).sum())
+        print(f"Compression: {compressed.method}, {unique} unique of {len(compressed)} glyph(s), "
+              f"raw bitmap {compressed.raw_size} byte(s), "
+              f"{100 * bitmap_array_size / max(compressed.raw_size, 1):.1f}% of raw")
+    print(f"Overal size: {sum(sizes.values())} byte(s)")
+    return sizes
@@ -0,0 +1,162 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import math
+from .compress import compress
+from .lookup import plan_lookup
+from .np2c import var_size
+
+# Layouts of the search: (bp, am), page addressing always packs vertically
+LAYOUTS = [('vertical', 'horizontal'), ('vertical', 'vertical'), ('horizontal', 'horizontal'),
+           ('horizontal', 'vertical'), ('vertical', 'page')]
+COMPRESSIONS = ['none', 'dedup', 'rle']
+LOOKUPS = ['linear', 'bsearch', 'range', 'hash']
+
+
+class Candidate:
+    """Options of one layout and the bytes of every array the C file would have with them.
+
+    ``work`` is the estimated number of memory reads and decoder steps needed to find and draw one glyph.
+    """
+
+    def __init__(self, options: dict, sizes: dict, work: float):
+        self.options = options
+        self.sizes = sizes
+        self.work = work
+        self.cost = 0.0
+
+    @property
+    def size(self):
+        return sum(self.sizes.values())
+
+
+class CostModel:
+    """Cost of a candidate: flash bytes plus `decode_weight` bytes for every unit of decode work of every glyph.
+
+    Subclasses can override work() to model the decoder of their firmware.
+    """
+
+    def __init__(self, decode_weight: float = 0.0):
+        self.decode_weight = decode_weight
+
+    def work(self, candidate: Candidate, glyph_num: int):
+        return candidate.work
+
+    def __call__(self, candidate: Candidate, glyph_num: int):
+        return candidate.size + self.decode_weight * glyph_num * self.work(candidate, glyph_num)
+
+
+COST_MODELS = {
+    'size': CostModel(0.0),
+    'balanced': CostModel(1.0),
+    'speed': CostModel(16.0),
+}
+
+
+def lookup_work(lookup, glyph_num: int):
+    """Reads of the lookup structure to find a glyph."""
+    if lookup.method == 'linear':
+        return glyph_num / 2
+    if lookup.method == 'bsearch':
+        return math.log2(glyph_num + 1)
+    if lookup.method == 'range':
+        return math.log2(len(lookup.table('range_start')) + 1) * 2
+    return 3
+
+
+def layout_sizes(glyph_set, axis: int, addressing: str, bn: str, compressions, mono: bool, crop: bool):
+    """(compression, array sizes, decode work per glyph) of one layout of an already transformed glyph set.
+
+    The uncompressed size comes from the sizes of glyphs alone, glyphs are packed only for compression.
+    """
+    glyph_num = len(glyph_set.char_set)
+    results = []
+    packed = None
+    for compression in compressions:
+        has_offset = not mono or crop or compression != 'none'
+        work = 1 + int(has_offset) + 2 * int(crop)
+        if compression == 'none':
+            bitmap = glyph_set.pack_size(axis)
+        else:
+            if packed is None:
+                packed = glyph_set.pack(axis, bn, addressing)
+            compressed = compress(packed, compression)
+            bitmap = compressed.size
+            if compression == 'rle':
+                # Every control and data byte of the stream goes through the decoder
+                work += float(compressed.sizes.mean()) if glyph_num else 0
+        results.append((compression, {
+            'width': 0 if mono else glyph_num,
+            'offset': var_size(bitmap) // 8 * glyph_num if has_offset else 0,
+            'bitmap': bitmap,
+            'box': 4 * glyph_num if crop else 0,
+        }, work))
+    return results
+
+
+def rank_layouts(glyph_set, inv: bool = False, rx: bool = False, ry: bool = False, bn: str = 'little',
+                 kern=None, model=None, compressions=None, lookups=None, profile=None):
+    """Size of every bp, am, mono, crop, compression and lookup combination of a rendered glyph set.
+
+    The glyph set is not changed, transforms are applied to copies. `kern` is the planned kerning, its size is the same
+    for all candidates. `model` is a CostModel or a callable of (candidate, glyph_num), by default the size. Returns
+    candidates sorted from the cheapest one.
+    """
+    if model is None:
+        model = COST_MODELS['size']
+    compressions = compressions or COMPRESSIONS
+    lookups = lookups or LOOKUPS
+    # Unsorted charmaps can only be scanned linearly
+    if list(glyph_set.char_set) != sorted(glyph_set.char_set):
+        lookups = ['linear']
+    glyph_num = len(glyph_set.char_set)
+
+    charmap = var_size(max(glyph_set.char_set, default=0)) // 8 * glyph_num
+    kerning = kern.size if kern is not None else 0
+    plans = [plan_lookup(glyph_set.char_set, method) for method in lookups]
+
+    candidates = []
+    for mono in (False, True):
+        base = glyph_set.placed(mono) if mono != glyph_set.mono else glyph_set.copy()
+        if rx:
+            base.flip(1)
+        if ry:
+            base.flip(0)
+        if inv:
+            base.inverse()
+
+        for crop in (False, True):
+            for bp, am in LAYOUTS:
+                axis = 0 if bp == 'vertical' else 1
+                layout_bn = 'little' if am == 'page' else bn
+                cells = base
+                if crop:
+                    cells = base.copy()
+                    cells.crop(align=8 // glyph_set.bpp if am == 'page' else 1)
+                addressing = 'vertical' if am == 'vertical' else 'horizontal'
+                for compression, sizes, work in layout_sizes(cells, axis, addressing, layout_bn, compressions,
+                                                             mono, crop):
+                    for lookup in plans:
+                        options = {'bp': bp, 'bn': layout_bn, 'am': am, 'mono': mono, 'crop': crop,
+                                   'compress': compression, 'lookup': lookup.method}
+                        candidate = Candidate(options,
+                                              dict(sizes, charmap=charmap, lookup=lookup.size, kerning=kerning),
+                                              work + lookup_work(lookup, glyph_num))
+                        candidate.cost = float(model(candidate, glyph_num))
+                        candidates.append(candidate)
+
+    candidates.sort(key=lambda c: (c.cost, c.size))
+    return candidates
+
+
+def print_ranking(candidates, top: int = 10):
+    print(f"{'Rank':>4}  {'bp':<10} {'am':<10} {'mono':<5} {'crop':<5} {'compress':<8} {'lookup':<7} "
+          f"{'Bytes':>9} {'Work':>8} {'Cost':>11}")
+    for rank, c in enumerate(candidates[:top], 1):
+        o = c.options
+        print(f"{rank:>4}  {o['bp']:<10} {o['am']:<10} {str(o['mono']):<5} {str(o['crop']):<5} {o['compress']:<8} "
+              f"{o['lookup']:<7} {c.size:>9} {c.work:>8.1f} {c.cost:>11.0f}")
+    print(f"{len(candidates)} layout(s) compared, the first one is saved")
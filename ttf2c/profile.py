@@ -0,0 +1,93 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+from contextlib import contextmanager, nullcontext
+import json
+import time
+import tracemalloc
+
+REPORT_VERSION = 1
+
+
+class Profile:
+    """Wall time and peak Python allocations of conversion stages plus counters of the run.
+
+    Stages run one after another, a stage entered again (e.g. by several conversions) accumulates its time and keeps
+    the highest peak. Memory is traced with tracemalloc only while a stage runs, `memory=False` turns it off.
+    """
+
+    def __init__(self, memory: bool = True):
+        self.memory = memory
+        self.stages = {}
+        self.counts = {}
+        self.__start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        started = False
+        current = 0
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started = True
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start
+            peak = 0
+            if self.memory:
+                peak = max(0, tracemalloc.get_traced_memory()[1] - current)
+                if started:
+                    tracemalloc.stop()
+
+            entry = self.stages.setdefault(name, {'calls': 0, 'wall_s': 0.0, 'peak_bytes': 0})
+            entry['calls'] += 1
+            entry['wall_s'] += wall
+            entry['peak_bytes'] = max(entry['peak_bytes'], peak)
+
+    def count(self, name: str, value: int = 1):
+        self.counts[name] = self.counts.get(name, 0) + int(value)
+
+    def report(self):
+        return {
+            'version': REPORT_VERSION,
+            'total_s': time.perf_counter() - self.__start,
+            'stages': self.stages,
+            'counts': self.counts,
+        }
+
+    def save_json(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+            f.write('\n')
+
+    def print(self):
+        report = self.report()
+        print(f"{'Stage':<12} {'Calls':>5} {'Time':>10} {'Peak memory':>14}")
+        for name, s in report['stages'].items():
+            print(f"{name:<12} {s['calls']:>5} {s['wall_s']:>8.4f} s {s['peak_bytes'] / 2 ** 20:>10.2f} MiB")
+        print(f"Total: {report['total_s']:.4f} s")
+        for name, value in report['counts'].items():
+            print(f"{name}: {value}")
+
+
+class NullProfile:
+    """Profile that records nothing, used when profiling is off."""
+
+    __stage = nullcontext()
+
+    def stage(self, name: str):
+        return self.__stage
+
+    def count(self, name: str, value: int = 1):
+        pass
+
+
+NULL_PROFILE = NullProfile()
@@ -0,0 +1,186 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import os
+from .compress import RLE_DECODER_H
+from .build import output_file
+
+RENDER_H = """\
+/******************************************************************************
+*
+* Created by ttf2c converter.
+* https://github.com/insane-person/ttf2c
+*
+* Reference text renderer of ttf2c fonts. It reads every layout, bit depth,
+* mono, cropped and compressed font through the font_t fields and draws into
+* a framebuffer of one byte per pixel (gray level 0 - 2^bpp-1). Include it
+* after the C file of the font, it needs font_t and offs_t of that file:
+*
+*     uint8_t pixels[240 * 32] = {0};
+*     ttf2c_fb_t fb = {pixels, 240, 32};
+*     ttf2c_draw_text(&MyFavoriteFont_font, &fb, 0, 0, "Hello");
+*
+* Pixels of level 0 are transparent. Glyphs are drawn line by line in the
+* order their bytes are stored, RLE glyphs are decoded one line at a time
+* into a buffer on the stack. With TTF2C_RENDER_STATS defined
+* ttf2c_render_stats counts drawn glyphs and bytes read from the glyph arrays
+* (offset, width, box and bitmap).
+******************************************************************************/
+#ifndef TTF2C_RENDER_H
+#define TTF2C_RENDER_H
+
+#include <stdint.h>
+#include "ttf2c_rle.h"
+
+typedef struct {
+    uint8_t* pixels;
+    int32_t width;
+    int32_t height;
+} ttf2c_fb_t;
+
+#ifdef TTF2C_RENDER_STATS
+static struct {
+    uint32_t glyphs;
+    uint32_t bytes;
+} ttf2c_render_stats;
+#define TTF2C_TOUCH(n) (ttf2c_render_stats.bytes += (uint32_t)(n))
+#else
+#define TTF2C_TOUCH(n) ((void)0)
+#endif
+
+static inline int32_t ttf2c_glyph_width(font_t const* font, int32_t i) {
+    if (font->width) {
+        TTF2C_TOUCH(1);
+        return font->width[i];
+    }
+    return font->max_width;
+}
+
+/* Draw glyph i with the top left corner of its cell at x, y */
+static void ttf2c_draw_glyph(font_t const* font, int32_t i, ttf2c_fb_t* fb, int32_t x, int32_t y) {
+    int32_t w = ttf2c_glyph_width(font, i);
+    int32_t h = font->height;
+    if (font->box) {
+        uint8_t const* box = font->box + 4 * i;
+        x += box[0];
+        y += box[1];
+        w = box[2];
+        h = box[3];
+        TTF2C_TOUCH(4);
+    }
+
+    /* Pixels along the packing direction (k) are packed 8 / bpp to a byte, pixels across it (m) are not */
+    uint32_t bpp = font->bpp;
+    uint32_t per_byte = 8 / bpp;
+    uint32_t k_pixels = font->bp == 0 ? (uint32_t)h : (uint32_t)w;
+    uint32_t k_bytes = (k_pixels + per_byte - 1) / per_byte;
+    uint32_t m_pixels = font->bp == 0 ? (uint32_t)w : (uint32_t)h;
+
+    /* Bytes are stored line by line, a line is either one byte step along k for every m or every k byte of one m */
+    int k_lines = (font->bp == 0) != (font->am == 1);
+    uint32_t lines = k_lines ? k_bytes : m_pixels;
+    uint32_t length = k_lines ? m_pixels : k_bytes;
+
+    uint8_t const* bits;
+    if (font->offset) {
+        bits = font->bitmap + font->offset[i];
+        TTF2C_TOUCH(sizeof(offs_t));
+    } else {
+        bits = font->bitmap + (uint32_t)i * lines * length;
+    }
+
+    /* Dimensions are uint8_t, so one line fits in 255 bytes */
+    uint8_t buffer[255];
+    ttf2c_rle_t rle;
+    if (font->compression == 2) {
+        ttf2c_rle_init(&rle, bits);
+    } else {
+        TTF2C_TOUCH(lines * length);
+    }
+#ifdef TTF2C_RENDER_STATS
+    ttf2c_render_stats.glyphs++;
+#endif
+
+    uint8_t mask = (uint8_t)((1u << bpp) - 1);
+    for (uint32_t line = 0; line < lines; line++) {
+        uint8_t const* src = bits + line * length;
+        if (font->compression == 2) {
+            ttf2c_rle_read(&rle, buffer, (uint16_t)length);
+            src = buffer;
+        }
+        for (uint32_t n = 0; n < length; n++) {
+            uint8_t byte = src[n];
+            uint32_t kb = k_lines ? line : n;
+            uint32_t m = k_lines ? n : line;
+            for (uint32_t p = 0; byte && p < per_byte && kb * per_byte + p < k_pixels; p++) {
+                uint32_t k = kb * per_byte + p;
+                uint32_t shift = font->bn == 0 ? p * bpp : 8 - bpp - p * bpp;
+                uint8_t value = (uint8_t)((byte >> shift) & mask);
+                int32_t fx = x + (int32_t)(font->bp == 0 ? m : k);
+                int32_t fy = y + (int32_t)(font->bp == 0 ? k : m);
+                if (value && fx >= 0 && fx < fb->width && fy >= 0 && fy < fb->height) {
+                    fb->pixels[fy * fb->width + fx] = value;
+                }
+            }
+        }
+    }
+    if (font->compression == 2) {
+        TTF2C_TOUCH(rle.src - bits);
+    }
+}
+
+/* Next codepoint of a UTF-8 string */
+static inline uint32_t ttf2c_utf8_next(char const** text) {
+    uint8_t const* s = (uint8_t const*)*text;
+    uint32_t code = *s++;
+    int n = code >= 0xf0 ? 3 : code >= 0xe0 ? 2 : code >= 0xc0 ? 1 : 0;
+    if (n) {
+        code &= 0x3fu >> n;
+    }
+    while (n-- && (*s & 0xc0) == 0x80) {
+        code = (code << 6) | (*s++ & 0x3f);
+    }
+    *text = (char const*)s;
+    return code;
+}
+
+/* Draw a UTF-8 string with the top left corner of the line at x, y. Returns x after the last glyph */
+static int32_t ttf2c_draw_text(font_t const* font, ttf2c_fb_t* fb, int32_t x, int32_t y, char const* text) {
+    int32_t prev = -1;
+    while (*text) {
+        int32_t i = font->lookup(ttf2c_utf8_next(&text));
+        if (i < 0) {
+            /* Space and codepoints the font has no glyphs for */
+            x += font->space;
+            prev = -1;
+            continue;
+        }
+        if (prev >= 0 && font->kern) {
+            x += font->kern((uint32_t)prev, (uint32_t)i);
+        }
+        if (fb) {
+            ttf2c_draw_glyph(font, i, fb, x, y);
+        }
+        x += ttf2c_glyph_width(font, i) + font->kerning;
+        prev = i;
+    }
+    return x;
+}
+
+/* Width of a UTF-8 string in px */
+static inline int32_t ttf2c_text_width(font_t const* font, char const* text) {
+    return ttf2c_draw_text(font, (ttf2c_fb_t*)0, 0, 0, text);
+}
+
+#endif
+"""
+
+
+def save_renderer(output_path: str = '.'):
+    """Save ttf2c_render.h and the RLE decoder it uses next to the C file."""
+    for name, text in (('ttf2c_render.h', RENDER_H), ('ttf2c_rle.h', RLE_DECODER_H)):
+        with output_file(os.path.join(output_path, name), encoding='utf-8') as f:
+            f.write(text)
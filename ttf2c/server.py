@@ -0,0 +1,290 @@
+#
+# Copyright (c) 2023 by Vasilii Tsarevkii
+#
+# See the README and LISENSE files for information on usage and redistribution.
+#
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import sys
+import tempfile
+import threading
+from argparse import Namespace
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from freetype import Face
+from . import run
+from .ttf2np import GlyphSet
+from .corpus import TextCorpus
+from .client import default_address, parse_address
+
+DEFAULT_MAX_FACES = 16
+DEFAULT_MAX_MEMORY = 256 * 1024 * 1024
+MAX_REQUEST_SIZE = 16 * 1024 * 1024
+
+
+def font_stamp(font: str):
+    """Modification time and size of a font file, a changed file gets new cache entries."""
+    stat = os.stat(font)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ThreadStdout:
+    """sys.stdout replacement which collects prints of every conversion thread separately."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        lines = getattr(self.local, 'lines', None)
+        if lines is None:
+            return self.stream.write(text)
+        lines.append(text)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    @contextmanager
+    def capture(self):
+        self.local.lines = []
+        try:
+            yield self.local.lines
+        finally:
+            del self.local.lines
+
+
+class ConversionServer:
+    """Converts fonts for clients and keeps FreeType faces and rendered glyph sets in memory.
+
+    Faces are kept for the `max_faces` most recently used font files, glyph sets while their total size is below
+    `max_memory` bytes, least recently used ones are evicted first. A font file changed on disk gets new entries.
+    """
+
+    def __init__(self, max_faces: int = DEFAULT_MAX_FACES, max_memory: int = DEFAULT_MAX_MEMORY, workers: int = None):
+        self.max_faces = max_faces
+        self.max_memory = max_memory
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.faces = OrderedDict()
+        self.glyph_sets = OrderedDict()
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.stdout = ThreadStdout(sys.stdout)
+
+    def face(self, font: str, stamp):
+        """FreeType face of a font and the lock which must be held while it is used."""
+        key = (font, stamp)
+        with self.lock:
+            if key in self.faces:
+                self.faces.move_to_end(key)
+                return self.faces[key]
+            entry = self.faces[key] = (Face(font), threading.Lock())
+            while len(self.faces) > self.max_faces:
+                self.faces.popitem(last=False)
+            return entry
+
+    def glyph_set(self, args):
+        """Copy of the cached glyph set for the font options of args, rendered on a miss."""
+        stamp = font_stamp(args.font)
+        key = (args.font, stamp, args.size, None if args.range is None else tuple(args.range), args.mono, args.bpp,
+               args.kern != 'none')
+
+        with self.lock:
+            glyph_set = self.glyph_sets.get(key)
+            if glyph_set is not None:
+                self.glyph_sets.move_to_end(key)
+                self.hits += 1
+                return glyph_set.copy()
+
+        face, face_lock = self.face(args.font, stamp)
+        with face_lock:
+            # Another request could render the same set while this one waited for the face
+            with self.lock:
+                glyph_set = self.glyph_sets.get(key)
+            if glyph_set is None:
+                cache = None
+                if args.cache is not None:
+                    from .cache import RenderCache
+                    cache = RenderCache(args.cache or None)
+                glyph_set = GlyphSet(font=args.font, size=args.size, char_set=args.range, mono=args.mono,
+                                     jobs=args.jobs, face=face, cache=cache, bpp=args.bpp,
+                                     kern=args.kern != 'none')
+
+        with self.lock:
+            if key not in self.glyph_sets:
+                self.misses += 1
+                self.glyph_sets[key] = glyph_set
+                self.memory += glyph_set.nbytes
+                while self.memory > self.max_memory and len(self.glyph_sets) > 1:
+                    _, evicted = self.glyph_sets.popitem(last=False)
+                    self.memory -= evicted.nbytes
+            else:
+                self.hits += 1
+            return glyph_set.copy()
+
+    def convert(self, options: dict):
+        """Run one conversion, files are returned instead of written: {path: bytes}."""
+        args = Namespace(**options)
+        targets = {}
+        with tempfile.TemporaryDirectory(prefix='ttf2c-') as tmp:
+            # Outputs go to a temporary directory and are sent back to the client which writes them
+            for name in ('output', 'img', 'stats_json', 'text_report'):
+                path = getattr(args, name)
+                if path:
+                    local = os.path.join(tmp, name)
+                    if name in ('output', 'img'):
+                        os.makedirs(local)
+                    targets[local] = path
+                    setattr(args, name, local)
+
+            # Text sources are matched with the font here, the glyph set is kept for the resulting codepoints
+            if args.text:
+                args.text = TextCorpus.scan(args.text)
+                face, face_lock = self.face(args.font, font_stamp(args.font))
+                with face_lock:
+                    args.range = args.text.char_set(face, args.range)
+
+            with self.stdout.capture() as lines:
+                # Stamps and depfiles are kept by the client, it knows where the files go
+                run(args, glyph_set=self.glyph_set(args), incremental=False)
+
+            files = {}
+            for local, path in targets.items():
+                if os.path.isdir(local):
+                    for file_name in sorted(os.listdir(local)):
+                        with open(os.path.join(local, file_name), 'rb') as f:
+                            files[os.path.join(path, file_name)] = f.read()
+                elif os.path.exists(local):
+                    with open(local, 'rb') as f:
+                        files[path] = f.read()
+        return ''.join(lines), files
+
+    def status(self):
+        with self.lock:
+            return {'requests': self.requests,
+                    'faces': len(self.faces),
+                    'glyph_sets': len(self.glyph_sets),
+                    'memory': self.memory,
+                    'max_memory': self.max_memory,
+                    'hits': self.hits,
+                    'misses': self.misses}
+
+    async def handle(self, request: dict):
+        command = request.get('command', 'convert')
+        if command == 'status':
+            return dict(self.status(), ok=True)
+        if command != 'convert':
+            return {'ok': False, 'error': f'Unknown command: {command}'}
+
+        with self.lock:
+            self.requests += 1
+        loop = asyncio.get_running_loop()
+        try:
+            stdout, files = await loop.run_in_executor(self.executor, self.convert, request['options'])
+        except Exception as e:
+            return {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+        return {'ok': True,
+                'stdout': stdout,
+                'files': {path: base64.b64encode(data).decode('ascii') for path, data in files.items()}}
+
+    async def handle_unix(self, reader, writer):
+        try:
+            line = await reader.readline()
+            try:
+                response = await self.handle(json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                response = {'ok': False, 'error': f'Bad request: {e}'}
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def handle_http(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            method, target, _ = (request_line.decode('latin-1').split(' ') + ['', '', ''])[:3]
+            length = int(headers.get('content-length', 0))
+            if length > MAX_REQUEST_SIZE:
+                status, response = '413 Payload Too Large', {'ok': False, 'error': 'Request is too large'}
+            elif method == 'GET' and target == '/status':
+                status, response = '200 OK', await self.handle({'command': 'status'})
+            elif method == 'POST' and target == '/convert':
+                try:
+                    request = json.loads(await reader.readexactly(length))
+                    status, response = '200 OK', await self.handle(dict(request, command='convert'))
+                except (ValueError, KeyError, TypeError, asyncio.IncompleteReadError) as e:
+                    status, response = '400 Bad Request', {'ok': False, 'error': f'Bad request: {e}'}
+            else:
+                status, response = '404 Not Found', {'ok': False, 'error': f'No such endpoint: {method} {target}'}
+
+            body = json.dumps(response).encode()
+            writer.write(f'HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n'
+                         f'Connection: close\r\n\r\n'.encode('latin-1') + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, address: str):
+        kind, host, port = parse_address(address)
+        if kind == 'http':
+            server = await asyncio.start_server(self.handle_http, host, port, limit=MAX_REQUEST_SIZE)
+        else:
+            if os.path.exists(host):
+                os.unlink(host)
+            server = await asyncio.start_unix_server(self.handle_unix, host, limit=MAX_REQUEST_SIZE)
+        print(f"ttf2c server is listening on {address}", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if kind == 'unix' and os.path.exists(host):
+                os.unlink(host)
+
+    def run(self, address: str):
+        sys.stdout = self.stdout
+        try:
+            asyncio.run(self.serve(address))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sys.stdout = self.stdout.stream
+            self.executor.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ttf2c.server',
+                                     description='Resident ttf2c conversion server. Keeps fonts and rendered glyphs '
+                                                 'in memory, "python -m ttf2c.client" sends it conversions with the '
+                                                 'same options as the ttf2c command.')
+    parser.add_argument('--address', default=default_address(),
+                        help='Unix socket path or http://host:port, by default $TTF2C_SERVER or a socket in the temp '
+                             'directory.')
+    parser.add_argument('--max-faces', type=int, default=DEFAULT_MAX_FACES,
+                        help=f'Number of open font faces, default {DEFAULT_MAX_FACES}.')
+    parser.add_argument('--max-memory', type=int, default=DEFAULT_MAX_MEMORY,
+                        help=f'Memory of kept glyph sets in bytes, default {DEFAULT_MAX_MEMORY}.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of conversions running at the same time, by default depends on CPU count.')
+    args = parser.parse_args(argv)
+
+    ConversionServer(args.max_faces, args.max_memory, args.workers).run(args.address)
+
+
+if __name__ == '__main__':
+    main()
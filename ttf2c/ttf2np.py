@@ -4,104 +4,449 @@
 # See the README and LISENSE files for information on usage and redistribution.
 #
 
-from freetype import Face, FT_LOAD_RENDER, FT_LOAD_MONOCHROME, FT_LOAD_TARGET_MONO, FT_GLYPH_BBOX_SUBPIXELS
+from freetype import Face, FT_LOAD_RENDER, FT_LOAD_MONOCHROME, FT_LOAD_TARGET_MONO, FT_LOAD_TARGET_NORMAL, \
+    FT_GLYPH_BBOX_SUBPIXELS
+from concurrent.futures import ProcessPoolExecutor
+import copy
+import os
 import numpy
+from .profile import NULL_PROFILE
+from .kerning import kerning_pairs
+
+LOAD_FLAGS = FT_LOAD_RENDER | FT_LOAD_MONOCHROME | FT_LOAD_TARGET_MONO
+# Anti-aliased 8 bit coverage for fonts with more than 1 bit per pixel
+GRAY_LOAD_FLAGS = FT_LOAD_RENDER | FT_LOAD_TARGET_NORMAL
+
+BPP = [1, 2, 4, 8]
+
+
+def load_flags(bpp: int):
+    return LOAD_FLAGS if bpp == 1 else GRAY_LOAD_FLAGS
+
+
+class GlyphRecord:
+    """Everything needed from a single FreeType render of one glyph."""
+    __slots__ = ('code', 'buffer', 'width', 'rows', 'pitch', 'bearing_x', 'advance', 'top', 'empty')
+
+    def __init__(self, code, buffer, width, rows, pitch, bearing_x, advance, top, empty):
+        self.code = code
+        self.buffer = buffer
+        self.width = width
+        self.rows = rows
+        self.pitch = pitch
+        self.bearing_x = bearing_x
+        self.advance = advance
+        self.top = top
+        self.empty = empty
+
+    @classmethod
+    def load(cls, face, code, flags=LOAD_FLAGS):
+        face.load_char(code, flags)
+        slot = face.glyph
+        bitmap = slot.bitmap
+        return cls(code=code,
+                   buffer=bytes(bitmap.buffer),
+                   width=bitmap.width,
+                   rows=bitmap.rows,
+                   pitch=bitmap.pitch,
+                   bearing_x=slot.metrics.horiBearingX // 64,
+                   advance=slot.advance.x // 64,
+                   top=slot.bitmap_top,
+                   empty=slot.metrics.width == 0 or slot.metrics.height == 0)
+
+    def unpack(self, gray: bool = False):
+        """Bitmap as bool array or, for gray renders, as 0-255 coverage."""
+        z = numpy.frombuffer(self.buffer, dtype=numpy.uint8)
+        z = numpy.reshape(z, (self.rows, self.pitch))
+        if gray:
+            return z[:, :self.width]
+        return numpy.unpackbits(z, axis=1, count=self.width).astype(bool)
+
+
+# Columns of the metrics table used to move glyph records between processes
+RECORD_FIELDS = ('code', 'width', 'rows', 'pitch', 'bearing_x', 'advance', 'top', 'empty')
+
+
+def records_to_buffers(records):
+    """Serialize glyph records into an int64 metrics table and one bytes blob of raw bitmaps."""
+    metrics = numpy.array([[getattr(r, f) for f in RECORD_FIELDS] for r in records], dtype=numpy.int64)
+    metrics = metrics.reshape(len(records), len(RECORD_FIELDS))
+    blob = b''.join(r.buffer for r in records)
+    return metrics, blob
+
+
+def records_from_buffers(metrics, blob):
+    """Inverse of records_to_buffers."""
+    records = []
+    offset = 0
+    for row in metrics.tolist():
+        fields = dict(zip(RECORD_FIELDS, row))
+        size = fields['rows'] * fields['pitch']
+        fields['buffer'] = blob[offset:offset + size]
+        fields['empty'] = bool(fields['empty'])
+        offset += size
+        records.append(GlyphRecord(**fields))
+    return records
+
+
+# One face per worker process, opened by the pool initializer
+_worker_face = None
+_worker_flags = LOAD_FLAGS
+
+
+def _init_worker(font, size, flags):
+    global _worker_face, _worker_flags
+    _worker_face = Face(font)
+    _worker_face.set_pixel_sizes(0, size)
+    _worker_flags = flags
+
+
+def _render_chunk(codes):
+    return records_to_buffers([GlyphRecord.load(_worker_face, c, _worker_flags) for c in codes])
+
+
+def render_parallel(font, size, char_set, jobs, flags=LOAD_FLAGS):
+    """Render char_set in a process pool of `jobs` workers, records come back in char_set order."""
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+
+    # Several chunks per worker even out glyphs of different complexity
+    chunk_size = max(1, -(-len(char_set) // (jobs * 4)))
+    chunks = [char_set[i:i + chunk_size] for i in range(0, len(char_set), chunk_size)]
+
+    records = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(font, size, flags)) as executor:
+        for metrics, blob in executor.map(_render_chunk, chunks):
+            records += records_from_buffers(metrics, blob)
+    return records
+
+
+class PackedGlyphs:
+    """Packed glyph bytes stored in one flat buffer.
+
+    ``data`` holds all glyphs back to back, ``offsets[i]:offsets[i + 1]`` is the slice of glyph ``i`` and
+    ``shapes[i]`` is its (rows, columns) shape in bytes. Indexing returns a zero copy 2D view of a glyph.
+    """
+
+    def __init__(self, data, offsets, shapes):
+        self.data = data
+        self.offsets = offsets
+        self.shapes = shapes
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].reshape(self.shapes[i])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def size(self):
+        return self.data.size
+
+    def slice(self, start, stop):
+        """Glyphs start:stop as PackedGlyphs with a view of their data."""
+        offsets = self.offsets[start:stop + 1]
+        return PackedGlyphs(self.data[offsets[0]:offsets[-1]], offsets - offsets[0], self.shapes[start:stop])
 
 
 class GlyphSet:
-    def __init__(self, font: str, size: int, char_set: list = None, mono: bool = False):
+    def __init__(self, font: str, size: int, char_set: list = None, mono: bool = False, jobs: int = 1,
+                 face: Face = None, cache=None, bpp: int = 1, kern: bool = False, profile=None):
         self.font = font
         self.size = size
         self.char_set = char_set
         self.mono = mono
+        self.jobs = jobs
+        self.bpp = bpp
+        self.max_level = (1 << bpp) - 1
         self.max_height = 0
         self.max_width = 0
         self.baseline = 0
         self.glyph_set = []
-        self.bitmaps = []
+        self.boxes = None
+        self.inverted = False
+        # Kerning pairs (left index, right index, px) of glyphs, read only with kern
+        self.kerning_pairs = numpy.zeros((0, 3), dtype=numpy.int64)
 
-        face = Face(self.font)
+        if profile is None:
+            profile = NULL_PROFILE
 
-        if self.char_set is None:
-            self.char_set = self.__ttf_get_charset()
+        with profile.stage('charset'):
+            # An already opened face can be shared between glyph sets of different sizes
+            if face is None:
+                face = Face(self.font)
 
-        face.set_pixel_sizes(0, self.size)
-        slot = face.glyph
+            if self.char_set is None:
+                self.char_set = self.__ttf_get_charset(face)
 
-        # Get space width
-        face.load_char(32, FT_LOAD_RENDER | FT_LOAD_MONOCHROME | FT_LOAD_TARGET_MONO)
-        self.space_width_px = slot.advance.x // 64
+        with profile.stage('render'):
+            face.set_pixel_sizes(0, self.size)
+            flags = load_flags(self.bpp)
 
-        # First two passes to compute bbox
-        kerning = []
+            # Get space width
+            self.space_width_px = GlyphRecord.load(face, 32, flags).advance
 
-        for c in self.char_set:
-            face.load_char(c, FT_LOAD_RENDER | FT_LOAD_MONOCHROME | FT_LOAD_TARGET_MONO)
-            if slot.metrics.width == 0 or slot.metrics.height == 0:
-                self.char_set.remove(c)
-                continue
-            bitmap = slot.bitmap
+            # Glyphs rendered by previous runs come from the render cache
+            cached = {}
+            if cache is not None:
+                cache_meta = cache.meta(self.font, self.size, flags)
+                cache_key = cache.key(cache_meta)
+                cached = cache.load(cache_key, self.char_set)
+            missing = [c for c in self.char_set if c not in cached]
 
-            kerning.append(slot.advance.x // 64 - bitmap.width + slot.metrics.horiBearingX // 64)
+            # Single FreeType pass: every glyph is loaded and rendered exactly once
+            if self.jobs != 1 and missing:
+                rendered = render_parallel(self.font, self.size, missing, self.jobs, flags)
+            else:
+                rendered = [GlyphRecord.load(face, c, flags) for c in missing]
 
-            self.max_width = max(self.max_width, bitmap.width)
-            self.baseline = max(self.baseline, max(0, bitmap.rows - slot.bitmap_top))
+            if cache is not None and rendered:
+                cache.store(cache_key, cache_meta, rendered)
 
-        # Take the average indentation value for each glyph
-        import statistics
-        self.kerning_px = int(statistics.median(kerning))
+        profile.count('glyphs_requested', len(self.char_set))
+        profile.count('glyphs_cached', len(self.char_set) - len(missing))
+        profile.count('glyphs_rendered', len(rendered))
 
-        for c in self.char_set:
-            face.load_char(c, FT_LOAD_RENDER | FT_LOAD_MONOCHROME | FT_LOAD_TARGET_MONO)
-            self.max_height = max(self.max_height, self.baseline + slot.bitmap_top)
+        with profile.stage('metrics'):
+            cached.update((r.code, r) for r in rendered)
+            records = [cached[c] for c in self.char_set]
 
-        # Render glyphs
-        for c in self.char_set:
-            face.load_char(c, FT_LOAD_RENDER | FT_LOAD_MONOCHROME | FT_LOAD_TARGET_MONO)
+            # Drop glyphs without ink (space, control codes etc.)
+            records = [r for r in records if not r.empty]
+            profile.count('glyphs_empty', len(self.char_set) - len(records))
+            self.char_set = [r.code for r in records]
+            self.glyph_set = records
 
-            width = slot.bitmap.width
-            if self.mono:
-                width = self.max_width
+            # Aggregate metrics over the cache
+            kerning = []
+            for r in records:
+                kerning.append(r.advance - r.width + r.bearing_x)
+                self.max_width = max(self.max_width, r.width)
+                self.baseline = max(self.baseline, max(0, r.rows - r.top))
+
+            # Take the average indentation value for each glyph
+            import statistics
+            self.kerning_px = int(statistics.median(kerning))
 
-            bitmap = slot.bitmap
-            glyph = numpy.full(shape=(self.max_height, width), fill_value=False, dtype=bool)
+            for r in records:
+                self.max_height = max(self.max_height, self.baseline + r.top)
 
-            z2 = numpy.array(bitmap.buffer, dtype=numpy.uint8)
-            z3 = numpy.reshape(z2, (slot.bitmap.rows, slot.bitmap.pitch))
-            z4 = numpy.unpackbits(z3, axis=1, count=slot.bitmap.width)
+        if kern:
+            with profile.stage('kerning'):
+                self.kerning_pairs = kerning_pairs(face, self.char_set)
+            profile.count('kerning_pairs', len(self.kerning_pairs))
 
+        with profile.stage('placement'):
+            self.__place(records)
+
+    def __place(self, records):
+        # All glyphs live in one contiguous buffer of max_height x max_width cells,
+        # the real width of every glyph is kept in widths. Multi bit glyphs keep gray levels in uint8.
+        gray = self.bpp > 1
+        self.buffer = numpy.zeros(shape=(len(records), self.max_height, self.max_width),
+                                  dtype=numpy.uint8 if gray else bool)
+        if self.mono:
+            self.widths = numpy.full(len(records), self.max_width, dtype=numpy.intp)
+        else:
+            self.widths = numpy.array([r.width for r in records], dtype=numpy.intp)
+
+        # Place glyphs into cells
+        for i, r in enumerate(records):
             if self.mono:
-                ws = (self.max_width - slot.bitmap.width) // 2
+                ws = (self.max_width - r.width) // 2
             else:
                 ws = 0
 
-            w = bitmap.width
-            top = slot.bitmap_top
-            h = bitmap.rows
-            y = self.max_height - self.baseline - top
-            glyph[y:y+h, ws:ws+w] = z4
+            y = self.max_height - self.baseline - r.top
+            self.buffer[i, y:y + r.rows, ws:ws + r.width] = r.unpack(gray)
+
+        # Quantize 0-255 coverage of the whole set to the levels of bpp
+        if gray and self.bpp < 8:
+            levels = (self.buffer.astype(numpy.uint16) * self.max_level + 127) // 255
+            self.buffer = levels.astype(numpy.uint8)
+
+    def copy(self):
+        """Copy which shares glyph records and the buffer with this glyph set.
 
-            self.bitmaps.append(numpy.copy(glyph))
+        The buffer becomes read only, so transforms of either set make their own arrays instead of changing it.
+        """
+        self.buffer.flags.writeable = False
+        glyph_set = copy.copy(self)
+        if self.boxes is not None:
+            glyph_set.boxes = self.boxes.copy()
+        return glyph_set
 
-    def __ttf_get_charset(self):
-        face = Face(self.font)
+    def placed(self, mono: bool):
+        """Copy with the rendered glyphs placed into cells again, e.g. in the other mono mode. Nothing is rendered,
+        flips, inversion and crop of this set are not kept."""
+        glyph_set = copy.copy(self)
+        glyph_set.mono = mono
+        glyph_set.boxes = None
+        glyph_set.inverted = False
+        glyph_set.__place(self.glyph_set)
+        return glyph_set
+
+    @property
+    def nbytes(self):
+        """Memory held by the buffer and the rendered glyph records."""
+        return self.buffer.nbytes + self.widths.nbytes + sum(len(r.buffer) for r in self.glyph_set)
+
+    @staticmethod
+    def __ttf_get_charset(face):
         char_set = []
         for c, i in face.get_chars():
             char_set.append(c)
         return char_set
 
+    @property
+    def bitmaps(self):
+        """List of per glyph views into the buffer, cropped to the stored glyph size."""
+        widths, heights = self.__stored_size()
+        return [self.buffer[i, :h, :w] for i, (w, h) in enumerate(zip(widths.tolist(), heights.tolist()))]
+
+    @property
+    def cell_bitmaps(self):
+        """List of whole glyph cells, cropped glyphs are drawn back into their cells."""
+        if self.boxes is None:
+            return self.bitmaps
+        background = self.max_level if self.inverted else 0
+        cells = []
+        for (x, y, w, h), width, bitmap in zip(self.boxes.tolist(), self.widths.tolist(), self.bitmaps):
+            cell = numpy.full((self.max_height, width), background, dtype=self.buffer.dtype)
+            cell[y:y + h, x:x + w] = bitmap
+            cells.append(cell)
+        return cells
+
+    def __stored_size(self):
+        """Width and height of the stored part of every cell: whole cell or the ink box after crop."""
+        if self.boxes is None:
+            return self.widths, numpy.full(len(self.widths), self.max_height, dtype=numpy.intp)
+        return self.boxes[:, 2], self.boxes[:, 3]
+
     def flip(self, axis):
-        for i, glyph in enumerate(self.bitmaps):
-            self.bitmaps[i] = numpy.flip(self.bitmaps[i], axis=axis)
+        widths, heights = self.__stored_size()
+        sizes = (heights, widths)[axis]
+        cell = self.buffer.shape[axis + 1]
+
+        if (sizes == cell).all():
+            # Cells have the same size, so a view of the reversed buffer is enough
+            self.buffer = numpy.flip(self.buffer, axis=axis + 1)
+        else:
+            # Reverse only the first `size` rows or columns of every cell, padding stays at the end
+            n = numpy.arange(cell)
+            index = numpy.where(n < sizes[:, None], sizes[:, None] - 1 - n, n)
+            index = index[:, :, None] if axis == 0 else index[:, None, :]
+            self.buffer = numpy.take_along_axis(self.buffer, index, axis=axis + 1)
+
+        if self.boxes is not None:
+            # The ink box moves to the mirrored position inside the glyph cell
+            cell_sizes = (self.max_height, self.widths)[axis]
+            self.boxes[:, 1 - axis] = cell_sizes - self.boxes[:, 1 - axis] - sizes
 
     def inverse(self):
-        for i, glyph in enumerate(self.bitmaps):
-            self.bitmaps[i] = numpy.invert(self.bitmaps[i])
-
-    def pack(self, axis, bit_order):
-        glyph_pack_list = []
-        for i, glyph in enumerate(self.bitmaps):
-            # Pack bits to bytes
-            packed_glyph = numpy.packbits(self.bitmaps[i], axis=axis, bitorder=bit_order)
-            glyph_pack_list.append(packed_glyph)
-        return glyph_pack_list
+        if not self.buffer.flags.writeable or not self.buffer.flags.c_contiguous:
+            self.buffer = self.buffer.copy()
+        if self.bpp == 1:
+            numpy.invert(self.buffer, out=self.buffer)
+        else:
+            numpy.subtract(self.max_level, self.buffer, out=self.buffer)
+        self.inverted = not self.inverted
+
+    def crop(self, align: int = 1):
+        """Keep only the ink bounding box of every glyph, its position in the cell is saved in boxes (x, y, w, h).
+
+        The top of a box is aligned down to a multiple of `align` rows, e.g. 8 to keep display pages aligned.
+        """
+        glyph_num, cell_height, cell_width = self.buffer.shape
+        widths, heights = self.__stored_size()
+
+        ink = self.buffer != (self.max_level if self.inverted else 0)
+        ink &= (numpy.arange(cell_height) < heights[:, None])[:, :, None]
+        ink &= (numpy.arange(cell_width) < widths[:, None])[:, None, :]
+
+        def bounds(lines):
+            found = lines.any(axis=1)
+            start = lines.argmax(axis=1)
+            length = lines.shape[1] - lines[:, ::-1].argmax(axis=1) - start
+            return numpy.where(found, start, 0), numpy.where(found, length, 0)
+
+        y, h = bounds(ink.any(axis=2))
+        x, w = bounds(ink.any(axis=1))
+        if align > 1:
+            h += y % align
+            y -= y % align
+
+        # Move every box to the top left corner of its cell in one gather
+        rows = numpy.minimum(y[:, None] + numpy.arange(cell_height), cell_height - 1)
+        columns = numpy.minimum(x[:, None] + numpy.arange(cell_width), cell_width - 1)
+        self.buffer = self.buffer[numpy.arange(glyph_num)[:, None, None], rows[:, :, None], columns[:, None, :]]
+
+        if self.boxes is not None:
+            x += self.boxes[:, 0]
+            y += self.boxes[:, 1]
+        self.boxes = numpy.stack((x, y, w, h), axis=1)
+
+    def pack_size(self, axis):
+        """Size in bytes pack(axis) would return."""
+        widths, heights = self.__stored_size()
+        if axis == 0:
+            heights = heights * self.bpp
+            return int((((heights + 7) // 8) * widths).sum())
+        widths = widths * self.bpp
+        return int((heights * ((widths + 7) // 8)).sum())
+
+    def pack(self, axis, bit_order, addressing: str = 'horizontal'):
+        """Pack bits to bytes along `axis` (0 - vertical, 1 - horizontal).
+
+        With 'horizontal' addressing bytes of a glyph go row after row, with 'vertical' addressing column after
+        column.
+        """
+        widths, heights = self.__stored_size()
+        sizes = (heights, widths)[axis]
+        cell = self.buffer.shape[axis + 1]
+
+        buffer = self.buffer
+        if (sizes != cell).any():
+            # Padding bits would leak into the last byte of each row or column
+            mask = numpy.arange(cell) < sizes[:, None]
+            buffer = buffer * (mask[:, :, None] if axis == 0 else mask[:, None, :])
+
+        if self.bpp > 1:
+            # Every pixel becomes bpp bits in bit_order, pixels stay dense along the packing axis
+            bits = numpy.unpackbits(buffer[..., None], axis=-1, bitorder=bit_order)
+            bits = bits[..., :self.bpp] if bit_order == 'little' else bits[..., 8 - self.bpp:]
+            if axis == 0:
+                buffer = bits.transpose(0, 1, 3, 2).reshape(buffer.shape[0], -1, buffer.shape[2])
+                heights = heights * self.bpp
+            else:
+                buffer = bits.reshape(buffer.shape[0], buffer.shape[1], -1)
+                widths = widths * self.bpp
+
+        # Pack bits to bytes for the whole set at once
+        packed = numpy.packbits(buffer, axis=axis + 1, bitorder=bit_order)
+
+        glyph_num = len(self.widths)
+        if axis == 0:
+            rows = (heights + 7) // 8
+            columns = widths
+        else:
+            rows = heights
+            columns = (widths + 7) // 8
+
+        if addressing == 'vertical':
+            packed = packed.transpose(0, 2, 1)
+            rows, columns = columns, rows
+
+        # Cut the padding and concatenate glyphs in one flat buffer
+        mask = (numpy.arange(packed.shape[1]) < rows[:, None])[:, :, None]
+        mask = mask & (numpy.arange(packed.shape[2]) < columns[:, None])[:, None, :]
+        data = packed[mask]
+
+        offsets = numpy.zeros(glyph_num + 1, dtype=numpy.intp)
+        numpy.cumsum(rows * columns, out=offsets[1:])
+        return PackedGlyphs(data, offsets, numpy.stack((rows, columns), axis=1))